@@ -0,0 +1,33 @@
+"""
+Permite correr los tests con pytest además de manage.py test:
+
+    pytest
+    pytest --nmas1 5
+    BENCHMARK=1 BENCHMARK_JSON=reporte.json pytest inventory/tests_benchmark.py
+
+Configura Django con settings_test y crea las bases de test una vez por
+sesión con el mismo runner que usa manage.py test.
+"""
+import os
+
+import django
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'control_stock.settings_test')
+django.setup()
+
+from control_stock.test_runner import Runner  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption('--nmas1', type=int, metavar='UMBRAL', help='Detector de N+1: falla los requests que repiten una consulta más de UMBRAL veces.')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def bases_de_test(request):
+    runner = Runner(verbosity=0, nmas1=request.config.getoption('--nmas1'))
+    runner.setup_test_environment()
+    configuracion = runner.setup_databases()
+    yield
+    runner.teardown_databases(configuracion)
+    runner.teardown_test_environment()
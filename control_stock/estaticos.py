@@ -0,0 +1,160 @@
+"""
+Estáticos para producción sin servidor web delante: nombres con hash,
+precomprimidos al correr collectstatic y servidos desde el mismo proceso
+WSGI/ASGI con cache de largo plazo.
+
+- EstaticosComprimidos (STORAGES['staticfiles'] en settings_prod) es
+  ManifestStaticFilesStorage que además deja junto a cada archivo con hash
+  una copia .gz y, si está instalado el paquete brotli, una .br.
+- EstaticosMiddleware atiende STATIC_URL desde STATIC_ROOT con el índice de
+  archivos armado al arrancar (sin tocar el disco para decidir), elige la
+  variante según Accept-Encoding y marca los archivos con hash como
+  inmutables por un año; el resto se revalida con ETag cada
+  ESTATICOS_MAX_AGE segundos. Se activa con ESTATICOS_SERVIR.
+
+``python manage.py medir_transferencia`` mide los bytes de una carga en frío
+y otra en caliente del dashboard.
+"""
+import gzip
+import mimetypes
+import os
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseNotModified
+
+try:
+    import brotli
+except ImportError:  # opcional: sin él solo se generan las variantes gzip
+    brotli = None
+
+UN_ANIO = 365 * 24 * 3600
+COMPRIMIBLES = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot', '.otf'}
+# Comprimir archivos más chicos no compensa las cabeceras
+MINIMO_COMPRIMIR = 256
+
+
+def comprimir(ruta):
+    """Escribe ruta.gz (y ruta.br) si quedan más chicos que el original."""
+    contenido = Path(ruta).read_bytes()
+    if len(contenido) < MINIMO_COMPRIMIR:
+        return
+    variantes = [('.gz', gzip.compress(contenido, 9, mtime=0))]
+    if brotli is not None:
+        variantes.append(('.br', brotli.compress(contenido)))
+    for extension, comprimido in variantes:
+        if len(comprimido) < len(contenido):
+            Path(f'{ruta}{extension}').write_bytes(comprimido)
+
+
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for nombre in set(self.hashed_files.values()):
+            if os.path.splitext(nombre)[1].lower() in COMPRIMIBLES:
+                comprimir(self.path(nombre))
+
+
+class Archivo:
+    __slots__ = ('ruta', 'tamanio', 'etag', 'tipo')
+
+    def __init__(self, ruta, tipo):
+        stat = os.stat(ruta)
+        self.ruta = ruta
+        self.tamanio = stat.st_size
+        self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        self.tipo = tipo
+
+
+def _indice(raiz):
+    """{ruta relativa: {codificación: Archivo}}; la codificación '' es el original."""
+    indice = {}
+    for carpeta, _, nombres in os.walk(raiz):
+        for nombre in nombres:
+            if nombre.endswith(('.gz', '.br')):
+                continue
+            ruta = os.path.join(carpeta, nombre)
+            tipo = mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+            if tipo.startswith('text/') or tipo in ('application/javascript', 'image/svg+xml'):
+                tipo += '; charset=utf-8'
+            variantes = {'': Archivo(ruta, tipo)}
+            for codificacion, extension in (('br', '.br'), ('gzip', '.gz')):
+                if os.path.exists(ruta + extension):
+                    variantes[codificacion] = Archivo(ruta + extension, tipo)
+            indice[os.path.relpath(ruta, raiz).replace(os.sep, '/')] = variantes
+    return indice
+
+
+def _aceptadas(request):
+    return {parte.split(';')[0].strip() for parte in request.headers.get('Accept-Encoding', '').split(',')}
+
+
+class EstaticosMiddleware:
+    """Va primero en MIDDLEWARE: un estático no pasa por sesión, métricas ni tenancy."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ESTATICOS_SERVIR', False) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        self.prefijo = settings.STATIC_URL
+        self.archivos = _indice(settings.STATIC_ROOT)
+        self.inmutables = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        self.max_age = getattr(settings, 'ESTATICOS_MAX_AGE', 60)
+
+    def _buscar(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefijo):
+            return None
+        return self.archivos.get(request.path[len(self.prefijo):])
+
+    def _responder(self, request, nombre, variantes):
+        aceptadas = _aceptadas(request)
+        codificacion = next((c for c in ('br', 'gzip') if c in variantes and c in aceptadas), '')
+        archivo = variantes[codificacion]
+        cabeceras = {
+            'ETag': archivo.etag,
+            'Cache-Control': (
+                f'public, max-age={UN_ANIO}, immutable' if nombre in self.inmutables
+                else f'public, max-age={self.max_age}'
+            ),
+            'X-Content-Type-Options': 'nosniff',
+        }
+        if len(variantes) > 1:
+            cabeceras['Vary'] = 'Accept-Encoding'
+        if archivo.etag in request.headers.get('If-None-Match', ''):
+            return HttpResponseNotModified(headers=cabeceras)
+        if codificacion:
+            cabeceras['Content-Encoding'] = codificacion
+        if request.method == 'HEAD':
+            contenido = b''
+        else:
+            with open(archivo.ruta, 'rb') as f:
+                contenido = f.read()
+        respuesta = HttpResponse(contenido, content_type=archivo.tipo, headers=cabeceras)
+        respuesta['Content-Length'] = archivo.tamanio
+        return respuesta
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        nombre = request.path[len(self.prefijo):]
+        variantes = self._buscar(request)
+        if variantes is None:
+            return self.get_response(request)
+        return self._responder(request, nombre, variantes)
+
+    async def __acall__(self, request):
+        nombre = request.path[len(self.prefijo):]
+        variantes = self._buscar(request)
+        if variantes is None:
+            return await self.get_response(request)
+        return await sync_to_async(self._responder, thread_sensitive=False)(request, nombre, variantes)
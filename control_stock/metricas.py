@@ -0,0 +1,335 @@
+"""
+Métricas por request: tiempo total, consultas SQL, tiempo en SQL, consultas
+repetidas (N+1) y tiempo de render de templates, por vista y panel/form_type.
+
+Se activa con settings.METRICAS_MUESTREO (fracción de requests medidos, 0 a
+1). Con 0 el middleware se retira de la cadena al arrancar y no instala nada.
+Las consultas se miden con un execute_wrapper que se agrega a cada conexión y
+anota en el request actual a través de un ContextVar, así funciona igual en
+vistas síncronas y async (sync_to_async copia el contexto al hilo).
+
+Los valores se acumulan en memoria en histogramas (uno por proceso) y se
+publican en formato de texto de Prometheus en /metricas/, solo para
+administradores o con la cabecera ``Authorization: Bearer <METRICAS_TOKEN>``.
+
+vigilar_nmas1 usa la misma medición para detectar N+1: falla (o avisa en el
+log) si una misma forma de consulta se repite más de NMAS1_UMBRAL veces
+dentro del bloque. Nmas1Middleware lo aplica a cada request.
+"""
+import logging
+import random
+import re
+import threading
+import time as reloj
+from collections import Counter
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import Template
+
+PREFIJO = 'control_stock'
+LIMITE_SERIES = 500
+ETIQUETA_VALIDA = re.compile(r'^[\w-]{1,40}$')
+BUCKETS = {
+    'request_segundos': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'sql_segundos': (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    'template_segundos': (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    'consultas': (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    'consultas_repetidas': (0, 1, 2, 5, 10, 20, 50, 100, 500),
+}
+AYUDA = {
+    'request_segundos': 'Tiempo total del request.',
+    'sql_segundos': 'Tiempo total en consultas SQL por request.',
+    'template_segundos': 'Tiempo de render de templates por request.',
+    'consultas': 'Consultas SQL por request.',
+    'consultas_repetidas': 'Consultas con una forma ya ejecutada en el mismo request (N+1).',
+}
+
+# Mediciones activas: la del middleware de métricas y las de vigilar_nmas1 anidadas
+_mediciones = ContextVar('metricas_mediciones', default=())
+logger = logging.getLogger(__name__)
+_NUMEROS = re.compile(r'\b\d+\b')
+_LISTAS = re.compile(r'\((?:\s*%s\s*,)*\s*%s\s*\)')
+
+
+def forma_sql(sql):
+    """SQL sin literales numéricos y con las listas IN (%s, %s, ...) colapsadas."""
+    return _LISTAS.sub('(%s...)', _NUMEROS.sub('?', sql))
+
+
+class Medicion:
+    __slots__ = ('consultas', 'sql', 'template', 'formas', 'renderizando', '_token')
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.formas = Counter()
+        self.renderizando = False
+
+    @property
+    def repetidas(self):
+        return self.consultas - len(self.formas)
+
+    def __enter__(self):
+        self._token = _mediciones.set(_mediciones.get() + (self,))
+        return self
+
+    def __exit__(self, *exc):
+        _mediciones.reset(self._token)
+
+
+def _registrar_consulta(execute, sql, params, many, context):
+    mediciones = _mediciones.get()
+    if not mediciones:
+        return execute(sql, params, many, context)
+    inicio = reloj.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracion = reloj.perf_counter() - inicio
+        forma = forma_sql(sql)
+        for medicion in mediciones:
+            medicion.sql += duracion
+            medicion.consultas += 1
+            medicion.formas[forma] += 1
+
+
+def _instalar_en_conexion(sender, connection, **kwargs):
+    if _registrar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_registrar_consulta)
+
+
+def _instalar_en_conexiones():
+    connection_created.connect(_instalar_en_conexion, dispatch_uid='metricas_sql')
+    for conexion in connections.all(initialized_only=True):
+        _instalar_en_conexion(None, conexion)
+
+
+_render_original = Template.render
+
+
+def _render_medido(self, context=None, request=None):
+    mediciones = _mediciones.get()
+    medicion = mediciones[0] if mediciones else None
+    # Un template renderizado dentro de otro (render_to_string en un tag) ya está contado
+    if medicion is None or medicion.renderizando:
+        return _render_original(self, context, request)
+    medicion.renderizando = True
+    inicio = reloj.perf_counter()
+    try:
+        return _render_original(self, context, request)
+    finally:
+        medicion.template += reloj.perf_counter() - inicio
+        medicion.renderizando = False
+
+
+class Histogramas:
+    """Histogramas acumulativos por serie (vista, panel, form_type). Seguro entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observar(self, etiquetas, valores):
+        with self._lock:
+            if etiquetas not in self._series:
+                if len(self._series) >= LIMITE_SERIES:
+                    etiquetas = ('otro', '', '')
+                self._series.setdefault(etiquetas, {
+                    nombre: {'buckets': [0] * len(limites), 'suma': 0.0, 'cuenta': 0}
+                    for nombre, limites in BUCKETS.items()
+                })
+            serie = self._series[etiquetas]
+            for nombre, valor in valores.items():
+                h = serie[nombre]
+                for i, limite in enumerate(BUCKETS[nombre]):
+                    if valor <= limite:
+                        h['buckets'][i] += 1
+                h['suma'] += valor
+                h['cuenta'] += 1
+
+    def vaciar(self):
+        with self._lock:
+            self._series.clear()
+
+    def prometheus(self):
+        with self._lock:
+            series = {k: {n: {**h, 'buckets': list(h['buckets'])} for n, h in v.items()}
+                      for k, v in self._series.items()}
+        lineas = []
+        for nombre, limites in BUCKETS.items():
+            metrica = f'{PREFIJO}_{nombre}'
+            lineas.append(f'# HELP {metrica} {AYUDA[nombre]}')
+            lineas.append(f'# TYPE {metrica} histogram')
+            for (vista, panel, form_type), datos in sorted(series.items()):
+                h = datos[nombre]
+                base = f'vista="{vista}",panel="{panel}",form_type="{form_type}"'
+                for limite, cuenta in zip(limites, h['buckets']):
+                    lineas.append(f'{metrica}_bucket{{{base},le="{limite}"}} {cuenta}')
+                lineas.append(f'{metrica}_bucket{{{base},le="+Inf"}} {h["cuenta"]}')
+                lineas.append(f'{metrica}_sum{{{base}}} {h["suma"]:.6f}')
+                lineas.append(f'{metrica}_count{{{base}}} {h["cuenta"]}')
+        return '\n'.join(lineas) + '\n'
+
+
+histogramas = Histogramas()
+
+
+def _etiqueta(valor):
+    # Los valores vienen del request: se limitan para no crear series arbitrarias
+    return valor if valor and ETIQUETA_VALIDA.match(valor) else ''
+
+
+def _etiquetas(request):
+    match = getattr(request, 'resolver_match', None)
+    vista = match.view_name if match else 'sin_ruta'
+    return (
+        vista,
+        _etiqueta(request.GET.get('panel')),
+        _etiqueta(request.POST.get('form_type')) if request.method == 'POST' else '',
+    )
+
+
+class MetricasMiddleware:
+    """Va primero en MIDDLEWARE para que el tiempo total incluya al resto."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.muestreo = getattr(settings, 'METRICAS_MUESTREO', 0)
+        if not self.muestreo:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        _instalar_en_conexiones()
+        Template.render = _render_medido
+
+    def _medir(self):
+        return self.muestreo >= 1 or random.random() < self.muestreo
+
+    def _registrar(self, request, medicion, inicio):
+        histogramas.observar(_etiquetas(request), {
+            'request_segundos': reloj.perf_counter() - inicio,
+            'sql_segundos': medicion.sql,
+            'template_segundos': medicion.template,
+            'consultas': medicion.consultas,
+            'consultas_repetidas': medicion.repetidas,
+        })
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._medir():
+            return self.get_response(request)
+        inicio = reloj.perf_counter()
+        with Medicion() as medicion:
+            try:
+                return self.get_response(request)
+            finally:
+                self._registrar(request, medicion, inicio)
+
+    async def __acall__(self, request):
+        if not self._medir():
+            return await self.get_response(request)
+        inicio = reloj.perf_counter()
+        with Medicion() as medicion:
+            try:
+                return await self.get_response(request)
+            finally:
+                self._registrar(request, medicion, inicio)
+
+
+class ConsultasRepetidas(AssertionError):
+    pass
+
+
+class vigilar_nmas1(ContextDecorator):
+    """
+    Context manager y decorador. Al salir revisa las consultas del bloque y,
+    si alguna forma se repite más de umbral veces, lanza ConsultasRepetidas
+    (accion='error') o lo registra en el log (accion='log'). Por defecto
+    toma NMAS1_UMBRAL y NMAS1_ACCION de settings; umbral 0 no vigila.
+    """
+
+    def __init__(self, umbral=None, accion=None, etiqueta=''):
+        self.umbral = umbral
+        self.accion = accion
+        self.etiqueta = etiqueta
+        self._activas = []
+
+    def __enter__(self):
+        _instalar_en_conexiones()
+        medicion = Medicion().__enter__()
+        self._activas.append(medicion)
+        return medicion
+
+    def __exit__(self, tipo, error, traza):
+        medicion = self._activas.pop()
+        medicion.__exit__(tipo, error, traza)
+        umbral = self.umbral if self.umbral is not None else getattr(settings, 'NMAS1_UMBRAL', 0)
+        if tipo is not None or not umbral:
+            return False
+        repetidas = [(n, forma) for forma, n in medicion.formas.items() if n > umbral]
+        if not repetidas:
+            return False
+        detalle = '\n'.join(f'  {n}x {forma[:300]}' for n, forma in sorted(repetidas, reverse=True))
+        mensaje = f'{self.etiqueta or "Bloque"}: consultas repetidas más de {umbral} veces (N+1):\n{detalle}'
+        accion = self.accion or getattr(settings, 'NMAS1_ACCION', 'log')
+        if accion == 'error':
+            raise ConsultasRepetidas(mensaje)
+        logger.warning(mensaje)
+        return False
+
+
+class Nmas1Middleware:
+    """Aplica vigilar_nmas1 a cada request. Sin NMAS1_UMBRAL se retira de la cadena."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'NMAS1_UMBRAL', 0):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with vigilar_nmas1(etiqueta=f'{request.method} {request.get_full_path()}'):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with vigilar_nmas1(etiqueta=f'{request.method} {request.get_full_path()}'):
+            return await self.get_response(request)
+
+
+def _autorizado(request):
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        return True
+    user = request.user
+    return user.is_authenticated and (user.is_superuser or getattr(user, 'role', None) == 'admin')
+
+
+def metricas(request):
+    if not _autorizado(request):
+        return HttpResponseForbidden('Solo administradores.')
+    return HttpResponse(histogramas.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _settings_cambiados(setting, **kwargs):
+    if setting == 'METRICAS_MUESTREO':
+        histogramas.vaciar()
+
+
+setting_changed.connect(_settings_cambiados)
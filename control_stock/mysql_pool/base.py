@@ -0,0 +1,143 @@
+"""
+Backend MySQL con pool de conexiones por proceso.
+
+Igual que django.db.backends.mysql, pero al cerrar una conexión la devuelve a
+un pool compartido entre hilos en vez de cortarla, y al abrir toma una del pool
+si hay. Sirve donde CONN_MAX_AGE no alcanza: bajo ASGI (las vistas async y
+sync_to_async(thread_sensitive=False) corren en hilos que no conservan su
+conexión) y en workers que crean hilos de corta vida.
+
+Es opcional: settings.py solo lo usa con DB_POOL > 0. Los tests cubren el pool
+con conexiones simuladas; el recorrido contra un MySQL real corre solo si
+MYSQL_TEST_HOST está definido (ver inventory/tests.py). Antes de activarlo en
+producción, correr esa prueba y benchmark_conexiones contra la base real.
+
+Se configura en DATABASES[...]['OPTIONS']['pool']:
+
+    'pool': {
+        'max_size': 10,       # conexiones libres que se conservan
+        'max_lifetime': 3600, # segundos antes de reciclar una conexión
+        'check_after': 30,    # segundos inactiva antes de hacer ping al tomarla
+    }
+"""
+import os
+import queue
+import threading
+import time
+
+from django.db.backends.mysql import base as mysql
+from django.utils.asyncio import async_unsafe
+
+POOL_POR_DEFECTO = {'max_size': 10, 'max_lifetime': 3600, 'check_after': 30}
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class Pool:
+    def __init__(self, max_size, max_lifetime, check_after):
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._libres = queue.LifoQueue()
+
+    def tomar(self):
+        """Conexión libre y sana, o None si hay que abrir una nueva."""
+        while True:
+            try:
+                conexion, devuelta = self._libres.get_nowait()
+            except queue.Empty:
+                return None
+            ahora = time.monotonic()
+            if ahora - conexion._pool_creada >= self.max_lifetime:
+                _cerrar(conexion)
+                continue
+            if ahora - devuelta >= self.check_after:
+                try:
+                    # Posicional: mysqlclient no acepta reconnect como keyword (PyMySQL sí)
+                    conexion.ping(False)
+                except Exception:
+                    _cerrar(conexion)
+                    continue
+            return conexion
+
+    def devolver(self, conexion):
+        """Deja la conexión en el pool; False si hay que cerrarla."""
+        if self._libres.qsize() >= self.max_size:
+            return False
+        try:
+            conexion.rollback()
+        except Exception:
+            return False
+        self._libres.put((conexion, time.monotonic()))
+        return True
+
+    def vaciar(self):
+        while True:
+            try:
+                conexion, _ = self._libres.get_nowait()
+            except queue.Empty:
+                return
+            _cerrar(conexion)
+
+
+def _cerrar(conexion):
+    try:
+        conexion.close()
+    except Exception:
+        pass
+
+
+def _despues_de_fork():
+    # El hijo no debe usar los sockets heredados (gunicorn --preload): se olvidan sin cerrarlos
+    global _lock
+    _pools.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_despues_de_fork)
+
+
+def pool_de(alias, opciones):
+    with _lock:
+        if alias not in _pools:
+            config = {**POOL_POR_DEFECTO, **(opciones if isinstance(opciones, dict) else {})}
+            _pools[alias] = Pool(**config)
+        return _pools[alias]
+
+
+class DatabaseWrapper(mysql.DatabaseWrapper):
+    @property
+    def pool(self):
+        return pool_de(self.alias, self.settings_dict['OPTIONS'].get('pool'))
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        conexion = self.pool.tomar()
+        self._conexion_reutilizada = conexion is not None
+        if conexion is None:
+            conexion = super().get_new_connection(conn_params)
+            conexion._pool_creada = time.monotonic()
+        return conexion
+
+    def init_connection_state(self):
+        # Una conexión del pool ya tiene aplicado el estado de sesión
+        if not getattr(self, '_conexion_reutilizada', False):
+            super().init_connection_state()
+
+    def _close(self):
+        # Dentro de un atomic el wrapper conserva la referencia: no se puede compartir
+        if (
+            self.connection is not None
+            and not self.in_atomic_block
+            and not self.errors_occurred
+            and self.pool.devolver(self.connection)
+        ):
+            return
+        return super()._close()
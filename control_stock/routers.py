@@ -0,0 +1,110 @@
+"""
+Router de réplica de lectura.
+
+Dentro de un request (ReplicaMiddleware) las lecturas van a la réplica
+configurada en settings.DATABASE_REPLICA, de modo que el dashboard, los
+reportes y la API de consulta no compiten con las escrituras de stock. Van
+siempre a la primaria:
+
+- todo lo que se lee dentro de un transaction.atomic() (select_for_update,
+  validaciones de disponible, get_or_create);
+- el resto del request después de la primera escritura;
+- los requests siguientes del mismo navegador durante REPLICA_PIN_SEGUNDOS
+  (cookie), para que el redirect después de un POST vea lo recién escrito;
+- sesiones, usuarios, claves de idempotencia y tokens, que se leen justo
+  después de escribirse;
+- todo lo que corre fuera de un request (comandos, signals en tareas).
+
+Sin DATABASE_REPLICA, o si el alias no está en DATABASES, todo va a 'default'.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE_PRIMARIA = 'fijar_primaria'
+APPS_PRIMARIA = {'sessions', 'auth', 'admin'}
+# inventory.user es AUTH_USER_MODEL: el usuario de la sesión se lee siempre de la primaria
+MODELOS_PRIMARIA = {'inventory.user', 'inventory.claveidempotencia', 'inventory.tokenapi'}
+
+# Estado del request actual: {'replica': bool, 'escribio': bool}. Es un dict
+# mutable para que lo que marca una vista síncrona corriendo en sync_to_async
+# se vea en el middleware.
+_request = ContextVar('replica_request', default=None)
+
+
+def alias_replica():
+    alias = getattr(settings, 'DATABASE_REPLICA', None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        estado = _request.get()
+        alias = alias_replica()
+        if (
+            alias is None
+            or estado is None
+            or not estado['replica']
+            or model._meta.app_label in APPS_PRIMARIA
+            or model._meta.label_lower in MODELOS_PRIMARIA
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        estado = _request.get()
+        if estado is not None:
+            estado['replica'] = False
+            estado['escribio'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos que la primaria
+        return True
+
+
+class ReplicaMiddleware:
+    """Habilita la réplica durante el request y fija la primaria tras una escritura."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _iniciar(self, request):
+        estado = {'replica': COOKIE_PRIMARIA not in request.COOKIES, 'escribio': False}
+        return estado, _request.set(estado)
+
+    def _terminar(self, response, estado, token):
+        _request.reset(token)
+        if estado['escribio'] and alias_replica():
+            response.set_cookie(
+                COOKIE_PRIMARIA, '1', max_age=getattr(settings, 'REPLICA_PIN_SEGUNDOS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        estado, token = self._iniciar(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _request.reset(token)
+            raise
+        return self._terminar(response, estado, token)
+
+    async def __acall__(self, request):
+        estado, token = self._iniciar(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            _request.reset(token)
+            raise
+        return self._terminar(response, estado, token)
@@ -1,13 +1,12 @@
 """
-Django settings for control_stock project.
+Settings base de control_stock, comunes a todos los entornos y configurables
+con variables de entorno. No se usan directamente:
 
-Generated by 'django-admin startproject' using Django 5.1.7.
+- control_stock.settings_dev: desarrollo (manage.py por defecto), con DEBUG.
+- control_stock.settings_prod: producción (wsgi.py y asgi.py por defecto).
+- control_stock.settings_test: tests sobre SQLite.
 
-For more information on this file, see
-https://docs.djangoproject.com/en/5.1/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/5.1/ref/settings/
+https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
@@ -16,16 +15,17 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
-
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-w-r-f!9w8unqus^_*kre=rne-v#cpir9!cbyp43)c0@tdih2w)'
+# settings_prod exige DJANGO_SECRET_KEY; esta clave solo sirve en desarrollo y tests.
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY', 'django-insecure-w-r-f!9w8unqus^_*kre=rne-v#cpir9!cbyp43)c0@tdih2w)'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Con DEBUG cada conexión guarda en memoria el SQL de cada consulta (connection.queries).
+DEBUG = os.environ.get('DJANGO_DEBUG', '0') == '1'
 
-ALLOWED_HOSTS = ["*"]
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', '*').split(',')
 CSRF_TRUSTED_ORIGINS = [
     "https://*.ngrok-free.app",         
     "http://localhost:8000",       
@@ -54,11 +54,16 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 AUTH_USER_MODEL = 'inventory.User'
 MIDDLEWARE = [
+    'control_stock.estaticos.EstaticosMiddleware',
+    'control_stock.metricas.MetricasMiddleware',
+    'control_stock.metricas.Nmas1Middleware',
     'django.middleware.security.SecurityMiddleware',
+    'control_stock.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory.tenancy.EmpresaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,28 +88,112 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'control_stock.wsgi.application'
 
+# Pub/sub del feed en vivo (/eventos/). BrokerLocal solo sirve dentro de un proceso ASGI;
+# con varios procesos reemplazar por una clase con la misma interfaz (publicar/suscribir/desuscribir).
+LIVE_BROKER = 'inventory.events.BrokerLocal'
+
+# Métricas por request (/metricas/, formato Prometheus). METRICAS_MUESTREO es la fracción
+# de requests medidos (0 = middleware desactivado, 1 = todos). METRICAS_TOKEN permite
+# leerlas sin sesión con la cabecera Authorization: Bearer <token>.
+METRICAS_MUESTREO = float(os.environ.get('METRICAS_MUESTREO', '0'))
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+# Detector de N+1 por request: si una misma consulta se repite más de NMAS1_UMBRAL veces
+# avisa en el log (NMAS1_ACCION='log') o lanza una excepción ('error', lo usan los tests).
+# 0 = desactivado; en desarrollo basta con NMAS1_UMBRAL=5.
+NMAS1_UMBRAL = int(os.environ.get('NMAS1_UMBRAL', '0'))
+NMAS1_ACCION = os.environ.get('NMAS1_ACCION', 'log')
+
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
+# Estáticos servidos por el propio proceso (control_stock/estaticos.py), para cuando no
+# hay un servidor web delante. Los archivos con hash se cachean un año en el navegador;
+# los demás ESTATICOS_MAX_AGE segundos. settings_prod lo activa por defecto.
+ESTATICOS_SERVIR = os.environ.get('ESTATICOS_SERVIR', '0') == '1'
+ESTATICOS_MAX_AGE = int(os.environ.get('ESTATICOS_MAX_AGE', '60'))
 LOGOUT_REDIRECT_URL = 'login' 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Conexiones (variables de entorno):
+# - DB_CONN_MAX_AGE: segundos que cada hilo conserva su conexión entre requests
+#   (0 = abrir y cerrar en cada request). DB_HEALTH_CHECKS=1 hace ping antes de
+#   reutilizarla para no fallar con conexiones cortadas por wait_timeout.
+# - DB_POOL: si es > 0, usa control_stock.mysql_pool y conserva hasta DB_POOL
+#   conexiones libres compartidas entre hilos. Opcional y desactivado por
+#   defecto: sirve bajo ASGI, donde las conexiones persistentes no se reutilizan
+#   bien, con DB_CONN_MAX_AGE=0. Validarlo antes contra el MySQL de producción
+#   (MYSQL_TEST_HOST=... pytest -k MySQLPool y benchmark_conexiones).
+DB_POOL = int(os.environ.get('DB_POOL', '0'))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'control_stock1',
-        'USER': 'root',
-        'PASSWORD': '',
-        'HOST': 'localhost',
-        'PORT': '3306',
+        'ENGINE': 'control_stock.mysql_pool' if DB_POOL else 'django.db.backends.mysql',
+        'NAME': os.environ.get('DB_NAME', 'control_stock1'),
+        'USER': os.environ.get('DB_USER', 'root'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '3306'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_HEALTH_CHECKS', '1') == '1',
         'OPTIONS': {
             'init_command': 'SET default_storage_engine=INNODB',
         }
     }
 }
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {'max_size': DB_POOL}
+
+# Réplica de lectura opcional (DB_REPLICA_HOST): el dashboard, los reportes y la
+# API de consulta leen de ella; ver control_stock/routers.py. DB_REPLICA_PIN son
+# los segundos que un navegador sigue leyendo de la primaria tras escribir
+# (debe cubrir el retraso de replicación).
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICA = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['control_stock.routers.ReplicaRouter']
+REPLICA_PIN_SEGUNDOS = int(os.environ.get('DB_REPLICA_PIN', '5'))
+
+# Cache (fragmentos del dashboard). Por defecto en memoria de cada proceso: con varios
+# procesos una invalidación solo llega al proceso que hizo el cambio y los demás ven la
+# lista vieja hasta FRAGMENTOS_TIMEOUT segundos. CACHE_REDIS_URL (requiere el paquete
+# redis) comparte el cache entre procesos y servidores.
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+FRAGMENTOS_TIMEOUT = int(os.environ.get('FRAGMENTOS_TIMEOUT', '300'))
+
+# Sesiones: con un cache compartido (CACHE_REDIS_URL) se leen del cache y se escriben en
+# la base (cached_db); con el cache en memoria de cada proceso quedan en la base, porque
+# un logout en un proceso no borraría la sesión cacheada en los demás.
+SESSION_ENGINE = os.environ.get(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if os.environ.get('CACHE_REDIS_URL')
+    else 'django.contrib.sessions.backends.db',
+)
+# El usuario de la sesión se cachea USUARIO_CACHE_TIMEOUT segundos (inventory/autenticacion.py)
+AUTHENTICATION_BACKENDS = ['inventory.autenticacion.UsuarioCacheadoBackend']
+USUARIO_CACHE_TIMEOUT = int(os.environ.get('USUARIO_CACHE_TIMEOUT', '60'))
+# Login: fallos permitidos por usuario y por IP antes de bloquear LOGIN_BLOQUEO_SEGUNDOS
+LOGIN_INTENTOS = int(os.environ.get('LOGIN_INTENTOS', '5'))
+LOGIN_INTENTOS_IP = int(os.environ.get('LOGIN_INTENTOS_IP', '50'))
+LOGIN_BLOQUEO_SEGUNDOS = int(os.environ.get('LOGIN_BLOQUEO_SEGUNDOS', '900'))
 
 
 
@@ -150,9 +239,10 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
-EMAIL_HOST_USER = "anghello3569molina@gmail.com"
-EMAIL_HOST_PASSWORD = "qzvebjzifrjwphgg"
\ No newline at end of file
+# Correo (alertas de stock bajo). Las credenciales van solo en variables de entorno.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '1') == '1'
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
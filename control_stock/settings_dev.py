@@ -0,0 +1,9 @@
+"""
+Settings de desarrollo (las usa manage.py por defecto): DEBUG activo y los
+correos a la consola salvo que EMAIL_BACKEND indique otro.
+"""
+from .settings import *  # noqa: F401,F403
+
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
+
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -0,0 +1,58 @@
+"""
+Settings de producción (las usan wsgi.py y asgi.py por defecto):
+
+    DJANGO_SETTINGS_MODULE=control_stock.settings_prod
+
+- Sin DEBUG: las conexiones no guardan el SQL de cada consulta en memoria,
+  que en los procesos de larga vida (workers, comandos con millones de filas)
+  crece con cada consulta.
+- DJANGO_SECRET_KEY es obligatoria.
+- Los estáticos llevan hash en el nombre y se precomprimen (gzip, brotli si
+  está instalado) al correr collectstatic, que hay que correr en cada
+  despliegue: sin el manifiesto {% static %} falla. Los sirve el propio
+  proceso salvo ESTATICOS_SERVIR=0 (ver control_stock/estaticos.py).
+- Templates compilados una sola vez por proceso (loader en cache, sin
+  información de depuración por nodo).
+- PANEL_ADMIN=0 deja fuera el admin de Django: no se importan sus módulos ni
+  los ModelAdmin al levantar cada worker.
+
+La memoria y el tiempo de arranque por worker se miden con
+``python manage.py medir_arranque``.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+if 'DJANGO_SECRET_KEY' not in os.environ:
+    raise ImproperlyConfigured('Falta la variable de entorno DJANGO_SECRET_KEY.')
+
+if os.environ.get('PANEL_ADMIN', '1') != '1':
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app != 'django.contrib.admin']
+
+ESTATICOS_SERVIR = os.environ.get('ESTATICOS_SERVIR', '1') == '1'
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'control_stock.estaticos.EstaticosComprimidos'},
+}
+
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,  # los loaders van explícitos
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'context_processors': [
+            procesador for procesador in TEMPLATES[0]['OPTIONS']['context_processors']
+            if procesador != 'django.template.context_processors.debug'
+        ],
+        'debug': False,
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
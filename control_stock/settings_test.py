@@ -0,0 +1,33 @@
+"""
+Settings para correr los tests sin MySQL: dos bases SQLite locales, una como
+primaria y otra como réplica, para probar el router de lectura.
+
+    python manage.py test --settings=control_stock.settings_test [--nmas1 UMBRAL]
+"""
+import tempfile
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+
+# Los tests usan bases en memoria; estos archivos solo se abren si algo se conecta
+# fuera de ellas (system checks), por eso van al directorio temporal y no al repo
+_TMP = Path(tempfile.gettempdir())
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _TMP / 'control_stock_test_primaria.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _TMP / 'control_stock_test_replica.sqlite3',
+    },
+}
+DATABASE_REPLICA = 'replica'
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+TEST_RUNNER = 'control_stock.test_runner.Runner'
+# En los tests un N+1 sobre el umbral falla el test (el umbral lo fija --nmas1 o NMAS1_UMBRAL)
+NMAS1_ACCION = 'error'
+# Sin cache entre tests: los fragmentos se renderizan siempre (los tests de cache usan override_settings)
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+# Hash rápido: los tests de login no necesitan el costo de PBKDF2
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class Runner(DiscoverRunner):
+    """DiscoverRunner con --nmas1 UMBRAL: cada request de los tests falla si repite una consulta más de UMBRAL veces."""
+
+    def __init__(self, nmas1=None, **kwargs):
+        super().__init__(**kwargs)
+        self.nmas1 = nmas1
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--nmas1', type=int, metavar='UMBRAL',
+            help='Falla los requests que repiten una misma consulta más de UMBRAL veces (detector de N+1).',
+        )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        if self.nmas1 is not None:
+            settings.NMAS1_UMBRAL = self.nmas1
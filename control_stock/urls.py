@@ -1,14 +1,33 @@
+from django.apps import apps
 from django.urls import path
-from inventory import views
-from django.contrib import admin
+from inventory import views, api
+from control_stock import metricas
 
 urlpatterns = [
     path('', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('eventos/', views.eventos, name='eventos'),
+    path('buscar/', views.buscar, name='buscar'),
     path('pedido/<int:pk>/detalle/', views.pedido_detalle, name='pedido_detalle'),
     path('generar_qr/<int:pk>/', views.generar_qr, name='generar_qr'),
-    path('admin/', admin.site.urls),
     path('completar-pedido-qr/', views.completar_pedido_qr, name='completar_pedido_qr'),
     path('pedido/<int:pk>/qr/', views.pedido_qr_publico, name='pedido_qr_publico'),
-]
\ No newline at end of file
+    path('pedido/<int:pk>/lineas.csv', views.exportar_lineas_pedido, name='exportar_lineas_pedido'),
+    path('api/inventario/', api.inventario_lista, name='api_inventario'),
+    path('api/inventario/<int:producto_id>/', api.inventario_detalle, name='api_inventario_detalle'),
+    path('api/movimientos/', api.movimientos, name='api_movimientos'),
+    path('api/escaneo/', api.escaneo, name='api_escaneo'),
+    path('api/pedidos/', api.pedidos_lista, name='api_pedidos'),
+    path('api/pedidos/<int:pk>/', api.pedido_estado, name='api_pedido_estado'),
+    path('api/pedidos/<int:pk>/lineas/', api.pedido_lineas, name='api_pedido_lineas'),
+    path('api/pedidos/<int:pk>/clonar/', api.pedido_clonar, name='api_pedido_clonar'),
+    path('api/sync/', api.sincronizar, name='api_sync'),
+    path('metricas/', metricas.metricas, name='metricas'),
+]
+
+# settings_prod con PANEL_ADMIN=0 deja el admin fuera de INSTALLED_APPS
+if apps.is_installed('django.contrib.admin'):
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
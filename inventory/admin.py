@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Producto, Inventario, Proveedor,  Reporte,Transaction,Empresa,Pedido,PedidoItem
+from .models import User, Producto, Inventario, Proveedor,  Reporte,Transaction,Empresa,Pedido,PedidoItem,PronosticoDemanda,SnapshotStock,TransactionArchivada,ResumenArchivo,TokenAPI,ClaveIdempotencia,Bodega,StockBodega,Lote
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 
@@ -34,13 +34,59 @@ class UserAdmin(BaseUserAdmin):
     ordering = ('username',)
     filter_horizontal = ()
 
+class EmpresaAdmin(admin.ModelAdmin):
+    """
+    Modelos de una empresa o que apuntan a uno. El staff con empresa administra
+    solo la suya; el superusuario sin empresa, todas (fuera del admin no ve
+    ninguna, ver tenancy.py).
+    """
+    def _todas(self, request):
+        return request.user.is_superuser and request.user.empresa_id is None
+
+    def get_queryset(self, request):
+        if not self._todas(request) or not hasattr(self.model, 'todas_las_empresas'):
+            return super().get_queryset(request)
+        qs = self.model.todas_las_empresas.get_queryset()
+        ordering = self.get_ordering(request)
+        return qs.order_by(*ordering) if ordering else qs
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        relacionado = db_field.remote_field.model
+        if self._todas(request) and hasattr(relacionado, 'todas_las_empresas'):
+            kwargs.setdefault('queryset', relacionado.todas_las_empresas.all())
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+class TransactionAdmin(EmpresaAdmin):
+    """El historial es de solo inserción (Transaction.save): en el admin solo se consulta."""
+    list_display = ('fecha', 'tipo', 'cantidad', 'inventario', 'bodega', 'descripcion')
+    list_filter = ('tipo',)
+    list_select_related = ('inventario__producto', 'bodega')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Registra el modelo User con el UserAdmin personalizado
 admin.site.register(User, UserAdmin)
-admin.site.register(Inventario)
-admin.site.register(Proveedor)
-admin.site.register(Pedido)
-admin.site.register(PedidoItem)
-admin.site.register(Reporte)
-admin.site.register(Producto)
-admin.site.register(Transaction)
+admin.site.register(Inventario, EmpresaAdmin)
+admin.site.register(Proveedor, EmpresaAdmin)
+admin.site.register(Pedido, EmpresaAdmin)
+admin.site.register(PedidoItem, EmpresaAdmin)
+admin.site.register(Reporte, EmpresaAdmin)
+admin.site.register(Producto, EmpresaAdmin)
+admin.site.register(Transaction, TransactionAdmin)
 admin.site.register(Empresa)
+admin.site.register(PronosticoDemanda, EmpresaAdmin)
+admin.site.register(SnapshotStock, EmpresaAdmin)
+admin.site.register(TransactionArchivada, EmpresaAdmin)
+admin.site.register(ResumenArchivo, EmpresaAdmin)
+admin.site.register(TokenAPI)
+admin.site.register(ClaveIdempotencia)
+admin.site.register(Bodega, EmpresaAdmin)
+admin.site.register(StockBodega, EmpresaAdmin)
+admin.site.register(Lote, EmpresaAdmin)
\ No newline at end of file
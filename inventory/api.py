@@ -0,0 +1,465 @@
+"""
+API JSON para escáneres e integraciones.
+
+Autenticación con la cabecera ``Authorization: Token <key>`` (ver TokenAPI),
+paginación por cursor (``?cursor=`` devuelto en ``next``), selección de campos
+con ``?fields=a,b`` y ETag sobre el cuerpo de la respuesta (``If-None-Match``
+devuelve 304). Ninguna vista renderiza templates.
+"""
+import base64
+import hashlib
+import json
+import zlib
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Prefetch
+from django.forms import ValidationError
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+
+from . import codigos, ledger, lineas_pedido, sync
+from .idempotency import idempotente
+from .models import Inventario, Pedido, PedidoItem, Producto, TokenAPI
+from .tenancy import usar_empresa
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+# BIGINT con signo: un id mayor hace fallar la consulta en vez de no encontrar filas
+ID_MAXIMO = 2 ** 63 - 1
+MAX_MOVIMIENTOS_POR_LOTE = 1000
+MAX_CUERPO_DESCOMPRIMIDO = 20 * 1024 * 1024
+
+CAMPOS_INVENTARIO = {
+    'id': 'id',
+    'producto_id': 'producto_id',
+    'producto': 'producto__nombre',
+    'unidad': 'producto__unidad',
+    'cantidad': 'cantidad',
+    'stock_reservado': 'stock_reservado',
+    'disponible': 'disponible',
+    'stock_minimo': 'stock_minimo',
+    'fecha_actualizacion': 'fecha_actualizacion',
+}
+CAMPOS_PEDIDO = ['id', 'proveedor', 'estado', 'fecha_pedido', 'fecha_vencimiento', 'items']
+# Mismos roles que crean y editan pedidos en el dashboard
+ROLES_PEDIDOS = ('bodeguero', 'admin')
+
+
+class ErrorAPI(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def respuesta(request, data, status=200):
+    """JsonResponse con ETag; responde 304 si el cliente ya tiene esta versión."""
+    cuerpo = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    etag = '"%s"' % hashlib.md5(cuerpo.encode()).hexdigest()
+    if request.method == 'GET' and request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(cuerpo, content_type='application/json', status=status)
+    response['ETag'] = etag
+    return response
+
+
+def error(request, message, status=400):
+    return respuesta(request, {'success': False, 'message': message}, status=status)
+
+
+def token_requerido(vista):
+    """
+    Autentica por token y deja el usuario en request.user (una consulta
+    indexada). Activa la empresa del usuario para el resto de la vista.
+    """
+    @csrf_exempt
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        tipo, _, key = request.headers.get('Authorization', '').partition(' ')
+        if tipo != 'Token' or not key:
+            return error(request, 'Token no proporcionado.', 401)
+        token = TokenAPI.objects.select_related('user').filter(key=key, user__is_active=True).first()
+        if token is None:
+            return error(request, 'Token inválido.', 401)
+        request.user = token.user
+        try:
+            with usar_empresa(token.user.empresa_id):
+                return vista(request, *args, **kwargs)
+        except ErrorAPI as e:
+            return error(request, e.message, e.status)
+    return envoltura
+
+
+def metodos(*permitidos):
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in permitidos:
+                raise ErrorAPI('Método no permitido.', 405)
+            return vista(request, *args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def campos_solicitados(request, disponibles):
+    pedidos = request.GET.get('fields')
+    if not pedidos:
+        return list(disponibles)
+    campos = [c.strip() for c in pedidos.split(',') if c.strip()]
+    invalidos = [c for c in campos if c not in disponibles]
+    if invalidos:
+        raise ErrorAPI(f'Campos inválidos: {", ".join(invalidos)}.')
+    return campos
+
+
+def parametro_entero(request, nombre):
+    """Parámetro GET entero no negativo, o None si no viene. ErrorAPI (400) si no es válido."""
+    valor = request.GET.get(nombre)
+    if not valor:
+        return None
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ErrorAPI(f'{nombre} debe ser un número entero.')
+    if not 0 <= numero <= ID_MAXIMO:
+        raise ErrorAPI(f'{nombre} fuera de rango.')
+    return numero
+
+
+def codificar_cursor(ultimo_id):
+    return base64.urlsafe_b64encode(str(ultimo_id).encode()).decode()
+
+
+def paginar(request, qs):
+    """
+    Pagina por id ascendente (queryset de modelos o de values()). Retorna
+    (filas, next) pidiendo limite + 1 filas para no tener que hacer un COUNT.
+    """
+    try:
+        limite = min(int(request.GET.get('limite', LIMITE_POR_DEFECTO)), LIMITE_MAXIMO)
+        cursor = request.GET.get('cursor')
+        desde = int(base64.urlsafe_b64decode(cursor.encode()).decode()) if cursor else 0
+    except (TypeError, ValueError):
+        raise ErrorAPI('Parámetros de paginación inválidos.')
+    if limite < 1:
+        raise ErrorAPI('limite debe ser mayor que 0.')
+    if not 0 <= desde <= ID_MAXIMO:
+        raise ErrorAPI('Parámetros de paginación inválidos.')
+    filas = list(qs.filter(id__gt=desde).order_by('id')[:limite + 1])
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultimo = filas[-1]
+        siguiente = codificar_cursor(ultimo['id'] if isinstance(ultimo, dict) else ultimo.id)
+    return filas, siguiente
+
+
+def _inventario_qs():
+    return Inventario.objects.annotate(disponible=F('cantidad') - F('stock_reservado'))
+
+
+def _valores_inventario(qs, campos):
+    lookups = ['id'] + [CAMPOS_INVENTARIO[c] for c in campos if c != 'id']
+    return qs.values(*lookups)
+
+
+def _serializar_inventario(fila, campos):
+    return {c: fila[CAMPOS_INVENTARIO[c]] for c in campos}
+
+
+@token_requerido
+@metodos('GET')
+def inventario_lista(request):
+    campos = campos_solicitados(request, CAMPOS_INVENTARIO)
+    qs = _inventario_qs()
+    if request.GET.get('q'):
+        qs = qs.filter(producto__nombre__icontains=request.GET['q'])
+    producto_id = parametro_entero(request, 'producto_id')
+    if producto_id is not None:
+        qs = qs.filter(producto_id=producto_id)
+    if request.GET.get('stock_bajo') in ('1', 'true'):
+        qs = qs.filter(disponible__lt=F('stock_minimo'))
+    filas, siguiente = paginar(request, _valores_inventario(qs, campos))
+    return respuesta(request, {
+        'results': [_serializar_inventario(f, campos) for f in filas],
+        'next': siguiente,
+    })
+
+
+@token_requerido
+@metodos('GET')
+def inventario_detalle(request, producto_id):
+    campos = campos_solicitados(request, CAMPOS_INVENTARIO)
+    fila = _valores_inventario(_inventario_qs().filter(producto_id=producto_id), campos).first()
+    if fila is None:
+        raise ErrorAPI('Inventario no encontrado.', 404)
+    return respuesta(request, _serializar_inventario(fila, campos))
+
+
+def leer_json(request):
+    """Lee el cuerpo JSON, descomprimiéndolo si viene con Content-Encoding: gzip."""
+    cuerpo = request.body or b'{}'
+    if request.headers.get('Content-Encoding') == 'gzip':
+        descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            cuerpo = descompresor.decompress(cuerpo, MAX_CUERPO_DESCOMPRIMIDO)
+        except zlib.error:
+            raise ErrorAPI('Cuerpo gzip inválido.')
+        if descompresor.unconsumed_tail:
+            raise ErrorAPI('Cuerpo demasiado grande.', 413)
+    try:
+        return json.loads(cuerpo)
+    except ValueError:
+        raise ErrorAPI('JSON inválido.')
+
+
+def lineas_de_movimiento(datos):
+    """Valida el cuerpo (un movimiento o {"movimientos": [...]}) y resuelve los productos con in_bulk."""
+    items = datos.get('movimientos') if isinstance(datos, dict) and 'movimientos' in datos else [datos]
+    if not isinstance(items, list) or not items:
+        raise ErrorAPI('Se esperaba un movimiento o una lista "movimientos".')
+    if len(items) > MAX_MOVIMIENTOS_POR_LOTE:
+        raise ErrorAPI(f'Máximo {MAX_MOVIMIENTOS_POR_LOTE} movimientos por lote.')
+    try:
+        crudos = [
+            (int(item['producto']), item['tipo'], int(item['cantidad']), item.get('descripcion'))
+            for item in items
+        ]
+    except (KeyError, TypeError, ValueError):
+        raise ErrorAPI('Cada movimiento requiere producto, tipo y cantidad enteros.')
+
+    productos = Producto.objects.in_bulk({p for p, _, _, _ in crudos})
+    faltantes = sorted({p for p, _, _, _ in crudos if p not in productos})
+    if faltantes:
+        raise ErrorAPI(f'Productos inexistentes: {", ".join(map(str, faltantes))}.', 404)
+    return [(productos[p], tipo, cantidad, descripcion) for p, tipo, cantidad, descripcion in crudos]
+
+
+def registrar(lineas, bodega):
+    """
+    Aplica los movimientos. Tipo, cantidad o bodega inválidos son errores del
+    cliente (400); solo la falta de stock, al aplicarlos, es un conflicto (409).
+    """
+    try:
+        ledger.validar_lineas(lineas)
+        if bodega is not None:
+            bodega = ledger.resolver_bodega(bodega, None)
+    except ValidationError as e:
+        raise ErrorAPI(e.messages[0])
+    try:
+        return ledger.registrar_movimientos(lineas, bodega=bodega)
+    except ValidationError as e:
+        raise ErrorAPI(e.messages[0], 409)
+
+
+def resultado_movimientos(inventarios, movimientos):
+    return {
+        'success': True,
+        'movimientos': [{
+            'id': m.id,
+            'producto_id': m.inventario.producto_id,
+            'tipo': m.tipo,
+            'cantidad': m.cantidad,
+            'fecha': m.fecha,
+        } for m in movimientos],
+        'inventario': [{
+            'producto_id': inv.producto_id,
+            'cantidad': inv.cantidad,
+            'stock_reservado': inv.stock_reservado,
+            'disponible': inv.cantidad - inv.stock_reservado,
+        } for inv in inventarios],
+    }
+
+
+@token_requerido
+@metodos('POST')
+@idempotente
+def movimientos(request):
+    datos = leer_json(request)
+    lineas = lineas_de_movimiento(datos)
+    # "bodega" (id) opcional a nivel del cuerpo; sin ella, la principal
+    bodega = datos.get('bodega') if isinstance(datos, dict) else None
+    inventarios, creados = registrar(lineas, bodega)
+    return respuesta(request, resultado_movimientos(inventarios, creados), status=201)
+
+
+def _producto_escaneado(codigo):
+    if not isinstance(codigo, (str, int)) or not codigos.normalizar(codigo):
+        raise ErrorAPI('Se requiere "codigo".')
+    producto = codigos.resolver(codigo)
+    if producto is None:
+        raise ErrorAPI(f'No hay un producto con el código {codigos.normalizar(codigo)}.', 404)
+    return producto
+
+
+@token_requerido
+@metodos('GET', 'POST')
+@idempotente
+def escaneo(request):
+    """
+    GET ?codigo= devuelve el producto del código (barras o SKU) con su stock.
+    POST {"codigo", "tipo", "cantidad", "bodega"?, "descripcion"?} resuelve
+    el código y aplica el movimiento en la misma llamada.
+    """
+    if request.method == 'GET':
+        producto = _producto_escaneado(request.GET.get('codigo'))
+        inventario = Inventario.objects.filter(producto=producto).first()
+        cantidad = inventario.cantidad if inventario else 0
+        reservado = inventario.stock_reservado if inventario else 0
+        return respuesta(request, {
+            'producto_id': producto.pk, 'producto': producto.nombre, 'unidad': producto.unidad,
+            'sku': producto.sku, 'codigo_barras': producto.codigo_barras,
+            'cantidad': cantidad, 'stock_reservado': reservado, 'disponible': cantidad - reservado,
+        })
+    datos = leer_json(request)
+    if not isinstance(datos, dict):
+        raise ErrorAPI('Se esperaba un objeto JSON.')
+    producto = _producto_escaneado(datos.get('codigo'))
+    try:
+        linea = (producto, datos['tipo'], int(datos['cantidad']), datos.get('descripcion'))
+    except (KeyError, TypeError, ValueError):
+        raise ErrorAPI('El movimiento requiere tipo y cantidad entera.')
+    inventarios, creados = registrar([linea], datos.get('bodega'))
+    return respuesta(request, resultado_movimientos(inventarios, creados), status=201)
+
+
+def _serializar_pedido(pedido, campos):
+    datos = {
+        'id': pedido.id,
+        'proveedor': pedido.proveedor.nombre,
+        'estado': pedido.estado,
+        'fecha_pedido': pedido.fecha_pedido,
+        'fecha_vencimiento': pedido.fecha_vencimiento,
+        'items': [
+            {'producto_id': i.producto_id, 'producto': i.producto.nombre, 'cantidad': i.cantidad}
+            for i in pedido.items.all()
+        ] if 'items' in campos else None,
+    }
+    return {c: datos[c] for c in campos}
+
+
+def _pedidos_qs(campos):
+    qs = Pedido.objects.select_related('proveedor')
+    if 'items' in campos:
+        qs = qs.prefetch_related(Prefetch('items', queryset=PedidoItem.objects.select_related('producto')))
+    return qs
+
+
+@token_requerido
+@metodos('GET')
+def pedidos_lista(request):
+    campos = campos_solicitados(request, CAMPOS_PEDIDO)
+    qs = _pedidos_qs(campos)
+    if request.GET.get('estado'):
+        qs = qs.filter(estado=request.GET['estado'])
+    pedidos, siguiente = paginar(request, qs)
+    return respuesta(request, {
+        'results': [_serializar_pedido(p, campos) for p in pedidos],
+        'next': siguiente,
+    })
+
+
+@token_requerido
+@metodos('GET')
+def pedido_estado(request, pk):
+    campos = campos_solicitados(request, CAMPOS_PEDIDO)
+    pedido = _pedidos_qs(campos).filter(pk=pk).first()
+    if pedido is None:
+        raise ErrorAPI('Pedido no encontrado.', 404)
+    return respuesta(request, _serializar_pedido(pedido, campos))
+
+
+def _pedido(pk, qs=None):
+    pedido = (qs if qs is not None else Pedido.objects).filter(pk=pk).first()
+    if pedido is None:
+        raise ErrorAPI('Pedido no encontrado.', 404)
+    return pedido
+
+
+def _exigir_rol_pedidos(request):
+    if request.user.role not in ROLES_PEDIDOS:
+        raise ErrorAPI('No tienes permiso.', 403)
+
+
+@token_requerido
+@metodos('GET', 'POST')
+@idempotente
+def pedido_lineas(request, pk):
+    """
+    GET exporta las líneas del pedido como JSON {"lineas": [...]} o, con
+    ?formato=csv, como CSV. POST las importa en lote (ver lineas_pedido.py)
+    desde JSON {"lineas": [...], "reemplazar": bool} o desde un cuerpo
+    text/csv con ?reemplazar=1 opcional.
+    """
+    if request.method == 'GET':
+        pedido = _pedido(pk)
+        if request.GET.get('formato') == 'csv':
+            response = HttpResponse(lineas_pedido.lineas_csv(pedido), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="pedido_{pedido.pk}.csv"'
+            return response
+        return respuesta(request, {'lineas': lineas_pedido.exportar(pedido)})
+
+    _exigir_rol_pedidos(request)
+    pedido = _pedido(pk)
+    if request.content_type == 'text/csv':
+        filas = lineas_pedido.leer_lineas(request.body, 'csv')
+        reemplazar = request.GET.get('reemplazar') in ('1', 'true')
+    else:
+        datos = leer_json(request)
+        filas = datos.get('lineas') if isinstance(datos, dict) else datos
+        reemplazar = isinstance(datos, dict) and bool(datos.get('reemplazar'))
+    try:
+        cantidades = lineas_pedido.resolver_lineas(filas)
+    except ValidationError as e:
+        raise ErrorAPI(' '.join(e.messages))
+    try:
+        lineas_pedido.agregar_lineas(pedido, cantidades, reemplazar=reemplazar)
+    except ValidationError as e:
+        raise ErrorAPI(' '.join(e.messages), 409)
+    return respuesta(request, _serializar_pedido(_pedido(pk, _pedidos_qs(CAMPOS_PEDIDO)), CAMPOS_PEDIDO), status=201)
+
+
+@token_requerido
+@metodos('POST')
+@idempotente
+def pedido_clonar(request, pk):
+    """Crea un pedido Pendiente con el proveedor, la bodega y las líneas del pedido pk."""
+    _exigir_rol_pedidos(request)
+    try:
+        nuevo = lineas_pedido.clonar(_pedido(pk))
+    except ValidationError as e:
+        raise ErrorAPI(' '.join(e.messages), 409)
+    return respuesta(request, _serializar_pedido(_pedido(nuevo.pk, _pedidos_qs(CAMPOS_PEDIDO)), CAMPOS_PEDIDO), status=201)
+
+
+@gzip_page
+@token_requerido
+@metodos('POST')
+@idempotente
+def sincronizar(request):
+    """
+    Cuerpo (opcionalmente gzip): {"token_sync", "dispositivo", "operaciones": [
+    {"id", "fecha", "accion": "movimiento", "producto", "tipo", "cantidad"} o
+    {"id", "fecha", "accion": "completar_pedido", "pedido"}]}. Los movimientos
+    aceptan "bodega" (id); sin ella se aplican en la bodega principal.
+    """
+    datos = leer_json(request)
+    if not isinstance(datos, dict):
+        raise ErrorAPI('Se esperaba un objeto JSON.')
+    try:
+        resultado = sync.sincronizar(
+            request.user,
+            datos.get('operaciones', []),
+            token=datos.get('token_sync'),
+            dispositivo=str(datos.get('dispositivo', ''))[:50],
+            ruta=request.path,
+        )
+    except sync.ErrorSync as e:
+        raise ErrorAPI(str(e))
+    except ValidationError as e:
+        # Lotes vencidos (lotes.asignar): el lote completo se rechaza sin aplicar nada
+        raise ErrorAPI(e.messages[0], 409)
+    return respuesta(request, {'success': True, **resultado})
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import busqueda, events  # noqa: F401  events registra los signals del feed en vivo
+        post_migrate.connect(busqueda.preparar_indices, sender=self)
@@ -0,0 +1,116 @@
+"""
+Archivado de movimientos antiguos.
+
+Mueve las filas de Transaction anteriores a un horizonte hacia
+TransactionArchivada en lotes cortos (cada lote es su propia transacción, así
+no se mantienen bloqueos largos). Antes de mover nada se toma un snapshot al
+cierre del día previo al corte y cada lote suma sus totales en ResumenArchivo,
+de modo que el stock histórico y los KPIs del dashboard siguen cuadrando.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from . import ledger
+from .models import ResumenArchivo, Transaction, TransactionArchivada
+from .tenancy import EnEmpresaActual
+
+HORIZONTE_DIAS = 365
+HORIZONTE_MINIMO = 30  # el dashboard y el pronóstico leen las últimas semanas
+TAMANO_LOTE = 5000
+CAMPOS = ('id', 'inventario_id', 'bodega_id', 'tipo', 'cantidad', 'fecha', 'descripcion')
+
+
+def limite_archivo():
+    """Fecha del movimiento archivado más reciente, o None si no hay archivo."""
+    return TransactionArchivada.objects.aggregate(limite=Max('fecha'))['limite']
+
+
+def _acumular_resumen(lote):
+    totales = defaultdict(lambda: [0, 0])
+    for fila in lote:
+        acumulado = totales[(fila['inventario_id'], fila['tipo'])]
+        acumulado[0] += fila['cantidad']
+        acumulado[1] += 1
+
+    existentes = {
+        (r.inventario_id, r.tipo): r
+        for r in ResumenArchivo.objects.select_for_update().filter(
+            inventario_id__in={inv_id for inv_id, _ in totales}
+        )
+    }
+    nuevos = []
+    for (inv_id, tipo), (cantidad, movimientos) in totales.items():
+        resumen = existentes.get((inv_id, tipo))
+        if resumen:
+            resumen.cantidad += cantidad
+            resumen.movimientos += movimientos
+        else:
+            nuevos.append(ResumenArchivo(
+                inventario_id=inv_id, tipo=tipo, cantidad=cantidad, movimientos=movimientos
+            ))
+    ResumenArchivo.objects.bulk_create(nuevos)
+    ResumenArchivo.objects.bulk_update(existentes.values(), ['cantidad', 'movimientos'])
+
+
+def archivar(dias=HORIZONTE_DIAS, tamano_lote=TAMANO_LOTE, hoy=None):
+    """
+    Archiva los movimientos con fecha anterior a hoy - dias.
+    Retorna la cantidad de movimientos archivados.
+    """
+    if dias < HORIZONTE_MINIMO:
+        raise ValueError(f'El horizonte mínimo es de {HORIZONTE_MINIMO} días.')
+    corte_dia = (hoy or timezone.localdate()) - timedelta(days=dias)
+    corte = ledger.inicio_del_dia(corte_dia)
+
+    # Snapshot al cierre del día previo al corte: el stock actual e histórico
+    # posterior ya no necesita leer las filas que se van a mover.
+    ledger.tomar_snapshot(corte_dia - timedelta(days=1))
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            lote = list(
+                Transaction.objects.filter(fecha__lt=corte).order_by('id').values(*CAMPOS)[:tamano_lote]
+            )
+            if not lote:
+                break
+            TransactionArchivada.objects.bulk_create([TransactionArchivada(**fila) for fila in lote])
+            _acumular_resumen(lote)
+            Transaction.objects.filter(id__in=[fila['id'] for fila in lote]).delete()
+        total += len(lote)
+    return total
+
+
+def movimientos(desde=None, hasta=None, tipo=None):
+    """
+    Movimientos entre desde y hasta como (producto, tipo, cantidad, fecha),
+    ordenados por fecha. Solo consulta el archivo si el rango lo alcanza.
+    """
+    def filtrar(qs):
+        if desde:
+            qs = qs.filter(fecha__gte=desde)
+        if hasta:
+            qs = qs.filter(fecha__lte=hasta)
+        if tipo:
+            qs = qs.filter(tipo=tipo)
+        return qs.values_list('inventario__producto__nombre', 'tipo', 'cantidad', 'fecha')
+
+    qs = filtrar(Transaction.objects.all())
+    limite = limite_archivo()
+    if limite is not None and (desde is None or desde <= limite):
+        archivados = TransactionArchivada.objects.filter(EnEmpresaActual('inventario__empresa'))
+        qs = qs.union(filtrar(archivados), all=True)
+    return qs.order_by('fecha')
+
+
+def egresos_archivados():
+    """(ventas, costo) de los egresos archivados, valorizados con los precios actuales."""
+    totales = ResumenArchivo.objects.filter(EnEmpresaActual('inventario__empresa'), tipo='egreso').aggregate(
+        ventas=Sum(F('cantidad') * F('inventario__producto__precio_venta')),
+        costo=Sum(F('cantidad') * F('inventario__producto__precio_unitario')),
+    )
+    return totales['ventas'] or 0, totales['costo'] or 0
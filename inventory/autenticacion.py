@@ -0,0 +1,69 @@
+"""
+Autenticación con menos trabajo por request y por intento de login.
+
+- UsuarioCacheadoBackend: el usuario de la sesión (con su empresa) se lee del
+  cache en vez de MySQL en cada request. Las señales de models.py lo borran
+  al guardar o eliminar el usuario o su empresa; con el cache en memoria de
+  cada proceso los demás procesos lo ven hasta USUARIO_CACHE_TIMEOUT
+  segundos después (igual que los fragmentos, ver fragmentos.py).
+- Límite de intentos de login: los fallos se cuentan en el cache por usuario
+  y por IP; sobre LOGIN_INTENTOS (o LOGIN_INTENTOS_IP) el login se rechaza
+  sin hashear la contraseña ni consultar la base hasta que pasen
+  LOGIN_BLOQUEO_SEGUNDOS desde el último fallo.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def clave_usuario(user_id):
+    return f'usuario:{user_id}'
+
+
+class UsuarioCacheadoBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        clave = clave_usuario(user_id)
+        user = cache.get(clave)
+        if user is None:
+            user = get_user_model()._default_manager.select_related('empresa').filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(clave, user, settings.USUARIO_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
+
+
+def _claves_login(request, username):
+    # El usuario va como hash: la clave no depende de lo que se escriba en el formulario
+    usuario = hashlib.sha256(username.strip().lower().encode()).hexdigest()[:32]
+    return f'login:usuario:{usuario}', f'login:ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def login_bloqueado(request, username):
+    por_usuario, por_ip = _claves_login(request, username)
+    fallos = cache.get_many([por_usuario, por_ip])
+    return (
+        fallos.get(por_usuario, 0) >= settings.LOGIN_INTENTOS
+        or fallos.get(por_ip, 0) >= settings.LOGIN_INTENTOS_IP
+    )
+
+
+def registrar_fallo_login(request, username):
+    for clave in _claves_login(request, username):
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 1, settings.LOGIN_BLOQUEO_SEGUNDOS)
+        else:
+            cache.touch(clave, settings.LOGIN_BLOQUEO_SEGUNDOS)
+
+
+def limpiar_fallos_login(request, username):
+    cache.delete(_claves_login(request, username)[0])
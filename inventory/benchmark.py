@@ -0,0 +1,220 @@
+"""
+Suite de rendimiento de los caminos críticos: dashboard, ingresos/egresos y
+pedidos.
+
+Siembra una empresa propia con el generador de inventory/sintetico.py
+(catálogo, historial y pedidos), mide y la borra al terminar; el resto de las
+empresas no se toca. Los datos se confirman (no se usa un atomic con
+rollback) porque los hilos de la medición de movimientos abren sus propias
+conexiones y tienen que verlos.
+
+Se corre con ``python manage.py benchmark`` o, con la base de tests, desde
+inventory/tests_benchmark.py (``BENCHMARK=1``). ejecutar() retorna el reporte
+como dict listo para json.dump; las latencias van en milisegundos.
+"""
+import random
+import statistics
+import threading
+import time as reloj
+import uuid
+from collections import defaultdict
+
+import django
+from django.db import connection
+from django.forms import ValidationError
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import ledger, sintetico
+from .models import Pedido, Producto, Proveedor, Transaction, User
+from .tenancy import usar_empresa
+
+PANELES = ['dashboard', 'graficos', 'ingreso', 'egreso', 'centro', 'concepto-ingreso', 'concepto-egreso',
+           'rcv', 'parametros-sii', 'lista-pedidos']
+STOCK_INICIAL = 1_000_000
+
+POR_DEFECTO = {
+    'productos': 500,
+    'movimientos': 20,        # por producto
+    'pedidos': 200,
+    'lineas_pedido': 5,       # promedio de líneas de los pedidos sembrados
+    'repeticiones': 10,
+    'hilos': [1, 4, 8],
+    'operaciones': 200,       # por hilo
+    'lineas': [1, 10, 50],    # tamaños de pedido a medir
+    'semilla': 1,
+}
+
+
+def _percentiles(muestras):
+    muestras = sorted(muestras)
+    if len(muestras) == 1:
+        return {'p50_ms': round(muestras[0] * 1000, 2), 'p95_ms': round(muestras[0] * 1000, 2)}
+    cortes = statistics.quantiles(muestras, n=100, method='inclusive')
+    return {'p50_ms': round(cortes[49] * 1000, 2), 'p95_ms': round(cortes[94] * 1000, 2)}
+
+
+def sembrar(productos, movimientos, pedidos, lineas_pedido, semilla):
+    """
+    Crea la empresa del benchmark y la llena con sintetico.generar, el mismo
+    generador de generar_datos, así las corridas con igual semilla comparan
+    los mismos datos. movimientos es por producto y cada producto parte con
+    STOCK_INICIAL, para que los egresos medidos no se queden sin saldo.
+    Retorna (empresa, usuario).
+    """
+    marca = uuid.uuid4().hex[:8]
+    empresa = sintetico._empresa(None, semilla, nombre=f'benchmark-{marca}')
+    usuario = User.objects.create_user(f'benchmark-{marca}', password=None, role='admin', empresa=empresa)
+    sintetico.generar(
+        productos, productos * movimientos, pedidos, lineas_pedido, semilla=semilla, empresa_id=empresa.pk,
+        prefijo='bench', stock_inicial=STOCK_INICIAL, informar=lambda mensaje: None,
+    )
+    return empresa, usuario
+
+
+def limpiar(empresa):
+    # Movimientos y pedidos protegen a la bodega (PROTECT): se borran antes que la empresa
+    Transaction.todas_las_empresas.filter(empresa=empresa).delete()
+    Pedido.todas_las_empresas.filter(empresa=empresa).delete()
+    empresa.delete()
+
+
+def medir_paneles(usuario, repeticiones):
+    """Tiempo de render y consultas del dashboard con cada panel activo."""
+    cliente = Client()
+    cliente.force_login(usuario)
+    resultado = {}
+    for panel in PANELES:
+        url = reverse('dashboard') + f'?panel={panel}'
+        cliente.get(url)  # calentar
+        latencias = []
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = reloj.perf_counter()
+                response = cliente.get(url)
+                latencias.append(reloj.perf_counter() - inicio)
+            assert response.status_code == 200, (panel, response.status_code)
+        resultado[panel] = {**_percentiles(latencias), 'consultas': len(consultas)}
+    return resultado
+
+
+def _trabajador(empresa_id, productos, operaciones, semilla, conteo, barrera):
+    rnd = random.Random(semilla)
+    barrera.wait()
+    try:
+        with usar_empresa(empresa_id):
+            for _ in range(operaciones):
+                tipo = rnd.choice(('ingreso', 'egreso'))
+                try:
+                    ledger.registrar_movimiento(rnd.choice(productos), tipo, rnd.randint(1, 5))
+                    conteo['ok'] += 1
+                except ValidationError:
+                    conteo['rechazadas'] += 1
+                except Exception:
+                    # Bloqueos o deadlocks de la base: cuentan como error, no detienen la medición
+                    conteo['errores'] += 1
+    finally:
+        connection.close()
+
+
+def medir_movimientos(empresa, hilos, operaciones, semilla):
+    """Ingresos/egresos por segundo con N hilos concurrentes, cada uno con su conexión."""
+    productos = list(Producto.todas_las_empresas.filter(empresa=empresa))
+    resultado = {}
+    for n in hilos:
+        conteos = [defaultdict(int) for _ in range(n)]
+        barrera = threading.Barrier(n + 1)
+        trabajadores = [
+            threading.Thread(target=_trabajador, args=(empresa.pk, productos, operaciones, semilla + i, conteos[i], barrera))
+            for i in range(n)
+        ]
+        for t in trabajadores:
+            t.start()
+        barrera.wait()
+        inicio = reloj.perf_counter()
+        for t in trabajadores:
+            t.join()
+        duracion = reloj.perf_counter() - inicio
+        total = {clave: sum(c[clave] for c in conteos) for clave in ('ok', 'rechazadas', 'errores')}
+        resultado[str(n)] = {
+            **total,
+            'segundos': round(duracion, 3),
+            'ops_por_segundo': round(total['ok'] / duracion, 1) if duracion else None,
+        }
+    return resultado
+
+
+def _datos_pedido(proveedor, productos):
+    datos = {
+        'form_type': 'pedido',
+        'proveedor': proveedor.pk,
+        'estado': 'Pendiente',
+        'items-TOTAL_FORMS': len(productos),
+        'items-INITIAL_FORMS': 0,
+        'items-MIN_NUM_FORMS': 0,
+        'items-MAX_NUM_FORMS': 1000,
+    }
+    for i, producto in enumerate(productos):
+        datos[f'items-{i}-producto'] = producto.pk
+        datos[f'items-{i}-cantidad'] = 1
+    return datos
+
+
+def medir_pedidos(usuario, lineas, repeticiones, semilla):
+    """Latencia y consultas de crear (formulario del dashboard) y completar (QR) según líneas."""
+    rnd = random.Random(semilla)
+    cliente = Client()
+    cliente.force_login(usuario)
+    with usar_empresa(usuario.empresa_id):
+        productos = list(Producto.objects.all())
+        proveedor = Proveedor.objects.first()
+    resultado = {}
+    for n in lineas:
+        crear, completar = [], []
+        consultas_crear = consultas_completar = 0
+        for _ in range(repeticiones):
+            elegidos = rnd.sample(productos, min(n, len(productos)))
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = reloj.perf_counter()
+                response = cliente.post(reverse('dashboard'), _datos_pedido(proveedor, elegidos))
+                crear.append(reloj.perf_counter() - inicio)
+            assert response.status_code == 302, ('crear', n, response.status_code)
+            consultas_crear = len(consultas)
+            pedido_id = Pedido.todas_las_empresas.filter(empresa_id=usuario.empresa_id).latest('id').pk
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = reloj.perf_counter()
+                response = cliente.post(reverse('completar_pedido_qr'), {'pedido_id': pedido_id})
+                completar.append(reloj.perf_counter() - inicio)
+            assert response.json()['success'], ('completar', n, response.content)
+            consultas_completar = len(consultas)
+        resultado[str(n)] = {
+            'crear': {**_percentiles(crear), 'consultas': consultas_crear},
+            'completar': {**_percentiles(completar), 'consultas': consultas_completar},
+        }
+    return resultado
+
+
+def ejecutar(**opciones):
+    """Siembra, mide las tres suites y limpia. Retorna el reporte."""
+    opciones = {**POR_DEFECTO, **{k: v for k, v in opciones.items() if v is not None}}
+    inicio = reloj.perf_counter()
+    empresa, usuario = sembrar(
+        opciones['productos'], opciones['movimientos'], opciones['pedidos'],
+        opciones['lineas_pedido'], opciones['semilla'],
+    )
+    sembrado = reloj.perf_counter() - inicio
+    try:
+        return {
+            'fecha': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'base_de_datos': connection.vendor,
+            'parametros': opciones,
+            'sembrado_segundos': round(sembrado, 2),
+            'dashboard': medir_paneles(usuario, opciones['repeticiones']),
+            'movimientos': medir_movimientos(empresa, opciones['hilos'], opciones['operaciones'], opciones['semilla']),
+            'pedidos': medir_pedidos(usuario, opciones['lineas'], opciones['repeticiones'], opciones['semilla']),
+        }
+    finally:
+        limpiar(empresa)
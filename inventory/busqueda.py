@@ -0,0 +1,128 @@
+"""
+Búsqueda por texto en productos (nombre, descripción), proveedores (nombre,
+contacto) y pedidos (por número).
+
+El índice lo mantiene la propia base, así también cubre bulk_create y
+update(), que no disparan señales:
+
+- MySQL: índices FULLTEXT (migración 0021) consultados con MATCH ... AGAINST
+  en modo booleano; cada término es obligatorio y busca por prefijo.
+- SQLite (desarrollo y tests): una tabla FTS5 por modelo con el contenido en
+  la tabla original, sincronizada con triggers. Se crean en post_migrate
+  (preparar_indices) y no en una migración porque el schema editor de SQLite
+  rehace la tabla al alterarla y con eso borra sus triggers.
+- Otras bases: icontains sin orden por relevancia.
+
+Los resultados se limitan a la empresa activa igual que EmpresaManager.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.db.models import Q
+
+from .models import Pedido, Producto, Proveedor
+from .tenancy import empresa_actual_id
+
+LIMITE = 10
+MAX_TERMINOS = 8
+INDICES = {
+    Producto: ('nombre', 'descripcion'),
+    Proveedor: ('nombre', 'contacto'),
+}
+_TERMINOS = re.compile(r'\w+')
+
+
+def terminos(consulta):
+    return [t[:40] for t in _TERMINOS.findall(consulta.lower())][:MAX_TERMINOS]
+
+
+def _tabla_fts(modelo):
+    return f'{modelo._meta.db_table}_fts'
+
+
+def preparar_indices(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Crea las tablas FTS5 y sus triggers en SQLite si faltan (receptor de post_migrate)."""
+    conexion = connections[using]
+    if conexion.vendor != 'sqlite':
+        return
+    with conexion.cursor() as cursor:
+        for modelo, columnas in INDICES.items():
+            tabla, fts = modelo._meta.db_table, _tabla_fts(modelo)
+            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s "
+                           "AND name LIKE %s", [tabla, f'{fts}_%'])
+            if cursor.fetchone()[0] == 3:
+                continue
+            lista = ', '.join(columnas)
+            insertar = f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.id, {', '.join(f'new.{c}' for c in columnas)});"
+            borrar = (f"INSERT INTO {fts}({fts}, rowid, {lista}) "
+                      f"VALUES ('delete', old.id, {', '.join(f'old.{c}' for c in columnas)});")
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({lista}, content='{tabla}', "
+                           f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabla} BEGIN {insertar} END')
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabla} BEGIN {borrar} END')
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {lista} ON {tabla} '
+                           f'BEGIN {borrar} {insertar} END')
+            # Los triggers recién creados no vieron las filas existentes
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _ranking(modelo, lista_terminos, limite):
+    """[(id, relevancia)] de más a menos relevante, o None si la base no tiene índice de texto."""
+    alias = router.db_for_read(modelo)
+    conexion = connections[alias]
+    tabla = modelo._meta.db_table
+    empresa_id = empresa_actual_id()
+    filtro, params_empresa = ('AND t.empresa_id = %s', [empresa_id]) if empresa_id is not None else ('', [])
+    if conexion.vendor == 'mysql':
+        match = f'MATCH (t.{", t.".join(INDICES[modelo])}) AGAINST (%s IN BOOLEAN MODE)'
+        expresion = ' '.join(f'+{t}*' for t in lista_terminos)
+        sql = (f'SELECT t.id, {match} AS relevancia FROM {tabla} t WHERE {match} {filtro} '
+               f'ORDER BY relevancia DESC, t.id LIMIT %s')
+        params = [expresion, expresion, *params_empresa, limite]
+    elif conexion.vendor == 'sqlite':
+        fts = _tabla_fts(modelo)
+        expresion = ' '.join(f'"{t}"*' for t in lista_terminos)
+        # bm25 (menor cuanto más relevante) se calcula para todas las coincidencias de la
+        # empresa y recién después se corta en limite: cortar antes podía dejar fuera las
+        # más relevantes de un término común. CROSS JOIN fija el orden: primero el índice
+        # de texto, luego la fila por id para filtrar la empresa.
+        sql = (f'SELECT t.id, -bm25({fts}) AS relevancia FROM {fts} '
+               f'CROSS JOIN {tabla} t ON t.id = {fts}.rowid WHERE {fts} MATCH %s {filtro} '
+               f'ORDER BY relevancia DESC, t.id LIMIT %s')
+        params = [expresion, *params_empresa, limite]
+    else:
+        return None
+    with conexion.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _buscar_modelo(modelo, lista_terminos, limite):
+    ranking = _ranking(modelo, lista_terminos, limite)
+    if ranking is None:
+        filtro = Q()
+        for termino in lista_terminos:
+            filtro &= Q.create([(f'{c}__icontains', termino) for c in INDICES[modelo]], connector=Q.OR)
+        return [(obj, None) for obj in modelo.objects.filter(filtro).order_by('nombre')[:limite]]
+    objetos = modelo.objects.in_bulk([pk for pk, _ in ranking])
+    return [(objetos[pk], round(float(relevancia), 3)) for pk, relevancia in ranking if pk in objetos]
+
+
+def buscar(consulta, limite=LIMITE, proveedores=True):
+    """
+    {'productos': [(producto, relevancia)], 'proveedores': [...], 'pedidos': [pedido]}.
+    Los términos numéricos también buscan pedidos por número.
+    """
+    lista_terminos = terminos(consulta)
+    resultado = {'productos': [], 'proveedores': [], 'pedidos': []}
+    if not lista_terminos:
+        return resultado
+    resultado['productos'] = _buscar_modelo(Producto, lista_terminos, limite)
+    if proveedores:
+        resultado['proveedores'] = _buscar_modelo(Proveedor, lista_terminos, limite)
+    numeros = [int(t) for t in lista_terminos if t.isdigit() and len(t) <= 18]
+    if numeros:
+        resultado['pedidos'] = list(
+            Pedido.objects.select_related('proveedor').filter(pk__in=numeros).order_by('-fecha_pedido')[:limite]
+        )
+    return resultado
@@ -0,0 +1,87 @@
+"""
+Resolución de códigos escaneados (SKU o código de barras) a productos.
+
+Los dos códigos son únicos por empresa (restricciones de Producto), así la
+búsqueda por código usa su índice. Cada proceso guarda además un LRU de
+(empresa, código) -> id de producto: un código que se escanea seguido se
+resuelve leyendo el producto por id.
+
+Guardar o eliminar un producto borra sus entradas del LRU del proceso que lo
+hizo (señal en models.py). Los demás procesos no se enteran, por eso el
+producto leído por id se compara con el código: si ya no lo tiene, la
+entrada se descarta y se busca de nuevo por código. Lo mismo cubre los
+update() y bulk_update, que no disparan señales.
+"""
+import threading
+from collections import OrderedDict
+
+from django.db.models import Q
+
+from .models import Producto
+from .tenancy import empresa_actual_id
+
+MAXIMO = 4096
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalizar(codigo):
+    # Los lectores suelen agregar espacios o saltos de línea; los ceros a la izquierda del EAN se conservan
+    return str(codigo).strip()
+
+
+def _leer(clave):
+    with _lock:
+        pk = _cache.get(clave)
+        if pk is not None:
+            _cache.move_to_end(clave)
+        return pk
+
+
+def _guardar(clave, pk):
+    with _lock:
+        _cache[clave] = pk
+        _cache.move_to_end(clave)
+        while len(_cache) > MAXIMO:
+            _cache.popitem(last=False)
+
+
+def _descartar(clave):
+    with _lock:
+        _cache.pop(clave, None)
+
+
+def invalidar_producto(pk):
+    with _lock:
+        for clave in [c for c, valor in _cache.items() if valor == pk]:
+            del _cache[clave]
+
+
+def limpiar():
+    with _lock:
+        _cache.clear()
+
+
+def _tiene_codigo(producto, codigo):
+    return codigo in (producto.codigo_barras, producto.sku)
+
+
+def resolver(codigo):
+    """Producto de la empresa activa con ese código de barras o SKU, o None."""
+    codigo = normalizar(codigo)
+    if not codigo:
+        return None
+    clave = (empresa_actual_id(), codigo)
+    pk = _leer(clave)
+    if pk is not None:
+        producto = Producto.objects.filter(pk=pk).first()
+        if producto is not None and _tiene_codigo(producto, codigo):
+            return producto
+        _descartar(clave)
+    # Un código puede ser el SKU de un producto y el código de barras de otro: gana el código de barras
+    candidatos = list(Producto.objects.filter(Q(codigo_barras=codigo) | Q(sku=codigo))[:2])
+    if not candidatos:
+        return None
+    producto = next((p for p in candidatos if p.codigo_barras == codigo), candidatos[0])
+    _guardar(clave, producto.pk)
+    return producto
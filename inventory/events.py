@@ -0,0 +1,174 @@
+"""
+Feed en vivo de movimientos e inventario (Server-Sent Events sobre ASGI).
+
+Los cambios se publican en un broker al confirmar la transacción. El broker
+por defecto (BrokerLocal) es un pub/sub en memoria del proceso: solo entrega
+los eventos de escrituras hechas en el mismo proceso ASGI, así que con varios
+workers cada navegador ve solo lo que pasó por el suyo (los KPIs se corrigen
+con el siguiente evento). Para varios procesos se reemplaza con
+settings.LIVE_BROKER por una clase con la misma interfaz (publicar /
+suscribir).
+
+El stream solo se sirve bajo ASGI (ver disponible()): bajo WSGI Django
+consumiría el generador asíncrono completo antes de responder y, como no
+termina nunca, dejaría el worker bloqueado.
+"""
+import asyncio
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Inventario, Transaction
+from .tenancy import usar_empresa
+
+TAMANO_COLA = 1000
+INTERVALO_KPIS = 1.0  # segundos: agrupa ráfagas de movimientos en un solo recálculo
+INTERVALO_PING = 15.0
+
+
+class BrokerLocal:
+    """
+    Pub/sub en memoria. publicar() se puede llamar desde cualquier hilo
+    (las vistas síncronas corren en el thread pool de ASGI).
+    """
+
+    def __init__(self):
+        self._suscriptores = {}
+        self._lock = threading.Lock()
+
+    def publicar(self, evento, datos):
+        with self._lock:
+            suscriptores = list(self._suscriptores.items())
+        for cola, loop in suscriptores:
+            loop.call_soon_threadsafe(self._encolar, cola, (evento, datos))
+
+    @staticmethod
+    def _encolar(cola, mensaje):
+        try:
+            cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            pass  # cliente lento: se pierde el evento, el próximo 'kpis' lo corrige
+
+    def suscribir(self):
+        """Retorna una asyncio.Queue de (evento, datos); llamar desde el event loop."""
+        cola = asyncio.Queue(maxsize=TAMANO_COLA)
+        with self._lock:
+            self._suscriptores[cola] = asyncio.get_running_loop()
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock:
+            self._suscriptores.pop(cola, None)
+
+
+def disponible(request):
+    """True si el request llegó por ASGI, el único servidor que puede mantener abierto el stream."""
+    return isinstance(request, ASGIRequest)
+
+
+@lru_cache(maxsize=None)
+def broker():
+    return import_string(getattr(settings, 'LIVE_BROKER', 'inventory.events.BrokerLocal'))()
+
+
+def serializar_movimiento(t):
+    producto = t.inventario.producto
+    return {
+        'id': t.id,
+        'empresa_id': t.empresa_id,
+        'producto': producto.nombre,
+        'tipo': t.tipo,
+        'cantidad': t.cantidad,
+        'fecha': t.fecha,
+        # Mismo cálculo que valor_display en el dashboard
+        'valor': t.cantidad * producto.precio_unitario if t.tipo == 'ingreso'
+        else 0 if t.tipo.startswith(('traslado', 'ajuste'))
+        else -(t.cantidad * (producto.precio_venta - producto.precio_unitario)),
+    }
+
+
+def serializar_inventario(inv):
+    return {
+        'empresa_id': inv.empresa_id,
+        'producto_id': inv.producto_id,
+        'cantidad': inv.cantidad,
+        'stock_reservado': inv.stock_reservado,
+        'disponible': inv.cantidad - inv.stock_reservado,
+    }
+
+
+def _publicar_al_confirmar(evento, datos):
+    mensaje = json.loads(json.dumps(datos, cls=DjangoJSONEncoder))
+    transaction.on_commit(lambda: broker().publicar(evento, mensaje))
+
+
+def publicar_movimientos(movimientos):
+    """Para escrituras con bulk_create, que no disparan post_save."""
+    for t in movimientos:
+        _publicar_al_confirmar('movimiento', serializar_movimiento(t))
+
+
+def publicar_inventarios(inventarios):
+    """Para escrituras con bulk_update, que no disparan post_save."""
+    for inv in inventarios:
+        _publicar_al_confirmar('inventario', serializar_inventario(inv))
+
+
+@receiver(post_save, sender=Transaction)
+def publicar_movimiento(sender, instance, created, **kwargs):
+    if created:
+        _publicar_al_confirmar('movimiento', serializar_movimiento(instance))
+
+
+@receiver(post_save, sender=Inventario)
+def publicar_inventario(sender, instance, **kwargs):
+    _publicar_al_confirmar('inventario', serializar_inventario(instance))
+
+
+def formato_sse(evento, datos):
+    return f"event: {evento}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def flujo_sse(empresa_id):
+    """
+    Generador del stream: KPIs iniciales, luego cada evento publicado y, tras
+    una ráfaga, un solo evento 'kpis' recalculado con una consulta agregada.
+    Solo se envían los eventos y KPIs de empresa_id (con None, ninguno).
+    """
+    from .ledger import akpis_inventario  # ledger importa este módulo
+
+    async def kpis():
+        # El stream sigue después de que el middleware desactivó la empresa del request
+        with usar_empresa(empresa_id):
+            return await akpis_inventario()
+
+    cola = broker().suscribir()
+    try:
+        yield formato_sse('kpis', await kpis())
+        kpis_pendientes = False
+        while True:
+            try:
+                evento, datos = await asyncio.wait_for(
+                    cola.get(), INTERVALO_KPIS if kpis_pendientes else INTERVALO_PING
+                )
+            except asyncio.TimeoutError:
+                if kpis_pendientes:
+                    yield formato_sse('kpis', await kpis())
+                    kpis_pendientes = False
+                else:
+                    yield ': ping\n\n'
+                continue
+            if empresa_id is None or datos.get('empresa_id') != empresa_id:
+                continue
+            yield formato_sse(evento, datos)
+            kpis_pendientes = True
+    finally:
+        broker().desuscribir(cola)
@@ -0,0 +1,188 @@
+"""
+Pronóstico de demanda sobre el historial de egresos (Transaction).
+
+Lee los egresos por tramos de id ya agregados por (inventario, día) en la BD,
+arma una matriz productos x días y calcula con NumPy, para todos los productos
+a la vez, el promedio móvil, el suavizado exponencial y la desviación del
+consumo diario. Con eso propone punto de reorden y stock mínimo.
+
+El suavizado exponencial se guarda en PronosticoDemanda y se actualiza solo con
+los días nuevos (transacciones con id > ultima_transaccion_id), así que un
+refresco diario no vuelve a leer todo el historial.
+"""
+import math
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Inventario, PronosticoDemanda, Transaction
+
+VENTANA_DIAS = 28
+ALFA = 0.3
+DIAS_REPOSICION = 7
+Z_NIVEL_SERVICIO = 1.65  # ~95% de nivel de servicio
+TAMANO_LOTE = 50000
+
+
+def _inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _egresos_por_dia(qs):
+    """Agrupa un queryset de Transaction en filas (inventario_id, dia, total)."""
+    return (
+        qs.filter(tipo='egreso')
+        .order_by()
+        .annotate(dia=TruncDate('fecha'))
+        .values('inventario_id', 'dia')
+        .annotate(total=Sum('cantidad'))
+        .values_list('inventario_id', 'dia', 'total')
+    )
+
+
+def _matriz_diaria(filas, inventario_ids, primer_dia, n_dias):
+    """
+    Convierte filas (inventario_id, dia, total) en una matriz densa de
+    len(inventario_ids) x n_dias. Los días anteriores a primer_dia se acumulan
+    en la primera columna y los inventarios desconocidos se descartan.
+    """
+    matriz = np.zeros((len(inventario_ids), n_dias), dtype=np.float64)
+    # Sin inventarios no hay fila donde sumar (y inventario_ids[fila] fallaría)
+    if not filas or n_dias == 0 or not len(inventario_ids):
+        return matriz
+    inv, dias, totales = zip(*filas)
+    inv = np.asarray(inv, dtype=np.int64)
+    col = np.fromiter((d.toordinal() for d in dias), dtype=np.int64, count=len(dias))
+    col = np.clip(col - primer_dia.toordinal(), 0, n_dias - 1)
+    fila = np.searchsorted(inventario_ids, inv)
+    fila = np.clip(fila, 0, len(inventario_ids) - 1)
+    validos = inventario_ids[fila] == inv
+    plano = fila[validos] * n_dias + col[validos]
+    matriz += np.bincount(
+        plano, weights=np.asarray(totales, dtype=np.float64)[validos], minlength=matriz.size
+    ).reshape(matriz.shape)
+    return matriz
+
+
+def suavizar(niveles, matriz, alfa):
+    """
+    Aplica el suavizado exponencial de todas las columnas de matriz sobre
+    niveles en una sola operación: nivel_n = (1-a)^n * nivel_0 + sum(a(1-a)^(n-1-t) x_t).
+    """
+    n_dias = matriz.shape[1]
+    if n_dias == 0:
+        return niveles
+    pesos = alfa * (1 - alfa) ** np.arange(n_dias - 1, -1, -1, dtype=np.float64)
+    return (1 - alfa) ** n_dias * niveles + matriz @ pesos
+
+
+def calcular_reorden(demanda, desviacion, dias_reposicion, z):
+    """Devuelve (stock_seguridad, punto_reorden, stock_minimo_sugerido) como arrays enteros."""
+    seguridad = np.ceil(z * desviacion * math.sqrt(dias_reposicion))
+    reorden = np.ceil(demanda * dias_reposicion + seguridad)
+    return (
+        seguridad.astype(np.int64),
+        reorden.astype(np.int64),
+        np.maximum(reorden, 1).astype(np.int64),
+    )
+
+
+def actualizar_pronosticos(ventana=VENTANA_DIAS, alfa=ALFA, dias_reposicion=DIAS_REPOSICION,
+                           z=Z_NIVEL_SERVICIO, tamano_lote=TAMANO_LOTE, hoy=None):
+    """
+    Refresca PronosticoDemanda con los días completos hasta ayer.
+    Retorna un resumen con la cantidad de productos, días y transacciones procesadas.
+    """
+    hoy = hoy or timezone.localdate()
+    inicio_hoy = _inicio_del_dia(hoy)
+
+    inventario_ids = np.fromiter(
+        Inventario.objects.order_by('id').values_list('id', flat=True), dtype=np.int64
+    )
+    existentes = {p.inventario_id: p for p in PronosticoDemanda.objects.all()}
+    ultima_id = max((p.ultima_transaccion_id for p in existentes.values()), default=0)
+    fechas = [p.ultima_fecha for p in existentes.values() if p.ultima_fecha]
+    ultima_fecha = max(fechas) if fechas else None
+
+    # 1. Egresos nuevos, leídos por tramos de id y ya agrupados por día en la BD
+    tope_id = Transaction.objects.filter(
+        tipo='egreso', fecha__lt=inicio_hoy, id__gt=ultima_id
+    ).aggregate(tope=Max('id'))['tope'] or ultima_id
+    filas = []
+    desde = ultima_id
+    while desde < tope_id:
+        hasta = min(desde + tamano_lote, tope_id)
+        filas.extend(_egresos_por_dia(Transaction.objects.filter(
+            id__gt=desde, id__lte=hasta, fecha__lt=inicio_hoy
+        )))
+        desde = hasta
+
+    if ultima_fecha:
+        primer_dia = ultima_fecha + timedelta(days=1)
+    elif filas:
+        primer_dia = min(f[1] for f in filas)
+    else:
+        primer_dia = hoy
+    n_dias = max((hoy - primer_dia).days, 0)
+
+    # 2. Suavizado exponencial incremental
+    niveles = np.array(
+        [existentes[i].suavizado_exponencial if i in existentes else 0.0 for i in inventario_ids],
+        dtype=np.float64,
+    )
+    niveles = suavizar(niveles, _matriz_diaria(filas, inventario_ids, primer_dia, n_dias), alfa)
+
+    # 3. Promedio móvil y desviación sobre la ventana reciente (una sola consulta acotada)
+    inicio_ventana = hoy - timedelta(days=ventana)
+    reciente = _matriz_diaria(
+        list(_egresos_por_dia(Transaction.objects.filter(
+            fecha__gte=_inicio_del_dia(inicio_ventana), fecha__lt=inicio_hoy
+        ))),
+        inventario_ids, inicio_ventana, ventana,
+    )
+    promedio = reciente.mean(axis=1) if ventana else np.zeros(len(inventario_ids))
+    desviacion = reciente.std(axis=1) if ventana else np.zeros(len(inventario_ids))
+    seguridad, reorden, minimo = calcular_reorden(niveles, desviacion, dias_reposicion, z)
+
+    # 4. Persistir
+    nuevos, actualizados = [], []
+    ultimo_dia = hoy - timedelta(days=1)
+    for pos, inv_id in enumerate(inventario_ids.tolist()):
+        pronostico = existentes.get(inv_id) or PronosticoDemanda(inventario_id=inv_id)
+        pronostico.promedio_movil = float(promedio[pos])
+        pronostico.suavizado_exponencial = float(niveles[pos])
+        pronostico.desviacion = float(desviacion[pos])
+        pronostico.stock_seguridad = int(seguridad[pos])
+        pronostico.punto_reorden = int(reorden[pos])
+        pronostico.stock_minimo_sugerido = int(minimo[pos])
+        pronostico.ultima_fecha = ultimo_dia
+        pronostico.ultima_transaccion_id = tope_id
+        pronostico.fecha_calculo = timezone.now()
+        (actualizados if pronostico.pk else nuevos).append(pronostico)
+
+    with transaction.atomic():
+        PronosticoDemanda.objects.bulk_create(nuevos, batch_size=1000)
+        PronosticoDemanda.objects.bulk_update(actualizados, [
+            'promedio_movil', 'suavizado_exponencial', 'desviacion', 'stock_seguridad',
+            'punto_reorden', 'stock_minimo_sugerido', 'ultima_fecha',
+            'ultima_transaccion_id', 'fecha_calculo',
+        ], batch_size=1000)
+
+    return {
+        'productos': len(inventario_ids),
+        'dias': n_dias,
+        'filas_agregadas': len(filas),
+        'ultima_transaccion_id': tope_id,
+    }
+
+
+def aplicar_stock_minimo():
+    """Copia stock_minimo_sugerido a Inventario.stock_minimo en un solo UPDATE."""
+    sugerido = PronosticoDemanda.objects.filter(
+        inventario=OuterRef('pk')
+    ).values('stock_minimo_sugerido')[:1]
+    return Inventario.objects.filter(pronostico__isnull=False).update(stock_minimo=Subquery(sugerido))
@@ -1,13 +1,13 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from crispy_forms.helper import FormHelper
-from crispy_forms.layout import Submit
 from django.utils import timezone
-from .models import User, Producto, Inventario, Proveedor, Pedido, PedidoItem
+from .models import User, Producto, Inventario, Proveedor, Pedido, PedidoItem, Bodega
+from . import codigos
 from decimal import Decimal, InvalidOperation
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.utils.functional import cached_property
 
 class UserRegistrationForm(UserCreationForm):
     role = forms.ChoiceField(choices=User.ROLE_CHOICES, label="Rol de usuario")
@@ -21,12 +21,6 @@ class UserRegistrationForm(UserCreationForm):
         model = User
         fields = ['username', 'password1', 'password2', 'role', 'rut']
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.add_input(Submit('submit', 'Registrar Usuario', css_class='btn-success'))
-
     def clean_rut(self):
         rut = self.cleaned_data.get('rut')
         if User.objects.filter(rut=rut).exists():
@@ -36,19 +30,13 @@ class UserRegistrationForm(UserCreationForm):
 class ProductoForm(forms.ModelForm):
     class Meta:
         model = Producto
-        fields = '__all__'
+        exclude = ['empresa']
         widgets = {
             'descripcion': forms.Textarea(attrs={'rows': 3}),
             'precio_unitario': forms.TextInput(attrs={'placeholder': 'Ej: 10000 o 10.000 o 10,000.00'}),
             'precio_venta': forms.TextInput(attrs={'placeholder': 'Ej: 15000 o 15.000 o 15,000.00'}),
         }
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.add_input(Submit('submit', 'Guardar Producto', css_class='btn-primary'))
-
     def clean(self):
         cleaned_data = super().clean()
         for campo in ['precio_unitario', 'precio_venta']:
@@ -74,6 +62,25 @@ class ProductoForm(forms.ModelForm):
 
         return cleaned_data
 
+    def clean_nombre(self):
+        # Único por empresa: la restricción incluye empresa, que no está en el formulario
+        nombre = self.cleaned_data.get('nombre')
+        if Producto.objects.filter(nombre=nombre).exclude(pk=self.instance.pk).exists():
+            raise ValidationError("Ya existe un producto con este nombre.")
+        return nombre
+
+    def _codigo_unico(self, campo):
+        codigo = self.cleaned_data.get(campo)
+        if codigo and Producto.objects.filter(**{campo: codigo}).exclude(pk=self.instance.pk).exists():
+            raise ValidationError(f"Ya existe un producto con este {Producto._meta.get_field(campo).verbose_name}.")
+        return codigo
+
+    def clean_sku(self):
+        return self._codigo_unico('sku')
+
+    def clean_codigo_barras(self):
+        return self._codigo_unico('codigo_barras')
+
     def clean_unidad(self):
         unidad = self.cleaned_data.get('unidad')
         try:
@@ -86,12 +93,43 @@ class ProductoForm(forms.ModelForm):
             raise ValidationError("La unidad es requerida.")
         return unidad
 
-class StockEntryForm(forms.Form):
-    producto = forms.ModelChoiceField(
+def _campo_codigo():
+    return forms.CharField(
+        max_length=50, required=False, label="Código",
+        widget=forms.TextInput(attrs={'placeholder': 'Escanee el código de barras o SKU', 'autocomplete': 'off'}),
+        help_text="Con código no hace falta elegir el producto de la lista."
+    )
+
+def _campo_producto():
+    return forms.ModelChoiceField(
         queryset=Producto.objects.all().order_by('nombre'),
         label="Producto",
+        required=False,
         empty_label="Seleccione un producto"
     )
+
+def resolver_producto(form, cleaned_data):
+    """Deja en cleaned_data['producto'] el producto del código escaneado o el elegido en la lista."""
+    codigo = cleaned_data.get('codigo')
+    if codigo:
+        producto = codigos.resolver(codigo)
+        if producto is None:
+            form.add_error('codigo', "No hay un producto con este código.")
+        else:
+            cleaned_data['producto'] = producto
+    elif not cleaned_data.get('producto') and 'producto' not in form.errors:
+        form.add_error('producto', "Escanee un código o seleccione un producto.")
+    return cleaned_data.get('producto')
+
+class StockEntryForm(forms.Form):
+    codigo = _campo_codigo()
+    producto = _campo_producto()
+    bodega = forms.ModelChoiceField(
+        queryset=Bodega.objects.order_by('nombre'),
+        label="Bodega",
+        required=False,
+        empty_label="Bodega principal"
+    )
     cantidad = forms.IntegerField(
         min_value=1,
         label="Cantidad",
@@ -102,11 +140,23 @@ class StockEntryForm(forms.Form):
             'required': 'El campo Cantidad es obligatorio.'
         }
     )
+    lote = forms.CharField(max_length=50, required=False, label="Lote")
+    fecha_vencimiento = forms.DateField(
+        required=False,
+        label="Vence",
+        widget=forms.DateInput(attrs={'type': 'date'}),
+        help_text="Solo productos perecibles. Sin código de lote se agrupa por fecha de vencimiento."
+    )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
+    def clean(self):
+        cleaned_data = super().clean()
+        resolver_producto(self, cleaned_data)
+        vence = cleaned_data.get('fecha_vencimiento')
+        if cleaned_data.get('lote') and not vence:
+            self.add_error('fecha_vencimiento', "El lote requiere fecha de vencimiento.")
+        if vence and vence < timezone.now().date():
+            self.add_error('fecha_vencimiento', "El lote ya está vencido.")
+        return cleaned_data
 
     def clean_cantidad(self):
         cantidad = self.cleaned_data.get('cantidad')
@@ -115,10 +165,13 @@ class StockEntryForm(forms.Form):
         return cantidad
 
 class StockExitForm(forms.Form):
-    producto = forms.ModelChoiceField(
-        queryset=Producto.objects.all().order_by('nombre'),
-        label="Producto",
-        empty_label="Seleccione un producto"
+    codigo = _campo_codigo()
+    producto = _campo_producto()
+    bodega = forms.ModelChoiceField(
+        queryset=Bodega.objects.order_by('nombre'),
+        label="Bodega",
+        required=False,
+        empty_label="Bodega principal"
     )
     cantidad = forms.IntegerField(
         min_value=1,
@@ -131,14 +184,9 @@ class StockExitForm(forms.Form):
         }
     )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-
     def clean(self):
         cleaned_data = super().clean()
-        producto = cleaned_data.get('producto')
+        producto = resolver_producto(self, cleaned_data)
         cantidad = cleaned_data.get('cantidad')
         if cantidad < 0:
             cleaned_data['cantidad'] = abs(cantidad)  
@@ -162,7 +210,7 @@ class ProveedorForm(forms.ModelForm):
 
     class Meta:
         model = Proveedor
-        fields = '__all__'
+        exclude = ['empresa']
         widgets = {
             'nombre': forms.TextInput(attrs={'placeholder': 'Ej: Distribuidora XYZ'}),
             'contacto': forms.TextInput(attrs={'placeholder': 'Juan Pérez'}),
@@ -172,9 +220,6 @@ class ProveedorForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.add_input(Submit('submit', 'Guardar Proveedor', css_class='btn-primary'))
         # Opcional: hacer que no sea requerido visualmente
         self.fields['email'].required = False
 
@@ -184,10 +229,22 @@ class ProveedorForm(forms.ModelForm):
             self.add_error('email', "El email es requerido.")
         return cleaned_data
 
+    def clean_nombre(self):
+        nombre = self.cleaned_data.get('nombre')
+        if Proveedor.objects.filter(nombre=nombre).exclude(pk=self.instance.pk).exists():
+            raise ValidationError("Ya existe un proveedor con este nombre.")
+        return nombre
+
+    def clean_email(self):
+        email = self.cleaned_data.get('email')
+        if email and Proveedor.objects.filter(email=email).exclude(pk=self.instance.pk).exists():
+            raise ValidationError("Ya existe un proveedor con este correo.")
+        return email
+
 class PedidoForm(forms.ModelForm):
     class Meta:
         model = Pedido
-        fields = ['proveedor', 'estado', 'fecha_vencimiento']
+        fields = ['proveedor', 'bodega', 'estado', 'fecha_vencimiento']
         widgets = {
             'fecha_vencimiento': forms.DateInput(attrs={'type': 'date'}),
             'estado': forms.Select(),
@@ -195,9 +252,9 @@ class PedidoForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.form_tag = False
+        # Sin bodega el pedido se reserva en la principal (Pedido.save)
+        self.fields['bodega'].required = False
+        self.fields['bodega'].empty_label = "Bodega principal"
 
     def clean(self):
         cleaned_data = super().clean()
@@ -206,8 +263,46 @@ class PedidoForm(forms.ModelForm):
             raise ValidationError("La fecha de vencimiento no puede ser pasada.")
         return cleaned_data
 
+class TrasladoForm(forms.Form):
+    producto = forms.ModelChoiceField(
+        queryset=Producto.objects.all().order_by('nombre'),
+        label="Producto",
+        empty_label="Seleccione un producto"
+    )
+    origen = forms.ModelChoiceField(queryset=Bodega.objects.order_by('nombre'), label="Desde")
+    destino = forms.ModelChoiceField(queryset=Bodega.objects.order_by('nombre'), label="Hacia")
+    cantidad = forms.IntegerField(
+        min_value=1,
+        label="Cantidad a trasladar",
+        widget=forms.NumberInput(attrs={'min': 1, 'step': 1}),
+        error_messages={
+            'min_value': 'La cantidad no puede ser negativa ni cero.',
+            'invalid': 'Debe ingresar un número entero válido.',
+            'required': 'El campo Cantidad es obligatorio.'
+        }
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        origen = cleaned_data.get('origen')
+        if origen and origen == cleaned_data.get('destino'):
+            raise ValidationError("La bodega de origen y destino deben ser distintas.")
+        return cleaned_data
+
+class BasePedidoItemFormSet(BaseInlineFormSet):
+    """Las opciones de producto se consultan una vez para todas las líneas, no una por formulario."""
+
+    @cached_property
+    def opciones_producto(self):
+        return list(self.form.base_fields['producto'].choices)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['producto'].choices = self.opciones_producto
+        return form
+
 PedidoItemFormSet = inlineformset_factory(
-    Pedido, PedidoItem, fields=('producto', 'cantidad'), extra=1, can_delete=True,
+    Pedido, PedidoItem, formset=BasePedidoItemFormSet, fields=('producto', 'cantidad'), extra=1, can_delete=True,
     widgets={
         'producto': forms.Select(attrs={'class': 'form-control'}),
         'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
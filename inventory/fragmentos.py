@@ -0,0 +1,47 @@
+"""
+Versiones de datos para el cache de fragmentos del dashboard.
+
+Las listas pesadas que cambian poco (proveedores, productos, usuarios,
+reportes) se cachean con {% cache %} usando como clave la empresa, el rol y
+la versión de los datos que muestran. Cada versión es un número en el cache
+que las señales de models.py incrementan al guardar o borrar una fila, así
+el fragmento viejo simplemente deja de usarse. Los cambios masivos que no
+disparan señales (bulk_create, update) quedan visibles al vencer
+settings.FRAGMENTOS_TIMEOUT.
+
+Sin empresa activa (superusuario) se ven todas las empresas: esa versión
+se incrementa con cualquier cambio.
+"""
+import time
+
+from django.core.cache import cache
+
+from .tenancy import empresa_actual_id
+
+FRAGMENTOS = ('proveedores', 'productos', 'usuarios', 'reportes')
+
+
+def _clave(nombre, empresa_id):
+    return f'fragmentos:{nombre}:{empresa_id}'
+
+
+def version(nombre, empresa_id):
+    # Parte del reloj: si el cache pierde la clave, la nueva versión no choca con una vieja
+    return cache.get_or_set(_clave(nombre, empresa_id), time.time_ns, None)
+
+
+def invalidar(nombre, empresa_id):
+    for clave in {_clave(nombre, empresa_id), _clave(nombre, None)}:
+        try:
+            cache.incr(clave)
+        except ValueError:
+            pass  # sin versión guardada: la próxima lectura crea una nueva
+
+
+class Versiones:
+    """Para el template: versiones.productos es la versión en la empresa activa."""
+
+    def __getitem__(self, nombre):
+        if nombre not in FRAGMENTOS:
+            raise KeyError(nombre)
+        return version(nombre, empresa_actual_id())
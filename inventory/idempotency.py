@@ -0,0 +1,136 @@
+"""
+Claves de idempotencia para endpoints que mueven stock.
+
+El cliente envía la cabecera ``Idempotency-Key`` (o el campo POST
+``idempotency_key`` en formularios HTML). La primera petición reserva la
+clave y guarda la respuesta; un reintento con la misma clave devuelve la
+respuesta guardada tras una sola consulta indexada, sin tocar Inventario.
+Si el reintento trae otro cuerpo, se rechaza con 422 en vez de reproducir
+una respuesta que no le corresponde.
+
+La reserva, la vista y la respuesta guardada van en una sola transacción:
+si el proceso muere a mitad de la vista la clave no queda tomada, y una
+copia concurrente espera en el índice único hasta que la primera termina y
+luego recibe su respuesta.
+
+De las respuestas JSON se guarda el cuerpo. De las vistas HTML (dashboard)
+solo se guarda una redirección, con su estado y Location; una página
+renderizada, como un formulario con errores, no se guarda y la clave se
+libera para reenviarlo.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import ClaveIdempotencia
+
+TTL_HORAS = 24
+# Las claves de /api/sync/ marcan operaciones ya aplicadas, no respuestas: un
+# escáner puede reenviar su lote días después, así que duran mucho más
+SUFIJO_OPERACION = '#op'
+TTL_OPERACIONES_DIAS = 365
+LARGO_MAXIMO = 64
+
+
+def clave_de(request):
+    return (request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key') or '').strip()
+
+
+def huella_de(request):
+    """SHA-256 del cuerpo; de un formulario, sus campos sin el token CSRF (cambia entre renders)."""
+    if request.content_type in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+        campos = sorted((k, v) for k, v in request.POST.lists() if k != 'csrfmiddlewaretoken')
+        archivos = sorted((k, f.name, f.size) for k, f in request.FILES.items())
+        cuerpo = repr((campos, archivos)).encode()
+    else:
+        cuerpo = request.body
+    return hashlib.sha256(cuerpo).hexdigest()
+
+
+def _reproducir(registro):
+    response = HttpResponse(registro.cuerpo, status=registro.status, content_type=registro.content_type or None)
+    if registro.location:
+        response['Location'] = registro.location
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotente(vista):
+    """
+    Decorador para vistas POST. Sin clave la vista se ejecuta normalmente.
+    Las respuestas 5xx no se guardan, así el cliente puede reintentar.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        clave = clave_de(request) if request.method == 'POST' else ''
+        if not clave or not request.user.is_authenticated:
+            return vista(request, *args, **kwargs)
+        if len(clave) > LARGO_MAXIMO:
+            return JsonResponse({'success': False, 'message': 'Idempotency-Key demasiado larga.'}, status=400)
+
+        huella = huella_de(request)
+        registro = ClaveIdempotencia.objects.filter(usuario=request.user, clave=clave).first()
+        if registro is None:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        registro = ClaveIdempotencia.objects.create(
+                            usuario=request.user, clave=clave, ruta=request.path, huella=huella
+                        )
+                except IntegrityError:
+                    pass
+                else:
+                    return _ejecutar(vista, registro, request, *args, **kwargs)
+            # Otra petición con la misma clave la reservó y terminó entre la consulta y el insert
+            registro = ClaveIdempotencia.objects.get(usuario=request.user, clave=clave)
+
+        if registro.ruta != request.path:
+            return JsonResponse({'success': False, 'message': 'Idempotency-Key ya usada en otro endpoint.'}, status=422)
+        if registro.huella and registro.huella != huella:
+            return JsonResponse({'success': False, 'message': 'Idempotency-Key ya usada con otro cuerpo.'}, status=422)
+        if registro.en_proceso:
+            return JsonResponse({'success': False, 'message': 'Petición con esta Idempotency-Key aún en proceso.'}, status=409)
+        return _reproducir(registro)
+    return envoltura
+
+
+def _ejecutar(vista, registro, request, *args, **kwargs):
+    """Corre dentro de la transacción de la reserva: una excepción la deshace junto con la vista."""
+    response = vista(request, *args, **kwargs)
+    content_type = response.get('Content-Type', '')
+    es_json = content_type.startswith('application/json')
+    redireccion = 300 <= response.status_code < 400
+    if response.status_code >= 500 or getattr(response, 'streaming', False) or not (es_json or redireccion):
+        registro.delete()
+        return response
+    registro.en_proceso = False
+    registro.status = response.status_code
+    registro.content_type = content_type
+    registro.location = response.get('Location', '')
+    registro.cuerpo = response.content.decode(response.charset or 'utf-8') if es_json else ''
+    registro.save(update_fields=['en_proceso', 'status', 'content_type', 'location', 'cuerpo'])
+    return response
+
+
+def limpiar(ttl_horas=TTL_HORAS, tamano_lote=5000, ttl_operaciones_dias=TTL_OPERACIONES_DIAS):
+    """
+    Borra las claves más antiguas que el TTL, en lotes. Las de operaciones de
+    sincronización usan su propio TTL en días. Retorna cuántas borró.
+    """
+    ahora = timezone.now()
+    es_operacion = Q(ruta__endswith=SUFIJO_OPERACION)
+    vencidas = (
+        Q(creado__lt=ahora - timedelta(hours=ttl_horas)) & ~es_operacion
+        | Q(creado__lt=ahora - timedelta(days=ttl_operaciones_dias)) & es_operacion
+    )
+    total = 0
+    while True:
+        ids = list(ClaveIdempotencia.objects.filter(vencidas).values_list('id', flat=True)[:tamano_lote])
+        if not ids:
+            return total
+        total += ClaveIdempotencia.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,385 @@
+"""
+Historial de movimientos (Transaction) y snapshots diarios de stock.
+
+Transaction es de solo inserción. SnapshotStock guarda el saldo de cada
+inventario al cierre de un día, de modo que el stock en cualquier momento se
+calcula como el último snapshot anterior más los movimientos posteriores, sin
+recorrer todo el historial.
+
+Cada movimiento actualiza el stock de su bodega (StockBodega) y el total del
+producto (Inventario) en la misma transacción. Los egresos y traslados
+descuentan además los lotes con vencimiento en orden FEFO (inventory/lotes.py).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Q, Sum, Value, When
+from django.forms import ValidationError
+from django.utils import timezone
+
+from . import events, lotes
+from .models import (
+    Bodega, Inventario, SnapshotStock, StockBodega, Transaction, TransactionArchivada, check_stock_alert,
+)
+from .tenancy import EnEmpresaActual
+
+NETO = Sum(
+    Case(
+        When(tipo__in=('ingreso', 'traslado_entrada', 'ajuste_entrada'), then=F('cantidad')),
+        default=Value(-1) * F('cantidad'),
+        output_field=IntegerField(),
+    )
+)
+
+
+KPIS = {
+    'total_inventario': Sum('cantidad'),
+    'total_reservado': Sum('stock_reservado'),
+    'total_valor': Sum(F('cantidad') * F('producto__precio_unitario')),
+    # disponible < stock_minimo  <=>  cantidad < stock_reservado + stock_minimo
+    'stock_bajo': Count('id', filter=Q(cantidad__lt=F('stock_reservado') + F('stock_minimo'))),
+}
+
+
+def _normalizar_kpis(totales):
+    kpis = {clave: valor or 0 for clave, valor in totales.items()}
+    kpis['total_disponible'] = kpis['total_inventario'] - kpis['total_reservado']
+    return kpis
+
+
+def kpis_inventario():
+    """Totales del dashboard en una sola consulta agregada."""
+    return _normalizar_kpis(Inventario.objects.aggregate(**KPIS))
+
+
+async def akpis_inventario():
+    return _normalizar_kpis(await Inventario.objects.aaggregate(**KPIS))
+
+
+def kpis_por_bodega():
+    """Totales por bodega en una sola consulta agrupada."""
+    return list(
+        StockBodega.objects.values('bodega_id', 'bodega__nombre').annotate(
+            total=Sum('cantidad'),
+            reservado=Sum('stock_reservado'),
+            disponible=Sum(F('cantidad') - F('stock_reservado')),
+            valor=Sum(F('cantidad') * F('inventario__producto__precio_unitario')),
+        ).order_by('bodega__nombre')
+    )
+
+
+def resolver_bodega(bodega, empresa_id):
+    """Bodega (instancia o id) de la empresa activa; None es la principal de empresa_id."""
+    if bodega is None:
+        return Bodega.principal(empresa_id)
+    if isinstance(bodega, Bodega):
+        return bodega
+    try:
+        return Bodega.objects.get(pk=bodega)
+    except (Bodega.DoesNotExist, ValueError, TypeError):
+        raise ValidationError(f'Bodega inexistente: {bodega}.')
+
+
+def bloquear_stock_bodegas(pares):
+    """
+    Bloquea (y crea si faltan) las filas de StockBodega para los pares
+    (inventario_id, bodega_id). Retorna {(inventario_id, bodega_id): StockBodega}.
+    Se llama dentro de transaction.atomic().
+    """
+    pares = set(pares)
+    if not pares:
+        return {}
+
+    def leer():
+        return {
+            (s.inventario_id, s.bodega_id): s
+            for s in StockBodega.todas_las_empresas.select_for_update().filter(
+                inventario_id__in={i for i, _ in pares}, bodega_id__in={b for _, b in pares}
+            )
+            if (s.inventario_id, s.bodega_id) in pares
+        }
+
+    stocks = leer()
+    faltantes = pares - set(stocks)
+    if faltantes:
+        StockBodega.todas_las_empresas.bulk_create(
+            [StockBodega(inventario_id=i, bodega_id=b) for i, b in faltantes], ignore_conflicts=True
+        )
+        stocks = leer()
+    return stocks
+
+
+def guardar_stock_bodegas(stocks):
+    StockBodega.todas_las_empresas.bulk_update(stocks, ['cantidad', 'stock_reservado'])
+
+
+def inicio_del_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def registrar_movimiento(producto, tipo, cantidad, descripcion=None, bodega=None, lote=None, vencimiento=None):
+    """
+    Aplica un ingreso/egreso sobre el inventario del producto en la bodega
+    (por defecto la principal) y lo registra en el historial dentro de la
+    misma transacción. Bloquea las filas de Inventario y StockBodega para que
+    dos egresos simultáneos no dejen el disponible en negativo.
+
+    Un ingreso con vencimiento entra al lote indicado (o a uno por fecha de
+    vencimiento si no se indica código); un egreso consume lotes en orden FEFO.
+    """
+    if cantidad <= 0:
+        raise ValidationError(f'Cantidad debe ser positiva para {tipo}.')
+    if lote and not vencimiento:
+        raise ValidationError('El lote requiere fecha de vencimiento.')
+    with transaction.atomic():
+        inv, _ = Inventario.objects.select_for_update().get_or_create(
+            producto=producto,
+            defaults={'stock_minimo': 10, 'empresa_id': producto.empresa_id}
+        )
+        bodega = resolver_bodega(bodega, inv.empresa_id)
+        stock = bloquear_stock_bodegas([(inv.id, bodega.pk)])[(inv.id, bodega.pk)]
+        if tipo == 'ingreso':
+            inv.cantidad += cantidad
+            stock.cantidad += cantidad
+            if vencimiento:
+                lotes.ingresar(inv, bodega.pk, cantidad, lote or f'V{vencimiento:%Y%m%d}', vencimiento)
+        elif tipo == 'egreso':
+            disponible = stock.cantidad - stock.stock_reservado
+            if cantidad > disponible:
+                raise ValidationError(
+                    f'No hay suficiente stock disponible de "{producto.nombre}" en {bodega.nombre}. '
+                    f'Stock disponible: {disponible}. Solicitado: {cantidad}.'
+                )
+            inv.cantidad -= cantidad
+            stock.cantidad -= cantidad
+        else:
+            raise ValidationError(f'Tipo de movimiento inválido: {tipo}.')
+        inv.producto = producto
+        inv.save()
+        stock.save(update_fields=['cantidad'])
+        if tipo == 'egreso':
+            lotes.asignar({(inv.id, bodega.pk): cantidad})
+        movimiento = Transaction.objects.create(
+            inventario=inv, bodega=bodega, tipo=tipo, cantidad=cantidad, descripcion=descripcion
+        )
+    return inv, movimiento
+
+
+def trasladar(producto, origen, destino, cantidad, descripcion=None):
+    """
+    Mueve stock entre bodegas: dos movimientos enlazados (salida en origen,
+    entrada en destino). El total del producto en Inventario no cambia.
+    Retorna (salida, entrada).
+    """
+    if cantidad <= 0:
+        raise ValidationError('Cantidad debe ser positiva para el traslado.')
+    with transaction.atomic():
+        inv = Inventario.objects.select_for_update().filter(producto=producto).first()
+        if inv is None:
+            raise ValidationError(f'"{producto.nombre}" no tiene registro en inventario.')
+        origen = resolver_bodega(origen, inv.empresa_id)
+        destino = resolver_bodega(destino, inv.empresa_id)
+        if origen.pk == destino.pk:
+            raise ValidationError('La bodega de origen y la de destino deben ser distintas.')
+        stocks = bloquear_stock_bodegas([(inv.id, origen.pk), (inv.id, destino.pk)])
+        salida, entrada = stocks[(inv.id, origen.pk)], stocks[(inv.id, destino.pk)]
+        disponible = salida.cantidad - salida.stock_reservado
+        if cantidad > disponible:
+            raise ValidationError(
+                f'No hay suficiente stock disponible de "{producto.nombre}" en {origen.nombre}. '
+                f'Stock disponible: {disponible}. Solicitado: {cantidad}.'
+            )
+        salida.cantidad -= cantidad
+        entrada.cantidad += cantidad
+        guardar_stock_bodegas([salida, entrada])
+        lotes.trasladar(inv, origen.pk, destino.pk, cantidad)
+        descripcion = descripcion or f'Traslado {origen.nombre} → {destino.nombre}'
+        movimientos = tuple(
+            Transaction.objects.create(
+                inventario=inv, bodega=bodega, tipo=tipo, cantidad=cantidad, descripcion=descripcion
+            )
+            for bodega, tipo in ((origen, 'traslado_salida'), (destino, 'traslado_entrada'))
+        )
+    return movimientos
+
+
+def validar_lineas(lineas):
+    """Errores de datos de las líneas (tipo, cantidad), antes de tocar el stock."""
+    for _, tipo, cantidad, _ in lineas:
+        if tipo not in ('ingreso', 'egreso'):
+            raise ValidationError(f'Tipo de movimiento inválido: {tipo}.')
+        if cantidad <= 0:
+            raise ValidationError(f'Cantidad debe ser positiva para {tipo}.')
+
+
+def registrar_movimientos(lineas, bodega=None, libera_reserva=False):
+    """
+    Versión por lotes de registrar_movimiento. lineas es una lista de
+    (producto, tipo, cantidad, descripcion), todas en la misma bodega. Todo o
+    nada: bloquea los inventarios involucrados con una sola consulta, valida
+    el disponible acumulado por producto y escribe con bulk_update/bulk_create.
+    Con libera_reserva los egresos consumen stock ya reservado (un pedido que
+    se completa): descuentan también stock_reservado.
+    """
+    productos = {producto.pk: producto for producto, _, _, _ in lineas}
+    validar_lineas(lineas)
+
+    with transaction.atomic():
+        inventarios = {
+            inv.producto_id: inv
+            for inv in Inventario.objects.select_for_update().filter(producto_id__in=productos)
+        }
+        faltantes = [
+            Inventario(producto_id=pk, empresa_id=producto.empresa_id, stock_minimo=10)
+            for pk, producto in productos.items() if pk not in inventarios
+        ]
+        if faltantes:
+            Inventario.objects.bulk_create(faltantes)
+            inventarios.update({
+                inv.producto_id: inv
+                for inv in Inventario.objects.select_for_update().filter(
+                    producto_id__in=[inv.producto_id for inv in faltantes]
+                )
+            })
+
+        bodegas = {}
+        for inv in inventarios.values():
+            if inv.empresa_id not in bodegas:
+                bodegas[inv.empresa_id] = resolver_bodega(bodega, inv.empresa_id)
+        stocks = bloquear_stock_bodegas(
+            (inv.id, bodegas[inv.empresa_id].pk) for inv in inventarios.values()
+        )
+
+        movimientos = []
+        for producto, tipo, cantidad, descripcion in lineas:
+            inv = inventarios[producto.pk]
+            en_bodega = bodegas[inv.empresa_id]
+            stock = stocks[(inv.id, en_bodega.pk)]
+            if tipo == 'egreso':
+                if libera_reserva:
+                    inv.stock_reservado -= cantidad
+                    stock.stock_reservado -= cantidad
+                disponible = stock.cantidad - stock.stock_reservado
+                if cantidad > disponible:
+                    raise ValidationError(
+                        f'No hay suficiente stock disponible de "{producto.nombre}" en {en_bodega.nombre}. '
+                        f'Stock disponible: {disponible}. Solicitado: {cantidad}.'
+                    )
+                inv.cantidad -= cantidad
+                stock.cantidad -= cantidad
+            else:
+                inv.cantidad += cantidad
+                stock.cantidad += cantidad
+            movimientos.append(Transaction(
+                inventario=inv, empresa_id=inv.empresa_id, bodega=en_bodega,
+                tipo=tipo, cantidad=cantidad, descripcion=descripcion,
+            ))
+
+        ahora = timezone.now()
+        for inv in inventarios.values():
+            inv.fecha_actualizacion = ahora
+        Inventario.objects.bulk_update(inventarios.values(), ['cantidad', 'stock_reservado', 'fecha_actualizacion'])
+        guardar_stock_bodegas(stocks.values())
+        lotes.asignar(lotes.demandas_de(movimientos))
+        Transaction.objects.bulk_create(movimientos)
+
+        # bulk_update/bulk_create no disparan post_save: se publica y alerta explícitamente
+        for inv in inventarios.values():
+            inv.producto = productos[inv.producto_id]
+        events.publicar_movimientos(movimientos)
+        events.publicar_inventarios(inventarios.values())
+
+    for inv in inventarios.values():
+        check_stock_alert(Inventario, inv)
+    return list(inventarios.values()), movimientos
+
+
+def saldos(limite=None, inventario_ids=None):
+    """
+    Stock por inventario_id considerando los movimientos con fecha < limite
+    (o todos si limite es None). Parte del último snapshot válido de cada
+    inventario y solo suma los movimientos posteriores a él.
+    """
+    inventarios = Inventario.objects.all()
+    if inventario_ids is not None:
+        inventarios = inventarios.filter(id__in=inventario_ids)
+    resultado = {inv_id: 0 for inv_id in inventarios.values_list('id', flat=True)}
+
+    # Snapshots y archivo no tienen empresa propia: se limitan por la del inventario
+    snapshots = SnapshotStock.objects.filter(EnEmpresaActual('inventario__empresa'))
+    if inventario_ids is not None:
+        snapshots = snapshots.filter(inventario_id__in=inventario_ids)
+    if limite is not None:
+        snapshots = snapshots.filter(fecha__lt=timezone.localdate(limite))
+    ultima = dict(
+        snapshots.order_by().values('inventario_id').annotate(ultima=Max('fecha'))
+        .values_list('inventario_id', 'ultima')
+    )
+
+    # Agrupar inventarios por fecha de su último snapshot: normalmente es un solo grupo
+    grupos = defaultdict(list)
+    for inv_id in resultado:
+        grupos[ultima.get(inv_id)].append(inv_id)
+
+    todos = inventario_ids is None and len(grupos) == 1
+    limite_archivo = TransactionArchivada.objects.aggregate(limite=Max('fecha'))['limite']
+    for fecha, ids in grupos.items():
+        desde = inicio_del_dia(fecha + timedelta(days=1)) if fecha is not None else None
+        if fecha is not None:
+            instantanea = snapshots.filter(fecha=fecha)
+            if not todos:
+                instantanea = instantanea.filter(inventario_id__in=ids)
+            resultado.update(instantanea.values_list('inventario_id', 'cantidad'))
+
+        modelos = [Transaction]
+        # Solo se lee el archivo si el tramo a recorrer empieza antes de su último movimiento
+        if limite_archivo is not None and (desde is None or desde <= limite_archivo):
+            modelos.append(TransactionArchivada)
+        for modelo in modelos:
+            movimientos = modelo.objects.all()
+            if modelo is TransactionArchivada:
+                movimientos = movimientos.filter(EnEmpresaActual('inventario__empresa'))
+            if not todos:
+                movimientos = movimientos.filter(inventario_id__in=ids)
+            if desde is not None:
+                movimientos = movimientos.filter(fecha__gte=desde)
+            if limite is not None:
+                movimientos = movimientos.filter(fecha__lt=limite)
+            for inv_id, neto in movimientos.order_by().values('inventario_id').annotate(
+                neto=NETO
+            ).values_list('inventario_id', 'neto'):
+                resultado[inv_id] += neto or 0
+    return resultado
+
+
+def stock_en(inventario, momento):
+    """Stock de un inventario en el instante momento (inclusive)."""
+    inv_id = getattr(inventario, 'pk', inventario)
+    return saldos(momento + timedelta(microseconds=1), [inv_id]).get(inv_id, 0)
+
+
+def tomar_snapshot(dia):
+    """Guarda (o reemplaza) el saldo al cierre de dia para todos los inventarios."""
+    cierre = saldos(inicio_del_dia(dia + timedelta(days=1)))
+    SnapshotStock.objects.bulk_create(
+        [SnapshotStock(inventario_id=inv_id, fecha=dia, cantidad=cantidad) for inv_id, cantidad in cierre.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['inventario', 'fecha'],
+        update_fields=['cantidad'],
+    )
+    return len(cierre)
+
+
+def conciliar():
+    """
+    Compara Inventario.cantidad con snapshot + historial.
+    Retorna una lista de (inventario, esperado) para los que no coinciden.
+    """
+    esperado = saldos()
+    diferencias = []
+    for inv in Inventario.objects.select_related('producto').order_by('id'):
+        if inv.cantidad != esperado.get(inv.id, 0):
+            diferencias.append((inv, esperado.get(inv.id, 0)))
+    return diferencias
@@ -0,0 +1,208 @@
+"""
+Líneas de pedido en lote: importación (CSV o JSON), exportación y clonado.
+
+Armar un pedido de cientos de líneas con PedidoItemFormSet valida cada fila
+por separado, con una consulta de productos por fila. Aquí todas las líneas
+se validan juntas: los productos se buscan con in_bulk (y los códigos de
+barras o SKU con una sola consulta), el disponible de la bodega del pedido
+se lee y bloquea una vez para todos los productos, los ítems se crean con
+bulk_create y la reserva se aplica con un bulk_update por tabla.
+
+Formato de cada línea: {"producto": id} o {"codigo": barras o SKU}, más
+"cantidad". El CSV lleva esas columnas en el encabezado (coma, punto y coma
+o tabulador); lineas_csv() exporta en el mismo formato.
+"""
+import csv
+import io
+import json
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Q
+from django.forms import ValidationError
+from django.utils import timezone
+
+from . import codigos, events
+from .ledger import bloquear_stock_bodegas, guardar_stock_bodegas
+from .models import Inventario, Pedido, PedidoItem, Producto
+
+MAX_LINEAS = 1000
+MAX_ERRORES = 10
+RESERVAN = ('Pendiente', 'Entransito')
+COLUMNAS = ['producto', 'codigo', 'nombre', 'cantidad']
+
+
+def leer_lineas(contenido, formato):
+    """Filas (dicts) de un CSV con encabezado o de un JSON [...] o {"lineas": [...]}."""
+    if isinstance(contenido, bytes):
+        try:
+            contenido = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            contenido = contenido.decode('latin-1')  # CSV guardado desde Excel
+    if formato == 'json':
+        try:
+            datos = json.loads(contenido)
+        except ValueError:
+            raise ValidationError('JSON inválido.')
+        return datos.get('lineas') if isinstance(datos, dict) else datos
+    try:
+        dialecto = csv.Sniffer().sniff(contenido[:2048], delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    return list(csv.DictReader(io.StringIO(contenido), dialect=dialecto))
+
+
+def _referencias(filas):
+    """[(número de línea, ('id' | 'codigo', valor), cantidad)] y los errores de formato."""
+    referencias, errores = [], []
+    for numero, fila in enumerate(filas, 1):
+        if not isinstance(fila, dict):
+            errores.append(f'Línea {numero}: formato inválido.')
+            continue
+        fila = {str(k).strip().lower(): v for k, v in fila.items() if k is not None}
+        try:
+            cantidad = int(str(fila.get('cantidad', '')).strip())
+        except ValueError:
+            cantidad = 0
+        producto = str(fila.get('producto') or '').strip()
+        codigo = codigos.normalizar(fila.get('codigo') or '')
+        if cantidad < 1:
+            errores.append(f'Línea {numero}: cantidad inválida.')
+        elif producto.isdigit():
+            referencias.append((numero, ('id', int(producto)), cantidad))
+        elif codigo:
+            referencias.append((numero, ('codigo', codigo), cantidad))
+        else:
+            errores.append(f'Línea {numero}: falta producto o código.')
+    return referencias, errores
+
+
+def resolver_lineas(filas):
+    """
+    Valida las filas y retorna {producto: cantidad}, sumando las líneas
+    repetidas del mismo producto. Reúne los errores de todas las líneas en
+    un solo ValidationError (hasta MAX_ERRORES).
+    """
+    if not isinstance(filas, list) or not filas:
+        raise ValidationError('No hay líneas para importar.')
+    if len(filas) > MAX_LINEAS:
+        raise ValidationError(f'Máximo {MAX_LINEAS} líneas por pedido.')
+    referencias, errores = _referencias(filas)
+
+    ids = {valor for _, (tipo, valor), _ in referencias if tipo == 'id'}
+    por_codigo = {valor for _, (tipo, valor), _ in referencias if tipo == 'codigo'}
+    encontrados = {('id', pk): producto for pk, producto in Producto.objects.in_bulk(ids).items()} if ids else {}
+    if por_codigo:
+        # El código de barras gana sobre el SKU, igual que codigos.resolver
+        for producto in Producto.objects.filter(Q(sku__in=por_codigo) | Q(codigo_barras__in=por_codigo)):
+            if producto.codigo_barras in por_codigo:
+                encontrados[('codigo', producto.codigo_barras)] = producto
+            if producto.sku in por_codigo:
+                encontrados.setdefault(('codigo', producto.sku), producto)
+
+    cantidades = Counter()
+    for numero, referencia, cantidad in referencias:
+        producto = encontrados.get(referencia)
+        if producto is None:
+            errores.append(f'Línea {numero}: no existe el producto {referencia[1]}.')
+        else:
+            cantidades[producto] += cantidad
+    if errores:
+        raise ValidationError(errores[:MAX_ERRORES])
+    return dict(cantidades)
+
+
+def agregar_lineas(pedido, cantidades, reemplazar=False):
+    """
+    Agrega al pedido las líneas {producto: cantidad}; con reemplazar, pasan
+    a ser sus únicas líneas. Todo o nada: valida el disponible de la bodega
+    del pedido (descontando lo que el propio pedido ya reservaba) y ajusta
+    la reserva solo por la diferencia. Retorna los ítems creados.
+    """
+    with transaction.atomic():
+        pedido = Pedido.objects.select_for_update().get(pk=pedido.pk)
+        if pedido.estado not in RESERVAN:
+            raise ValidationError(f'El pedido #{pedido.pk} ya no está pendiente.')
+        previas = Counter()
+        if reemplazar:
+            for producto_id, cantidad in pedido.items.values_list('producto_id', 'cantidad'):
+                previas[producto_id] += cantidad
+        nuevas = Counter({producto.pk: cantidad for producto, cantidad in cantidades.items()})
+        diferencias = {pk: nuevas[pk] - previas[pk] for pk in nuevas.keys() | previas.keys()}
+        diferencias = {pk: d for pk, d in diferencias.items() if d}
+
+        inventarios = {
+            inv.producto_id: inv
+            for inv in Inventario.objects.select_for_update().filter(producto_id__in=list(diferencias))
+        }
+        stocks = bloquear_stock_bodegas((inv.id, pedido.bodega_id) for inv in inventarios.values())
+        productos = {producto.pk: producto for producto in cantidades}
+        errores = []
+        for pk, diferencia in diferencias.items():
+            inv = inventarios.get(pk)
+            disponible = 0
+            if inv is not None:
+                stock = stocks[(inv.id, pedido.bodega_id)]
+                disponible = stock.cantidad - stock.stock_reservado
+            if diferencia > disponible:
+                errores.append(
+                    f'Stock insuficiente para {productos[pk].nombre}. '
+                    f'Disponible: {disponible}, Solicitado: {diferencia}.'
+                )
+        if errores:
+            raise ValidationError(errores[:MAX_ERRORES])
+
+        ahora = timezone.now()
+        for pk, diferencia in diferencias.items():
+            inv = inventarios.get(pk)
+            if inv is None:
+                continue  # solo puede faltar en una línea que se quita: no tenía reserva
+            inv.stock_reservado += diferencia
+            inv.fecha_actualizacion = ahora
+            stocks[(inv.id, pedido.bodega_id)].stock_reservado += diferencia
+        if reemplazar:
+            pedido.items.all().delete()
+        items = PedidoItem.objects.bulk_create(
+            [PedidoItem(pedido=pedido, producto_id=pk, cantidad=cantidad) for pk, cantidad in nuevas.items()]
+        )
+        Inventario.objects.bulk_update(inventarios.values(), ['stock_reservado', 'fecha_actualizacion'])
+        guardar_stock_bodegas(stocks.values())
+
+        # bulk_update no dispara post_save: el feed en vivo se publica explícitamente
+        events.publicar_inventarios(inventarios.values())
+    return items
+
+
+def clonar(origen, fecha_vencimiento=None):
+    """Pedido nuevo (Pendiente) con el proveedor, la bodega y las líneas de origen."""
+    lineas = Counter()
+    for producto_id, cantidad in origen.items.values_list('producto_id', 'cantidad'):
+        lineas[producto_id] += cantidad
+    if not lineas:
+        raise ValidationError(f'El pedido #{origen.pk} no tiene líneas.')
+    productos = Producto.objects.in_bulk(list(lineas))
+    with transaction.atomic():
+        nuevo = Pedido.objects.create(
+            empresa_id=origen.empresa_id, proveedor_id=origen.proveedor_id,
+            bodega_id=origen.bodega_id, fecha_vencimiento=fecha_vencimiento,
+        )
+        agregar_lineas(nuevo, {productos[pk]: cantidad for pk, cantidad in lineas.items() if pk in productos})
+    return nuevo
+
+
+def exportar(pedido):
+    """Líneas del pedido en el formato que acepta resolver_lineas."""
+    return [{
+        'producto': item.producto_id,
+        'codigo': item.producto.codigo_barras or item.producto.sku or '',
+        'nombre': item.producto.nombre,
+        'cantidad': item.cantidad,
+    } for item in pedido.items.select_related('producto').order_by('id')]
+
+
+def lineas_csv(pedido):
+    salida = io.StringIO()
+    escritor = csv.DictWriter(salida, COLUMNAS)
+    escritor.writeheader()
+    escritor.writerows(exportar(pedido))
+    return salida.getvalue()
@@ -0,0 +1,126 @@
+"""
+Lotes con fecha de vencimiento y asignación FEFO (primero en vencer,
+primero en salir).
+
+Un egreso descuenta primero de los lotes vigentes del producto en la bodega,
+del que vence antes al que vence después; lo que los lotes no cubren sale del
+stock sin lote. Los lotes vencidos no se despachan: si la demanda solo se
+cubre con ellos, el egreso se rechaza. asignar() recibe la demanda completa
+(todas las líneas de un pedido o de un lote de movimientos) y lee los lotes
+de todos sus productos en una consulta sobre lote_fefo_idx. Se llama dentro
+de la misma transacción que valida y descuenta StockBodega, después de
+descontarlo: StockBodega decide si hay stock y asignar() que no salga de
+lotes vencidos.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.forms import ValidationError
+from django.utils import timezone
+
+from .models import Inventario, Lote, StockBodega
+
+DIAS_POR_VENCER = 30
+
+
+def asignar(demandas):
+    """
+    demandas: {(inventario_id, bodega_id): cantidad}. Bloquea y descuenta los
+    lotes vigentes en orden de vencimiento y retorna {(inventario_id,
+    bodega_id): [(lote, cantidad), ...]}. Lo no asignado corresponde al stock
+    sin lote; si ese stock no alcanza porque el resto está en lotes vencidos,
+    lanza ValidationError.
+    """
+    demandas = {clave: cantidad for clave, cantidad in demandas.items() if cantidad > 0}
+    if not demandas:
+        return {}
+    inventario_ids = {i for i, _ in demandas}
+    bodega_ids = {b for _, b in demandas}
+    por_clave = defaultdict(list)
+    for lote in Lote.todas_las_empresas.select_for_update().filter(
+        inventario_id__in=inventario_ids, bodega_id__in=bodega_ids, cantidad__gt=0
+    ).order_by('fecha_vencimiento', 'id'):
+        por_clave[(lote.inventario_id, lote.bodega_id)].append(lote)
+
+    hoy = timezone.localdate()
+    asignaciones = {}
+    modificados = []
+    vencidos = {}
+    for clave, cantidad in demandas.items():
+        asignados = []
+        for lote in por_clave[clave]:
+            if lote.fecha_vencimiento < hoy:
+                vencidos[clave] = lote
+                continue
+            if cantidad <= 0:
+                break
+            tomado = min(lote.cantidad, cantidad)
+            lote.cantidad -= tomado
+            cantidad -= tomado
+            asignados.append((lote, tomado))
+            modificados.append(lote)
+        asignaciones[clave] = asignados
+
+    if vencidos:
+        # Quien llama ya descontó StockBodega: lo que queda debe cubrir los lotes que quedan
+        stock = {
+            (s.inventario_id, s.bodega_id): s.cantidad
+            for s in StockBodega.todas_las_empresas.filter(inventario_id__in=inventario_ids, bodega_id__in=bodega_ids)
+        }
+        for clave, lote in vencidos.items():
+            if stock.get(clave, 0) < sum(l.cantidad for l in por_clave[clave]):
+                producto = Inventario.todas_las_empresas.select_related('producto').get(pk=clave[0]).producto
+                raise ValidationError(
+                    f'No hay suficiente stock vigente de "{producto.nombre}": el lote {lote.codigo} '
+                    f'venció el {lote.fecha_vencimiento:%d/%m/%Y}.'
+                )
+    if modificados:
+        Lote.todas_las_empresas.bulk_update(modificados, ['cantidad'])
+    return asignaciones
+
+
+def demandas_de(movimientos):
+    """Suma los egresos (o salidas de traslado) por (inventario_id, bodega_id)."""
+    demandas = defaultdict(int)
+    for m in movimientos:
+        if m.tipo in ('egreso', 'traslado_salida'):
+            demandas[(m.inventario_id, m.bodega_id)] += m.cantidad
+    return demandas
+
+
+def ingresar(inventario, bodega_id, cantidad, codigo, fecha_vencimiento):
+    """Suma cantidad al lote codigo del producto en la bodega, creándolo si no existe."""
+    lote, creado = Lote.todas_las_empresas.select_for_update().get_or_create(
+        inventario=inventario, bodega_id=bodega_id, codigo=codigo,
+        defaults={
+            'empresa_id': inventario.empresa_id,
+            'fecha_vencimiento': fecha_vencimiento,
+            'cantidad': cantidad,
+        },
+    )
+    if not creado:
+        if lote.fecha_vencimiento != fecha_vencimiento:
+            raise ValidationError(
+                f'El lote {codigo} ya existe con vencimiento {lote.fecha_vencimiento:%d/%m/%Y}.'
+            )
+        lote.cantidad += cantidad
+        lote.save(update_fields=['cantidad'])
+    return lote
+
+
+def trasladar(inventario, origen_id, destino_id, cantidad):
+    """Mueve los lotes que salen de origen (FEFO) a destino con el mismo código y vencimiento."""
+    for lote, tomado in asignar({(inventario.id, origen_id): cantidad})[(inventario.id, origen_id)]:
+        ingresar(inventario, destino_id, tomado, lote.codigo, lote.fecha_vencimiento)
+
+
+def por_vencer(hasta=None):
+    """
+    Lotes con stock que vencen hasta la fecha (por defecto en DIAS_POR_VENCER
+    días), incluidos los ya vencidos. Rango sobre lote_emp_vence_idx.
+    """
+    if hasta is None:
+        hasta = timezone.localdate() + timedelta(days=DIAS_POR_VENCER)
+    return Lote.objects.filter(fecha_vencimiento__lte=hasta, cantidad__gt=0).select_related(
+        'inventario__producto', 'bodega'
+    ).order_by('fecha_vencimiento', 'id')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import archive
+from inventory.tenancy import usar_todas_las_empresas
+
+
+class Command(BaseCommand):
+    help = 'Mueve los movimientos más antiguos que el horizonte a TransactionArchivada, en lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=archive.HORIZONTE_DIAS,
+                            help='Archivar movimientos con más de estos días de antigüedad.')
+        parser.add_argument('--lote', type=int, default=archive.TAMANO_LOTE,
+                            help='Movimientos por lote (cada lote es una transacción corta).')
+
+    @usar_todas_las_empresas()
+    def handle(self, *args, **options):
+        try:
+            total = archive.archivar(dias=options['dias'], tamano_lote=options['lote'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{total} movimientos archivados.'))
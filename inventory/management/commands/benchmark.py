@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from inventory import benchmark
+
+
+def _enteros(valor):
+    return [int(n) for n in valor.split(',')]
+
+
+class Command(BaseCommand):
+    help = (
+        'Suite de rendimiento: render y consultas del dashboard por panel, ingresos/egresos '
+        'por segundo con N hilos y latencia de pedidos según líneas. Siembra una empresa '
+        'temporal y emite un reporte JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int)
+        parser.add_argument('--movimientos', type=int, help='Movimientos sembrados por producto.')
+        parser.add_argument('--pedidos', type=int)
+        parser.add_argument('--lineas-pedido', type=int, help='Líneas promedio de los pedidos sembrados.')
+        parser.add_argument('--repeticiones', type=int)
+        parser.add_argument('--hilos', type=_enteros, help='Ej: 1,4,8')
+        parser.add_argument('--operaciones', type=int, help='Movimientos por hilo.')
+        parser.add_argument('--lineas', type=_enteros, help='Tamaños de pedido a medir. Ej: 1,10,50')
+        parser.add_argument('--semilla', type=int)
+        parser.add_argument('--salida', help='Archivo JSON; por defecto se escribe en la salida estándar.')
+
+    def handle(self, *args, **options):
+        reporte = benchmark.ejecutar(**{clave: options[clave] for clave in benchmark.POR_DEFECTO})
+        texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stderr.write(f"Reporte escrito en {options['salida']}")
+        else:
+            self.stdout.write(texto)
@@ -0,0 +1,70 @@
+import statistics
+import threading
+import time as reloj
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.utils import ConnectionHandler
+
+ALIAS = 'benchmark'
+
+MODOS = {
+    'sin_persistencia': {'CONN_MAX_AGE': 0},
+    'persistente': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'ENGINE': 'control_stock.mysql_pool', 'CONN_MAX_AGE': 0},
+}
+
+
+def _request(conexiones, sql, latencias):
+    """Simula un request: mismos pasos que request_started / request_finished."""
+    conexion = conexiones[ALIAS]
+    conexion.close_if_unusable_or_obsolete()
+    inicio = reloj.perf_counter()
+    with conexion.cursor() as cursor:
+        cursor.execute(sql)
+        cursor.fetchall()
+    latencias.append(reloj.perf_counter() - inicio)
+    conexion.close_if_unusable_or_obsolete()
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia por request (conexión + consulta) sin conexiones persistentes, '
+        'con CONN_MAX_AGE y con el pool de control_stock.mysql_pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--sql', default='SELECT COUNT(*) FROM inventory_inventario')
+        parser.add_argument('--hilo-nuevo', action='store_true',
+                            help='Cada request en un hilo nuevo, como sync_to_async(thread_sensitive=False).')
+
+    def handle(self, *args, **options):
+        base = {k: v for k, v in settings.DATABASES['default'].items() if k != 'TEST'}
+        base['OPTIONS'] = {k: v for k, v in base.get('OPTIONS', {}).items() if k != 'pool'}
+        base.setdefault('ENGINE', 'django.db.backends.mysql')
+        if base['ENGINE'] == 'control_stock.mysql_pool':
+            base['ENGINE'] = 'django.db.backends.mysql'
+
+        for modo, cambios in MODOS.items():
+            config = {**base, **cambios}
+            if modo == 'pool':
+                config['OPTIONS'] = {**config['OPTIONS'], 'pool': {'max_size': 4}}
+            conexiones = ConnectionHandler({ALIAS: config})
+            latencias = []
+            for _ in range(options['requests']):
+                if options['hilo_nuevo']:
+                    hilo = threading.Thread(target=_request, args=(conexiones, options['sql'], latencias))
+                    hilo.start()
+                    hilo.join()
+                else:
+                    _request(conexiones, options['sql'], latencias)
+            conexiones.close_all()
+            if modo == 'pool':
+                conexiones[ALIAS].pool.vaciar()
+
+            percentiles = statistics.quantiles(latencias, n=100)
+            self.stdout.write(
+                f'{modo:>17}: p50 {percentiles[49] * 1000:.2f} ms, '
+                f'p99 {percentiles[98] * 1000:.2f} ms ({len(latencias)} requests)'
+            )
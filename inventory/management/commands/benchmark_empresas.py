@@ -0,0 +1,63 @@
+import statistics
+import time as reloj
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from inventory import sintetico
+from inventory.models import Empresa, Transaction, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia del dashboard de una empresa a medida que se agregan '
+        'empresas con sus datos (se descartan al terminar).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--empresas', default='1,10,50',
+                            help='Cantidades de empresas a medir, separadas por coma.')
+        parser.add_argument('--productos', type=int, default=100, help='Productos por empresa.')
+        parser.add_argument('--movimientos', type=int, default=20, help='Movimientos por producto.')
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._ejecutar(options)
+            transaction.set_rollback(True)
+
+    def _sembrar(self, indice, options):
+        # El mismo generador que benchmark y generar_datos, una semilla por empresa
+        resumen = sintetico.generar(
+            options['productos'], options['productos'] * options['movimientos'], pedidos=0,
+            semilla=options['semilla'] + indice, prefijo='bench', informar=lambda mensaje: None,
+        )
+        return Empresa.objects.get(pk=resumen['empresa_id'])
+
+    def _ejecutar(self, options):
+        objetivos = sorted(int(n) for n in options['empresas'].split(','))
+
+        medida = self._sembrar(0, options)
+        usuario = User.objects.create_user(f'bench-{medida.pk}', password=None, role='admin', empresa=medida)
+        cliente = Client()
+        cliente.force_login(usuario)
+
+        creadas = 1
+        for objetivo in objetivos:
+            while creadas < objetivo:
+                self._sembrar(creadas, options)
+                creadas += 1
+            cliente.get('/dashboard/')  # calentar
+            latencias = []
+            for _ in range(options['requests']):
+                inicio = reloj.perf_counter()
+                response = cliente.get('/dashboard/')
+                latencias.append(reloj.perf_counter() - inicio)
+                assert response.status_code == 200, response.status_code
+            percentiles = statistics.quantiles(latencias, n=100)
+            self.stdout.write(
+                f'{creadas:>4} empresas ({Transaction.todas_las_empresas.count()} movimientos): '
+                f'p50 {percentiles[49] * 1000:.1f} ms, p95 {percentiles[94] * 1000:.1f} ms'
+            )
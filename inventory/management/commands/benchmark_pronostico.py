@@ -0,0 +1,55 @@
+import time as reloj
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from inventory import forecasting, sintetico
+from inventory.tenancy import usar_todas_las_empresas
+
+
+class Command(BaseCommand):
+    help = 'Mide el pronóstico de demanda sobre un historial sintético (se descarta al terminar).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=2000)
+        parser.add_argument('--anios', type=int, default=3)
+        parser.add_argument('--densidad', type=float, default=0.3,
+                            help='Movimientos por producto y día, en promedio.')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--conservar', action='store_true',
+                            help='No descartar los datos generados.')
+
+    @usar_todas_las_empresas()
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._ejecutar(options)
+            if not options['conservar']:
+                transaction.set_rollback(True)
+
+    def _ejecutar(self, options):
+        hoy = timezone.localdate()
+        n_dias = options['anios'] * 365
+
+        # Historial del generador compartido (sintetico.py): mismos datos que los demás benchmarks
+        inicio = reloj.perf_counter()
+        sembrado = sintetico.generar(
+            options['productos'], round(options['productos'] * n_dias * options['densidad']), pedidos=0,
+            dias=n_dias, semilla=options['semilla'], prefijo='bench', informar=lambda mensaje: None,
+        )
+        self.stdout.write(f"Sembrado: {sembrado['productos']} productos, {sembrado['movimientos']} movimientos en "
+                          f'{n_dias} días ({reloj.perf_counter() - inicio:.1f}s).')
+
+        inicio = reloj.perf_counter()
+        resumen = forecasting.actualizar_pronosticos(hoy=hoy)
+        completo = reloj.perf_counter() - inicio
+        self.stdout.write(f"Cálculo completo: {completo:.2f}s ({resumen['filas_agregadas']} filas producto-día).")
+
+        inicio = reloj.perf_counter()
+        forecasting.actualizar_pronosticos(hoy=hoy + timedelta(days=1))
+        incremental = reloj.perf_counter() - inicio
+        self.stdout.write(f'Refresco incremental (1 día): {incremental:.2f}s.')
+
+        estilo = self.style.SUCCESS if completo < 60 else self.style.ERROR
+        self.stdout.write(estilo(f'Objetivo < 60s: {"OK" if completo < 60 else "NO CUMPLE"}'))
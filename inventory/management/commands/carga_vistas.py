@@ -0,0 +1,117 @@
+import asyncio
+import statistics
+import time as reloj
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from inventory.models import Pedido
+
+
+class Cliente:
+    """Cliente HTTP/1.1 mínimo con keep-alive (solo GET, respuestas con Content-Length)."""
+
+    def __init__(self, host, puerto):
+        self.host = host
+        self.puerto = puerto
+        self.lector = self.escritor = None
+
+    async def get(self, ruta):
+        if self.escritor is None:
+            self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+        self.escritor.write(
+            f'GET {ruta} HTTP/1.1\r\nHost: {self.host}:{self.puerto}\r\nConnection: keep-alive\r\n\r\n'.encode()
+        )
+        await self.escritor.drain()
+        estado = int((await self.lector.readline()).split()[1])
+        largo, mantener = None, True
+        while (linea := await self.lector.readline()) not in (b'\r\n', b''):
+            nombre, _, valor = linea.decode('latin-1').partition(':')
+            nombre = nombre.strip().lower()
+            if nombre == 'content-length':
+                largo = int(valor)
+            elif nombre == 'connection' and valor.strip().lower() == 'close':
+                mantener = False
+        if largo is None:
+            await self.lector.read()
+            mantener = False
+        else:
+            await self.lector.readexactly(largo)
+        if not mantener:
+            await self.cerrar()
+        return estado
+
+    async def cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            self.lector = self.escritor = None
+
+
+async def _trabajador(base, rutas, fin, latencias, errores):
+    partes = urlsplit(base)
+    cliente = Cliente(partes.hostname, partes.port or 80)
+    i = 0
+    try:
+        while reloj.perf_counter() < fin:
+            ruta = rutas[i % len(rutas)]
+            i += 1
+            inicio = reloj.perf_counter()
+            try:
+                estado = await cliente.get(partes.path.rstrip('/') + ruta)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                errores.append(ruta)
+                await cliente.cerrar()
+                continue
+            if estado >= 400:
+                errores.append(ruta)
+            else:
+                latencias.append(reloj.perf_counter() - inicio)
+    finally:
+        await cliente.cerrar()
+
+
+async def medir(base, rutas, concurrencia, duracion):
+    latencias, errores = [], []
+    inicio = reloj.perf_counter()
+    fin = inicio + duracion
+    await asyncio.gather(*[
+        _trabajador(base, rutas, fin, latencias, errores) for _ in range(concurrencia)
+    ])
+    return latencias, errores, reloj.perf_counter() - inicio
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de las vistas de pedido (QR público y detalle) contra uno o más '
+        'servidores ya levantados, p. ej. wsgi=http://127.0.0.1:8000 (gunicorn) y '
+        'asgi=http://127.0.0.1:8001 (uvicorn), y compara peticiones por segundo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('objetivos', nargs='+', help='nombre=url_base, p. ej. asgi=http://127.0.0.1:8001')
+        parser.add_argument('--pedido', type=int, help='Pedido a consultar (por defecto el primero).')
+        parser.add_argument('--concurrencia', type=int, default=50)
+        parser.add_argument('--duracion', type=float, default=10.0, help='Segundos por objetivo.')
+
+    def handle(self, *args, **options):
+        pk = options['pedido'] or Pedido.todas_las_empresas.order_by('id').values_list('id', flat=True).first()
+        if pk is None:
+            raise CommandError('No hay pedidos: cree uno o indique --pedido.')
+        rutas = [reverse('pedido_qr_publico', args=[pk]), reverse('pedido_detalle', args=[pk])]
+
+        for objetivo in options['objetivos']:
+            nombre, _, base = objetivo.rpartition('=')
+            nombre = nombre or base
+            latencias, errores, total = asyncio.run(
+                medir(base, rutas, options['concurrencia'], options['duracion'])
+            )
+            if not latencias:
+                self.stdout.write(self.style.ERROR(f'{nombre}: sin respuestas exitosas ({len(errores)} errores)'))
+                continue
+            percentiles = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+            self.stdout.write(
+                f'{nombre}: {len(latencias) / total:.1f} req/s, '
+                f'p50 {percentiles[49] * 1000:.1f} ms, p95 {percentiles[94] * 1000:.1f} ms, '
+                f'{len(latencias)} ok, {len(errores)} errores'
+            )
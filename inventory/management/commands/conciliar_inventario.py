@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory import ledger
+from inventory.models import Bodega, Transaction
+from inventory.tenancy import usar_todas_las_empresas
+
+
+class Command(BaseCommand):
+    help = 'Verifica Inventario.cantidad contra el último snapshot más el historial de movimientos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ajustar', action='store_true',
+                            help='Registra un movimiento de ajuste para que el historial cuadre con el inventario.')
+
+    @usar_todas_las_empresas()
+    def handle(self, *args, **options):
+        diferencias = ledger.conciliar()
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('Inventario conciliado: sin diferencias.'))
+            return
+
+        for inv, esperado in diferencias:
+            self.stdout.write(self.style.WARNING(
+                f'{inv.producto.nombre}: inventario {inv.cantidad}, historial {esperado} '
+                f'(diferencia {inv.cantidad - esperado:+d})'
+            ))
+
+        if options['ajustar']:
+            # Tipos propios: el pronóstico y las ventas no cuentan el ajuste como demanda.
+            # Se imputa a la bodega principal, como los movimientos anteriores a las bodegas.
+            principales = {}
+            with transaction.atomic():
+                for inv, _ in diferencias:
+                    if inv.empresa_id not in principales:
+                        principales[inv.empresa_id] = Bodega.principal(inv.empresa_id)
+                Transaction.objects.bulk_create([
+                    Transaction(
+                        inventario=inv,
+                        empresa_id=inv.empresa_id,
+                        bodega=principales[inv.empresa_id],
+                        tipo='ajuste_entrada' if inv.cantidad > esperado else 'ajuste_salida',
+                        cantidad=abs(inv.cantidad - esperado),
+                        descripcion='Ajuste de conciliación',
+                    )
+                    for inv, esperado in diferencias
+                ])
+            self.stdout.write(self.style.SUCCESS(f'{len(diferencias)} ajustes registrados.'))
+        else:
+            self.stdout.write(self.style.ERROR(f'{len(diferencias)} inventarios no cuadran.'))
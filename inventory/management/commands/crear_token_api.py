@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.models import TokenAPI, User
+
+
+class Command(BaseCommand):
+    help = 'Crea un token para la API JSON (escáneres e integraciones).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--nombre', default='', help='Descripción del dispositivo o integración.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['username']}.")
+        token = TokenAPI.objects.create(user=user, nombre=options['nombre'])
+        self.stdout.write(self.style.SUCCESS(f'Token creado: {token.key}'))
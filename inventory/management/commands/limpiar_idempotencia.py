@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from inventory import idempotency
+
+
+class Command(BaseCommand):
+    help = 'Borra las claves de idempotencia vencidas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=idempotency.TTL_HORAS,
+                            help='Antigüedad a partir de la cual se borran las claves.')
+        parser.add_argument('--dias-operaciones', type=int, default=idempotency.TTL_OPERACIONES_DIAS,
+                            help='Antigüedad de las claves de operaciones de /api/sync/ que se borran.')
+
+    def handle(self, *args, **options):
+        total = idempotency.limpiar(ttl_horas=options['horas'], ttl_operaciones_dias=options['dias_operaciones'])
+        self.stdout.write(self.style.SUCCESS(f'{total} claves de idempotencia borradas.'))
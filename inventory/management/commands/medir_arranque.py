@@ -0,0 +1,92 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Lo que hace un worker antes de atender el primer request: settings, apps,
+# middleware y urls (que importan vistas, formularios y la API).
+WORKER = '''
+import json, resource, time
+inicio = time.perf_counter()
+from control_stock.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+arranque = time.perf_counter() - inicio
+rss = None
+try:
+    with open('/proc/self/status') as status:
+        rss = next(int(l.split()[1]) for l in status if l.startswith('VmRSS:'))
+except OSError:
+    pass
+if rss is None:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'arranque': arranque, 'rss_kb': rss}))
+'''
+
+PERFILES = [
+    'dev=control_stock.settings_dev',
+    'prod=control_stock.settings_prod',
+    'prod_sin_admin=control_stock.settings_prod,PANEL_ADMIN=0',
+]
+
+
+def _paquetes_lentos(stderr, cuantos):
+    """Tiempo propio de import por paquete (django.contrib.x por separado), según -X importtime."""
+    paquetes = Counter()
+    for linea in stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        propio, _, nombre = linea[len('import time:'):].split('|')
+        partes = nombre.strip().split('.')
+        paquete = '.'.join(partes[:3] if partes[:2] == ['django', 'contrib'] else partes[:1])
+        paquetes[paquete] += int(propio)
+    return paquetes.most_common(cuantos)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide en procesos nuevos el tiempo de arranque (import de settings, apps, middleware '
+        'y urls) y la memoria residente de un worker con cada perfil de settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'perfiles', nargs='*', default=PERFILES,
+            help='nombre=modulo_settings[,VARIABLE=valor...], p. ej. prod=control_stock.settings_prod,PANEL_ADMIN=0',
+        )
+        parser.add_argument('--repeticiones', type=int, default=5)
+        parser.add_argument('--modulos', type=int, default=0, help='Muestra los N paquetes que más tardan en importarse en cada perfil.')
+
+    def _medir(self, entorno, importtime=False):
+        comando = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', WORKER]
+        proceso = subprocess.run(comando, env=entorno, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if proceso.returncode:
+            raise CommandError(proceso.stderr.strip().splitlines()[-1])
+        return json.loads(proceso.stdout.strip().splitlines()[-1]), proceso.stderr
+
+    def handle(self, *args, **options):
+        for perfil in options['perfiles']:
+            nombre, _, definicion = perfil.partition('=')
+            modulo, *variables = definicion.split(',')
+            if not modulo:
+                raise CommandError(f'Perfil sin módulo de settings: {perfil}')
+            entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': modulo}
+            # La medición no atiende requests: basta una clave cualquiera para settings_prod
+            entorno.setdefault('DJANGO_SECRET_KEY', 'medir-arranque')
+            entorno.update(variable.split('=', 1) for variable in variables)
+
+            medidas = [self._medir(entorno)[0] for _ in range(options['repeticiones'])]
+            self.stdout.write(
+                f'{nombre:>16}: arranque p50 {statistics.median(m["arranque"] for m in medidas) * 1000:.0f} ms, '
+                f'RSS p50 {statistics.median(m["rss_kb"] for m in medidas) / 1024:.1f} MB '
+                f'({len(medidas)} procesos)'
+            )
+            if options['modulos']:
+                _, stderr = self._medir(entorno, importtime=True)
+                for paquete, propio in _paquetes_lentos(stderr, options['modulos']):
+                    self.stdout.write(f'{"":>18}{propio / 1000:7.1f} ms  {paquete}')
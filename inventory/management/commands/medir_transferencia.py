@@ -0,0 +1,122 @@
+import re
+import urllib.request
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from inventory.models import User
+
+ACEPTA = 'br, gzip'
+MAX_AGE = re.compile(r'max-age=(\d+)')
+
+
+class Recursos(HTMLParser):
+    """Hojas de estilo, scripts e imágenes que el navegador descarga al cargar la página."""
+
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'link' and attrs.get('rel') == 'stylesheet' and attrs.get('href'):
+            self.urls.append(attrs['href'])
+        elif tag in ('script', 'img') and attrs.get('src'):
+            self.urls.append(attrs['src'])
+
+
+def _externo(url, descargar):
+    if not descargar:
+        return None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers={'Accept-Encoding': ACEPTA}), timeout=10) as r:
+            return len(r.read())
+    except OSError:
+        return None
+
+
+def medir_carga(cliente, ruta, externos=False):
+    """
+    Bytes (cuerpo de las respuestas) de la página y sus recursos en una carga
+    en frío (cache vacío) y en una en caliente: lo marcado immutable o aún
+    vigente por max-age no se vuelve a pedir, lo demás se revalida con ETag.
+    Los recursos externos (CDN) solo se miden con externos=True y en caliente
+    se suponen en cache.
+    """
+    pagina = cliente.get(ruta, headers={'accept-encoding': ACEPTA})
+    if pagina.status_code != 200:
+        raise CommandError(f'{ruta} respondió {pagina.status_code}.')
+    parser = Recursos()
+    parser.feed(pagina.content.decode())
+    recursos = []
+    for url in dict.fromkeys(parser.urls):
+        if urlsplit(url).netloc:
+            recursos.append({'url': url, 'externo': True, 'frio': _externo(url, externos), 'caliente': 0})
+            continue
+        respuesta = cliente.get(url, headers={'accept-encoding': ACEPTA})
+        cache = respuesta.get('Cache-Control', '')
+        max_age = MAX_AGE.search(cache)
+        vigente = 'immutable' in cache or (max_age is not None and int(max_age[1]) >= 3600)
+        caliente = 0
+        if not vigente:
+            revalidacion = cliente.get(
+                url, headers={'accept-encoding': ACEPTA, 'if-none-match': respuesta.get('ETag', '')}
+            )
+            caliente = len(revalidacion.content)
+        recursos.append({
+            'url': url, 'externo': False, 'estado': respuesta.status_code, 'frio': len(respuesta.content),
+            'caliente': caliente, 'codificacion': respuesta.get('Content-Encoding', ''), 'cache': cache,
+        })
+    html_caliente = len(cliente.get(ruta, headers={'accept-encoding': ACEPTA}).content)
+    locales = [r for r in recursos if not r['externo']]
+    return {
+        'html': len(pagina.content),
+        'recursos': recursos,
+        'frio': len(pagina.content) + sum(r['frio'] for r in locales),
+        'caliente': html_caliente + sum(r['caliente'] for r in locales),
+        'externos_frio': sum(r['frio'] or 0 for r in recursos if r['externo']),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide los bytes transferidos al cargar el dashboard en frío (cache del navegador vacío) '
+        'y en caliente, con los estáticos servidos por el propio proceso (ESTATICOS_SERVIR).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Usuario con el que se carga el dashboard.')
+        parser.add_argument('--panel', action='append', help='Panel a cargar (repetible); por defecto dashboard.')
+        parser.add_argument('--externos', action='store_true', help='Descarga también los recursos de CDN para medirlos.')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario {options["usuario"]}.')
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'testserver')
+        cliente = Client(SERVER_NAME=host)
+        cliente.force_login(usuario)
+
+        for panel in options['panel'] or ['dashboard']:
+            medida = medir_carga(cliente, f'{reverse("dashboard")}?panel={panel}', options['externos'])
+            self.stdout.write(f'Panel {panel}: HTML {medida["html"] / 1024:.1f} KB')
+            for r in medida['recursos']:
+                if r['externo']:
+                    tamanio = f'{r["frio"] / 1024:.1f} KB' if r['frio'] is not None else 'sin medir'
+                    self.stdout.write(f'  externo  {tamanio:>10}  {r["url"]}')
+                else:
+                    self.stdout.write(
+                        f'  {r["estado"]} {r["codificacion"] or "-":>5} {r["frio"] / 1024:7.1f} KB -> '
+                        f'{r["caliente"] / 1024:.1f} KB  {r["url"]}  [{r["cache"] or "sin Cache-Control"}]'
+                    )
+                    if r['estado'] != 200:
+                        self.stderr.write('  Sin servir: correr collectstatic y usar ESTATICOS_SERVIR=1.')
+            self.stdout.write(
+                f'  Total propio: frío {medida["frio"] / 1024:.1f} KB, caliente {medida["caliente"] / 1024:.1f} KB'
+                + (f'; CDN en frío {medida["externos_frio"] / 1024:.1f} KB' if options['externos'] else '')
+            )
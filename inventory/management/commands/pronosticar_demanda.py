@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from inventory import forecasting
+from inventory.models import PronosticoDemanda
+from inventory.tenancy import usar_todas_las_empresas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el pronóstico de demanda desde los egresos y propone stock mínimo / punto de reorden.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventana', type=int, default=forecasting.VENTANA_DIAS,
+                            help='Días del promedio móvil.')
+        parser.add_argument('--alfa', type=float, default=forecasting.ALFA,
+                            help='Factor del suavizado exponencial (0-1).')
+        parser.add_argument('--dias-reposicion', type=int, default=forecasting.DIAS_REPOSICION,
+                            help='Tiempo de reposición del proveedor en días.')
+        parser.add_argument('--z', type=float, default=forecasting.Z_NIVEL_SERVICIO,
+                            help='Factor z del nivel de servicio para el stock de seguridad.')
+        parser.add_argument('--reiniciar', action='store_true',
+                            help='Borra los pronósticos y recalcula todo el historial.')
+        parser.add_argument('--aplicar', action='store_true',
+                            help='Copia el stock mínimo sugerido a Inventario.')
+
+    @usar_todas_las_empresas()
+    def handle(self, *args, **options):
+        if not 0 < options['alfa'] <= 1:
+            self.stderr.write(self.style.ERROR('--alfa debe estar entre 0 y 1.'))
+            return
+        if options['reiniciar']:
+            PronosticoDemanda.objects.all().delete()
+
+        resumen = forecasting.actualizar_pronosticos(
+            ventana=options['ventana'],
+            alfa=options['alfa'],
+            dias_reposicion=options['dias_reposicion'],
+            z=options['z'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Pronóstico actualizado: {resumen['productos']} productos, {resumen['dias']} días nuevos, "
+            f"hasta la transacción #{resumen['ultima_transaccion_id']}."
+        ))
+
+        if options['aplicar']:
+            actualizados = forecasting.aplicar_stock_minimo()
+            self.stdout.write(self.style.SUCCESS(f'Stock mínimo actualizado en {actualizados} inventarios.'))
@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import ledger
+from inventory.tenancy import usar_todas_las_empresas
+
+
+class Command(BaseCommand):
+    help = 'Guarda el stock de cada inventario al cierre del día (por defecto, ayer).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día a cerrar (YYYY-MM-DD). Por defecto, ayer.')
+        parser.add_argument('--desde', help='Generar snapshots desde este día hasta --fecha (YYYY-MM-DD).')
+
+    @usar_todas_las_empresas()
+    def handle(self, *args, **options):
+        try:
+            hasta = date.fromisoformat(options['fecha']) if options['fecha'] else timezone.localdate() - timedelta(days=1)
+            desde = date.fromisoformat(options['desde']) if options['desde'] else hasta
+        except ValueError:
+            raise CommandError('Formato de fecha inválido, usa YYYY-MM-DD.')
+        if desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --fecha.')
+
+        dia = desde
+        while dia <= hasta:
+            total = ledger.tomar_snapshot(dia)
+            self.stdout.write(f'Snapshot {dia}: {total} inventarios.')
+            dia += timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS('Snapshots generados.'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_alter_proveedor_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoDemanda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('promedio_movil', models.FloatField(default=0)),
+                ('suavizado_exponencial', models.FloatField(default=0)),
+                ('desviacion', models.FloatField(default=0)),
+                ('stock_seguridad', models.PositiveIntegerField(default=0)),
+                ('punto_reorden', models.PositiveIntegerField(default=0)),
+                ('stock_minimo_sugerido', models.PositiveIntegerField(default=1)),
+                ('ultima_fecha', models.DateField(blank=True, null=True)),
+                ('ultima_transaccion_id', models.BigIntegerField(default=0)),
+                ('fecha_calculo', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['tipo', 'fecha'], name='transaction_tipo_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='pronosticodemanda',
+            name='inventario',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pronostico', to='inventory.inventario'),
+        ),
+    ]
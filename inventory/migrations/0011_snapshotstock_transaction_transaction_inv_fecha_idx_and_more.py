@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_pronosticodemanda_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['inventario', 'fecha'], name='transaction_inv_fecha_idx'),
+        ),
+        migrations.AddField(
+            model_name='snapshotstock',
+            name='inventario',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.inventario'),
+        ),
+        migrations.AddIndex(
+            model_name='snapshotstock',
+            index=models.Index(fields=['fecha'], name='snapshot_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotstock',
+            constraint=models.UniqueConstraint(fields=('inventario', 'fecha'), name='snapshot_inventario_fecha_unico'),
+        ),
+    ]
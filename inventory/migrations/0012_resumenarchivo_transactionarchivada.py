@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_snapshotstock_transaction_transaction_inv_fecha_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenArchivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso')], max_length=10)),
+                ('cantidad', models.PositiveBigIntegerField(default=0)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('inventario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumen_archivo', to='inventory.inventario')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('inventario', 'tipo'), name='resumen_archivo_unico')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso')], max_length=10)),
+                ('cantidad', models.PositiveIntegerField()),
+                ('fecha', models.DateTimeField()),
+                ('descripcion', models.CharField(blank=True, max_length=255, null=True)),
+                ('inventario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.inventario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['fecha'], name='archivada_fecha_idx'), models.Index(fields=['inventario', 'fecha'], name='archivada_inv_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_resumenarchivo_transactionarchivada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenAPI',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True)),
+                ('nombre', models.CharField(blank=True, help_text='Ej: escáner bodega 1', max_length=100)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_api', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
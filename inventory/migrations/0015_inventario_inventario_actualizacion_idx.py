@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_claveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventario',
+            index=models.Index(fields=['fecha_actualizacion'], name='inventario_actualizacion_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:45
+
+import django.db.models.deletion
+import inventory.tenancy
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('inventory', '0015_inventario_inventario_actualizacion_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', inventory.tenancy.EmpresaUserManager()),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='inventario',
+            name='inventario_actualizacion_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_tipo_fecha_idx',
+        ),
+        migrations.AddField(
+            model_name='inventario',
+            name='empresa',
+            field=models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inventarios', to='inventory.empresa'),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='empresa',
+            field=models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pedidos', to='inventory.empresa'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='empresa',
+            field=models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='productos', to='inventory.empresa'),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='empresa',
+            field=models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='proveedores', to='inventory.empresa'),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='empresa',
+            field=models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reportes', to='inventory.empresa'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='empresa',
+            field=models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventory.empresa'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='empresa',
+            field=models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='usuarios', to='inventory.empresa'),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='nombre',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='proveedor',
+            name='email',
+            field=models.EmailField(blank=True, error_messages={'invalid': 'Por favor ingresa un correo electrónico válido.', 'unique': 'Ya existe un proveedor con este correo.'}, max_length=254, null=True),
+        ),
+        migrations.AlterField(
+            model_name='proveedor',
+            name='nombre',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='inventario',
+            index=models.Index(fields=['empresa', 'fecha_actualizacion'], name='inventario_emp_actualiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['empresa', 'fecha_pedido'], name='pedido_empresa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['empresa', 'estado', 'fecha_vencimiento'], name='pedido_empresa_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reporte',
+            index=models.Index(fields=['empresa', 'fecha'], name='reporte_empresa_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['empresa', 'tipo', 'fecha'], name='transaction_emp_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['empresa', 'fecha'], name='transaction_emp_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['empresa', 'role'], name='usuario_empresa_rol_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(fields=('empresa', 'nombre'), name='producto_empresa_nombre_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='proveedor',
+            constraint=models.UniqueConstraint(fields=('empresa', 'nombre'), name='proveedor_empresa_nombre_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='proveedor',
+            constraint=models.UniqueConstraint(fields=('empresa', 'email'), name='proveedor_empresa_email_unico'),
+        ),
+    ]
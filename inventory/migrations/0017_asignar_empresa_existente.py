@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def asignar_empresa(apps, schema_editor):
+    """Hasta ahora había una sola empresa: los datos existentes pasan a ser de ella."""
+    Empresa = apps.get_model('inventory', 'Empresa')
+    empresa = Empresa.objects.order_by('id').first()
+    if empresa is None:
+        return
+    for modelo in ('User', 'Producto', 'Inventario', 'Transaction', 'Proveedor', 'Pedido', 'Reporte'):
+        apps.get_model('inventory', modelo)._base_manager.filter(empresa__isnull=True).update(empresa=empresa)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_empresa_por_tenant'),
+    ]
+
+    operations = [
+        migrations.RunPython(asignar_empresa, migrations.RunPython.noop),
+    ]
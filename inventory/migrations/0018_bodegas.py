@@ -0,0 +1,77 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:48
+
+import django.db.models.deletion
+import inventory.tenancy
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_asignar_empresa_existente'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resumenarchivo',
+            name='tipo',
+            field=models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso'), ('traslado_salida', 'Traslado (salida)'), ('traslado_entrada', 'Traslado (entrada)')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='tipo',
+            field=models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso'), ('traslado_salida', 'Traslado (salida)'), ('traslado_entrada', 'Traslado (entrada)')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transactionarchivada',
+            name='tipo',
+            field=models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso'), ('traslado_salida', 'Traslado (salida)'), ('traslado_entrada', 'Traslado (entrada)')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='Bodega',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('direccion', models.CharField(blank=True, max_length=300)),
+                ('es_principal', models.BooleanField(default=False)),
+                ('empresa', models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bodegas', to='inventory.empresa')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='pedidos', to='inventory.bodega'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimientos', to='inventory.bodega'),
+        ),
+        migrations.AddField(
+            model_name='transactionarchivada',
+            name='bodega',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='inventory.bodega'),
+        ),
+        migrations.CreateModel(
+            name='StockBodega',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('stock_reservado', models.PositiveIntegerField(default=0)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='inventory.bodega')),
+                ('inventario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_bodegas', to='inventory.inventario')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='bodega',
+            constraint=models.UniqueConstraint(fields=('empresa', 'nombre'), name='bodega_empresa_nombre_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='stockbodega',
+            index=models.Index(fields=['bodega', 'inventario'], name='stock_bodega_bodega_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockbodega',
+            constraint=models.UniqueConstraint(fields=('inventario', 'bodega'), name='stock_bodega_unico'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+
+def crear_bodega_principal(apps, schema_editor):
+    """Todo el stock existente queda en la bodega principal de su empresa."""
+    Bodega = apps.get_model('inventory', 'Bodega')
+    Inventario = apps.get_model('inventory', 'Inventario')
+    StockBodega = apps.get_model('inventory', 'StockBodega')
+    Pedido = apps.get_model('inventory', 'Pedido')
+
+    empresas = set(Inventario.objects.values_list('empresa_id', flat=True).distinct())
+    empresas |= set(Pedido.objects.values_list('empresa_id', flat=True).distinct())
+    for empresa_id in empresas:
+        bodega, _ = Bodega.objects.get_or_create(
+            empresa_id=empresa_id, es_principal=True, defaults={'nombre': 'Principal'}
+        )
+        StockBodega.objects.bulk_create([
+            StockBodega(inventario_id=inv_id, bodega=bodega, cantidad=cantidad, stock_reservado=reservado)
+            for inv_id, cantidad, reservado in Inventario.objects.filter(empresa_id=empresa_id).values_list(
+                'id', 'cantidad', 'stock_reservado'
+            )
+        ], batch_size=1000)
+        Pedido.objects.filter(empresa_id=empresa_id, bodega__isnull=True).update(bodega=bodega)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_bodegas'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_bodega_principal, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:54
+
+import django.db.models.deletion
+import inventory.tenancy
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_bodega_principal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50)),
+                ('fecha_vencimiento', models.DateField()),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('fecha_ingreso', models.DateTimeField(auto_now_add=True)),
+                ('bodega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='inventory.bodega')),
+                ('empresa', models.ForeignKey(blank=True, default=inventory.tenancy.empresa_actual_id, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='inventory.empresa')),
+                ('inventario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes', to='inventory.inventario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['inventario', 'bodega', 'fecha_vencimiento'], name='lote_fefo_idx'), models.Index(fields=['empresa', 'fecha_vencimiento'], name='lote_emp_vence_idx')],
+                'constraints': [models.UniqueConstraint(fields=('inventario', 'bodega', 'codigo'), name='lote_codigo_unico')],
+            },
+        ),
+    ]
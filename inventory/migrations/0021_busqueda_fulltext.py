@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# En SQLite la búsqueda usa tablas FTS5 creadas en post_migrate (ver inventory/busqueda.py)
+INDICES = [
+    ('producto_busqueda_ft', 'inventory_producto', 'nombre, descripcion'),
+    ('proveedor_busqueda_ft', 'inventory_proveedor', 'nombre, contacto'),
+]
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for nombre, tabla, columnas in INDICES:
+        schema_editor.execute(f'CREATE FULLTEXT INDEX {nombre} ON {tabla} ({columnas})')
+
+
+def borrar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for nombre, tabla, _ in INDICES:
+        schema_editor.execute(f'DROP INDEX {nombre} ON {tabla}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_lotes'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
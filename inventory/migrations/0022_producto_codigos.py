@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0021_busqueda_fulltext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='codigo_barras',
+            field=models.CharField(blank=True, help_text='EAN/UPC u otro código impreso en el producto.', max_length=50, null=True, verbose_name='Código de barras'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='sku',
+            field=models.CharField(blank=True, max_length=50, null=True, verbose_name='SKU'),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(fields=('empresa', 'sku'), name='producto_empresa_sku_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='producto',
+            constraint=models.UniqueConstraint(fields=('empresa', 'codigo_barras'), name='producto_empresa_codigo_barras_unico'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:47
+
+from django.db import migrations, models
+
+
+def desmarcar_principales_repetidas(apps, schema_editor):
+    """Si una empresa quedó con más de una principal, se conserva la más antigua."""
+    Bodega = apps.get_model('inventory', 'Bodega')
+    vistas = set()
+    for bodega_id, empresa_id in Bodega.objects.filter(es_principal=True).order_by('id').values_list('id', 'empresa_id'):
+        if empresa_id in vistas:
+            Bodega.objects.filter(pk=bodega_id).update(es_principal=False)
+        vistas.add(empresa_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_producto_codigos'),
+    ]
+
+    operations = [
+        migrations.RunPython(desmarcar_principales_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='bodega',
+            constraint=models.UniqueConstraint(condition=models.Q(('es_principal', True)), fields=('empresa',), name='bodega_empresa_principal_unica'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0023_bodega_principal_unica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claveidempotencia',
+            name='huella',
+            field=models.CharField(blank=True, help_text='SHA-256 del cuerpo de la petición.', max_length=64),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0024_idempotencia_huella'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resumenarchivo',
+            name='tipo',
+            field=models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso'), ('traslado_salida', 'Traslado (salida)'), ('traslado_entrada', 'Traslado (entrada)'), ('ajuste_salida', 'Ajuste (salida)'), ('ajuste_entrada', 'Ajuste (entrada)')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='tipo',
+            field=models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso'), ('traslado_salida', 'Traslado (salida)'), ('traslado_entrada', 'Traslado (entrada)'), ('ajuste_salida', 'Ajuste (salida)'), ('ajuste_entrada', 'Ajuste (entrada)')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transactionarchivada',
+            name='tipo',
+            field=models.CharField(choices=[('ingreso', 'Ingreso'), ('egreso', 'Egreso'), ('traslado_salida', 'Traslado (salida)'), ('traslado_entrada', 'Traslado (entrada)'), ('ajuste_salida', 'Ajuste (salida)'), ('ajuste_entrada', 'Ajuste (entrada)')], max_length=20),
+        ),
+    ]
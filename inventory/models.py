@@ -1,13 +1,19 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db.models.signals import post_save, pre_save, pre_delete
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
 from django.dispatch import receiver
 from django.core.mail import send_mail
-from django.forms import ValidationError
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import F, Case, When, Value
+import secrets
+
+from django.core.cache import cache
+
+from . import fragmentos
+from .tenancy import EmpresaManager, EmpresaUserManager, empresa_actual_id, usar_empresa
 
 class Empresa(models.Model):
     nombre = models.CharField(max_length=200)
@@ -30,12 +36,63 @@ class User(AbstractUser):
         max_length=12, unique=True, null=True, blank=True,
         validators=[RegexValidator(r'^\d{1,8}-[0-9kK]$', 'Formato de RUT inválido.')]
     )
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='usuarios')
+    objects = EmpresaUserManager()
     class Meta:
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
+        indexes = [
+            models.Index(fields=['empresa', 'role'], name='usuario_empresa_rol_idx'),
+        ]
+
+class TokenAPI(models.Model):
+    """Token de acceso a la API JSON (cabecera Authorization: Token <key>)."""
+    key = models.CharField(max_length=40, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tokens_api')
+    nombre = models.CharField(max_length=100, blank=True, help_text="Ej: escáner bodega 1")
+    creado = models.DateTimeField(auto_now_add=True)
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = secrets.token_hex(20)
+        super().save(*args, **kwargs)
+    def __str__(self):
+        return f"{self.user.username} - {self.nombre or self.key[:8]}"
+
+class ClaveIdempotencia(models.Model):
+    """
+    Respuesta guardada para una clave Idempotency-Key enviada por el cliente.
+    Un reintento con la misma clave devuelve esta respuesta sin volver a
+    ejecutar la vista. Se limpian con el comando limpiar_idempotencia.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    clave = models.CharField(max_length=64)
+    ruta = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64, blank=True, help_text="SHA-256 del cuerpo de la petición.")
+    en_proceso = models.BooleanField(default=True)
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=500, blank=True)
+    cuerpo = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['usuario', 'clave'], name='idempotencia_usuario_clave_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['creado'], name='idempotencia_creado_idx'),
+        ]
+    def __str__(self):
+        return f"{self.usuario_id}:{self.clave} -> {self.status}"
 
 class Producto(models.Model):
-    nombre = models.CharField(max_length=100, unique=True)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='productos')
+    nombre = models.CharField(max_length=100)
+    # Códigos que leen los escáneres; únicos por empresa (ver inventory/codigos.py)
+    sku = models.CharField(max_length=50, null=True, blank=True, verbose_name="SKU")
+    codigo_barras = models.CharField(max_length=50, null=True, blank=True, verbose_name="Código de barras",
+                                     help_text="EAN/UPC u otro código impreso en el producto.")
     descripcion = models.TextField()
     unidad = models.CharField(max_length=50)
     precio_unitario = models.PositiveIntegerField(
@@ -46,20 +103,76 @@ class Producto(models.Model):
           validators=[MinValueValidator(1)],
         default=0, verbose_name="Precio Venta"
     )
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'nombre'], name='producto_empresa_nombre_unico'),
+            models.UniqueConstraint(fields=['empresa', 'sku'], name='producto_empresa_sku_unico'),
+            models.UniqueConstraint(fields=['empresa', 'codigo_barras'], name='producto_empresa_codigo_barras_unico'),
+        ]
     def __str__(self):
         return self.nombre
     def clean(self):
         if self.precio_venta < self.precio_unitario:
             raise ValidationError("Precio venta no puede ser menor que costo.")
 
+class Bodega(models.Model):
+    """
+    Ubicación física del stock. Cada empresa tiene una bodega principal, que
+    se usa cuando un movimiento o pedido no indica bodega.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='bodegas')
+    nombre = models.CharField(max_length=100)
+    direccion = models.CharField(max_length=300, blank=True)
+    es_principal = models.BooleanField(default=False)
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'nombre'], name='bodega_empresa_nombre_unico'),
+            # Una sola principal por empresa. MySQL no tiene índices parciales y omite esta
+            # restricción; ahí la carrera de principal() la corta el nombre único por empresa.
+            models.UniqueConstraint(fields=['empresa'], condition=models.Q(es_principal=True),
+                                    name='bodega_empresa_principal_unica'),
+        ]
+    def __str__(self):
+        return self.nombre
+    @classmethod
+    def principal(cls, empresa_id):
+        bodega, _ = cls.todas_las_empresas.get_or_create(
+            empresa_id=empresa_id, es_principal=True, defaults={'nombre': 'Principal'}
+        )
+        return bodega
+
 class Inventario(models.Model):
+    """
+    Stock total del producto en todas las bodegas (suma de StockBodega). Se
+    mantiene junto con StockBodega en la misma transacción para que los KPIs
+    globales sigan siendo una sola consulta sobre esta tabla.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='inventarios')
     producto = models.OneToOneField(Producto, on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField(default=0)
     stock_reservado = models.PositiveIntegerField(default=0)
     stock_minimo = models.PositiveIntegerField(default=10, validators=[MinValueValidator(1)])
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        indexes = [
+            # Delta de sincronización de escáneres (inventory/sync.py). Los update() deben fijarla a mano.
+            models.Index(fields=['empresa', 'fecha_actualizacion'], name='inventario_emp_actualiz_idx'),
+        ]
     def __str__(self):
         return f"{self.producto.nombre} - {self.cantidad}"
+    def save(self, *args, **kwargs):
+        # El inventario pertenece a la empresa de su producto
+        if self.empresa_id is None and self.producto_id:
+            self.empresa_id = self.producto.empresa_id
+        super().save(*args, **kwargs)
     def needs_replenishment(self):
         disponible = self.cantidad - self.stock_reservado
         return disponible < self.stock_minimo
@@ -77,25 +190,211 @@ def check_stock_alert(sender, instance, **kwargs):
             fail_silently=True, 
         )
 
+class StockBodegaManager(EmpresaManager):
+    campo = 'bodega__empresa'
+
+class StockBodega(models.Model):
+    """Stock y reserva de un producto en una bodega."""
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE, related_name='stock_bodegas')
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name='stock')
+    cantidad = models.PositiveIntegerField(default=0)
+    stock_reservado = models.PositiveIntegerField(default=0)
+    objects = StockBodegaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['inventario', 'bodega'], name='stock_bodega_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['bodega', 'inventario'], name='stock_bodega_bodega_idx'),
+        ]
+    def __str__(self):
+        return f"{self.inventario.producto.nombre} en {self.bodega.nombre}: {self.cantidad}"
+
+class Lote(models.Model):
+    """
+    Parte del stock de una bodega con fecha de vencimiento (perecibles). Los
+    egresos consumen los lotes en orden de vencimiento (FEFO, inventory/lotes.py);
+    el stock de StockBodega que no está en lotes no vence y se consume al final.
+    """
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='lotes')
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE, related_name='lotes')
+    bodega = models.ForeignKey(Bodega, on_delete=models.CASCADE, related_name='lotes')
+    codigo = models.CharField(max_length=50)
+    fecha_vencimiento = models.DateField()
+    cantidad = models.PositiveIntegerField(default=0)
+    fecha_ingreso = models.DateTimeField(auto_now_add=True)
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['inventario', 'bodega', 'codigo'], name='lote_codigo_unico'),
+        ]
+        indexes = [
+            # Asignación FEFO: los lotes de un producto en una bodega, ya ordenados por vencimiento
+            models.Index(fields=['inventario', 'bodega', 'fecha_vencimiento'], name='lote_fefo_idx'),
+            # Reporte de lotes por vencer de la empresa
+            models.Index(fields=['empresa', 'fecha_vencimiento'], name='lote_emp_vence_idx'),
+        ]
+    def __str__(self):
+        return f"Lote {self.codigo} de {self.inventario.producto.nombre} (vence {self.fecha_vencimiento})"
+    def save(self, *args, **kwargs):
+        if self.empresa_id is None and self.inventario_id:
+            self.empresa_id = self.inventario.empresa_id
+        super().save(*args, **kwargs)
+
+def ajustar_stock(producto, bodega_id, cantidad=0, reservado=0):
+    """
+    Suma cantidad y reservado (pueden ser negativos) al stock del producto en
+    la bodega y al total de Inventario, con UPDATE ... F() sobre ambas filas.
+    producto puede ser la instancia o su id (evita cargar el producto por ítem).
+    Si la bodega no tiene fila de StockBodega se crea con los montos; restar
+    de una fila que no existe dejaría la bodega descuadrada con el total, así
+    que lanza ValidationError sin aplicar nada.
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        actualizadas = StockBodega.todas_las_empresas.filter(
+            inventario__producto=producto, bodega_id=bodega_id
+        ).update(cantidad=F('cantidad') + cantidad, stock_reservado=F('stock_reservado') + reservado)
+        if not actualizadas:
+            inventario = Inventario.todas_las_empresas.filter(producto=producto).first()
+            if inventario is None:
+                return
+            if cantidad < 0 or reservado < 0:
+                raise ValidationError(
+                    f'El producto #{inventario.producto_id} no tiene stock en la bodega #{bodega_id}: '
+                    f'no se puede descontar.'
+                )
+            StockBodega.todas_las_empresas.create(
+                inventario=inventario, bodega_id=bodega_id, cantidad=cantidad, stock_reservado=reservado,
+            )
+        Inventario.todas_las_empresas.filter(producto=producto).update(
+            cantidad=F('cantidad') + cantidad,
+            stock_reservado=F('stock_reservado') + reservado,
+            fecha_actualizacion=ahora,
+        )
+
 class Transaction(models.Model):
     TIPO_CHOICES = (
         ('ingreso', 'Ingreso'),
         ('egreso', 'Egreso'),
+        # Un traslado son dos movimientos del mismo inventario: salida en origen y entrada en destino
+        ('traslado_salida', 'Traslado (salida)'),
+        ('traslado_entrada', 'Traslado (entrada)'),
+        # Correcciones de conciliar_inventario --ajustar: no son ventas ni reposiciones
+        ('ajuste_salida', 'Ajuste (salida)'),
+        ('ajuste_entrada', 'Ajuste (entrada)'),
     )
+    # Copia de inventario.empresa: el historial por empresa se filtra sin join
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='movimientos')
     inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE)
-    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    # Nulo en los movimientos anteriores a las bodegas (corresponden a la principal)
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, null=True, blank=True, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
     cantidad = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     fecha = models.DateTimeField(auto_now_add=True)
     descripcion = models.CharField(max_length=255, blank=True, null=True)
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'tipo', 'fecha'], name='transaction_emp_tipo_fecha_idx'),
+            models.Index(fields=['empresa', 'fecha'], name='transaction_emp_fecha_idx'),
+            models.Index(fields=['inventario', 'fecha'], name='transaction_inv_fecha_idx'),
+        ]
     def __str__(self):
         return f"{self.tipo} de {self.cantidad} para {self.inventario.producto.nombre}"
+    def save(self, *args, **kwargs):
+        # El historial es de solo inserción: las correcciones se registran como un movimiento nuevo
+        if not self._state.adding:
+            raise ValidationError("Los movimientos registrados no se pueden modificar.")
+        if self.empresa_id is None and self.inventario_id:
+            self.empresa_id = self.inventario.empresa_id
+        super().save(*args, **kwargs)
+
+class TransactionArchivada(models.Model):
+    """
+    Movimientos antiguos movidos fuera de Transaction por el comando
+    archivar_movimientos. Conserva el id original.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE, related_name='+')
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    tipo = models.CharField(max_length=20, choices=Transaction.TIPO_CHOICES)
+    cantidad = models.PositiveIntegerField()
+    fecha = models.DateTimeField()
+    descripcion = models.CharField(max_length=255, blank=True, null=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha'], name='archivada_fecha_idx'),
+            models.Index(fields=['inventario', 'fecha'], name='archivada_inv_fecha_idx'),
+        ]
+    def __str__(self):
+        return f"{self.tipo} de {self.cantidad} (archivado, {self.fecha:%Y-%m-%d})"
+
+class ResumenArchivo(models.Model):
+    """
+    Totales acumulados de los movimientos archivados por inventario y tipo,
+    para que los KPIs del dashboard no tengan que leer TransactionArchivada.
+    """
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE, related_name='resumen_archivo')
+    tipo = models.CharField(max_length=20, choices=Transaction.TIPO_CHOICES)
+    cantidad = models.PositiveBigIntegerField(default=0)
+    movimientos = models.PositiveIntegerField(default=0)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['inventario', 'tipo'], name='resumen_archivo_unico'),
+        ]
+    def __str__(self):
+        return f"{self.inventario.producto.nombre} {self.tipo}: {self.cantidad}"
+
+class SnapshotStock(models.Model):
+    """
+    Stock de un inventario al cierre de un día (todas las transacciones con
+    fecha anterior al inicio del día siguiente). Ver inventory/ledger.py.
+    """
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE, related_name='snapshots')
+    fecha = models.DateField()
+    cantidad = models.IntegerField()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['inventario', 'fecha'], name='snapshot_inventario_fecha_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['fecha'], name='snapshot_fecha_idx'),
+        ]
+    def __str__(self):
+        return f"{self.inventario.producto.nombre} al {self.fecha}: {self.cantidad}"
+
+class PronosticoDemanda(models.Model):
+    """
+    Pronóstico de consumo diario por inventario, calculado desde los egresos
+    de Transaction (ver inventory/forecasting.py). Se refresca de forma
+    incremental a partir de ultima_transaccion_id.
+    """
+    inventario = models.OneToOneField(Inventario, on_delete=models.CASCADE, related_name='pronostico')
+    promedio_movil = models.FloatField(default=0)
+    suavizado_exponencial = models.FloatField(default=0)
+    desviacion = models.FloatField(default=0)
+    stock_seguridad = models.PositiveIntegerField(default=0)
+    punto_reorden = models.PositiveIntegerField(default=0)
+    stock_minimo_sugerido = models.PositiveIntegerField(default=1)
+    ultima_fecha = models.DateField(null=True, blank=True)
+    ultima_transaccion_id = models.BigIntegerField(default=0)
+    fecha_calculo = models.DateTimeField(auto_now=True)
+    def __str__(self):
+        return f"Pronóstico {self.inventario.producto.nombre}: {self.suavizado_exponencial:.2f}/día"
 
 class Proveedor(models.Model):
-    nombre = models.CharField(max_length=100, unique=True)
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='proveedores')
+    nombre = models.CharField(max_length=100)
     contacto = models.CharField(max_length=100)
     email = models.EmailField(
         max_length=254,
-        unique=True,
         blank=True,
         null=True,
         error_messages={
@@ -107,6 +406,13 @@ class Proveedor(models.Model):
         max_length=20,
         validators=[RegexValidator(r'^\+?\d{1,3}?[-.\s]?\(?\d{1,4}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,9}$', 'Formato inválido.')]
     )
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['empresa', 'nombre'], name='proveedor_empresa_nombre_unico'),
+            models.UniqueConstraint(fields=['empresa', 'email'], name='proveedor_empresa_email_unico'),
+        ]
     def __str__(self):
         return self.nombre
 
@@ -117,13 +423,29 @@ class Pedido(models.Model):
         ('Completado', 'Completado'),
         ('Cancelado', 'Cancelado'),
     )
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='pedidos')
     proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)
+    # Bodega desde la que se despacha: ahí se reserva y se descuenta el stock
+    bodega = models.ForeignKey(Bodega, on_delete=models.PROTECT, null=True, blank=True, related_name='pedidos')
     fecha_pedido = models.DateTimeField(auto_now_add=True)
     fecha_vencimiento = models.DateField(null=True, blank=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default='Pendiente')
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'fecha_pedido'], name='pedido_empresa_fecha_idx'),
+            models.Index(fields=['empresa', 'estado', 'fecha_vencimiento'], name='pedido_empresa_estado_idx'),
+        ]
     
     def __str__(self):
         return f"Pedido {self.id} - {self.proveedor.nombre}"
+
+    def save(self, *args, **kwargs):
+        if self.bodega_id is None:
+            self.bodega = Bodega.principal(self.empresa_id)
+        super().save(*args, **kwargs)
         
     def esta_vencido(self):
         if self.fecha_vencimiento and self.estado == 'Pendiente':
@@ -141,41 +463,34 @@ def gestion_cambio_estado(sender, instance, **kwargs):
     if not instance.pk: return # La creación la maneja la vista
 
     try:
-        old = Pedido.objects.get(pk=instance.pk)
+        old = Pedido.todas_las_empresas.get(pk=instance.pk)
     except Pedido.DoesNotExist: return
 
     reservan = ['Pendiente', 'Entransito']
     
+    # La reserva se hizo en la bodega que tenía el pedido antes de este cambio
     # CASO: CANCELAR (Devolver reserva)
     if old.estado in reservan and instance.estado == 'Cancelado':
         for item in old.items.all():
-            Inventario.objects.filter(producto=item.producto).update(
-                stock_reservado=F('stock_reservado') - item.cantidad
-            )
+            ajustar_stock(item.producto_id, old.bodega_id, reservado=-item.cantidad)
 
     # CASO: COMPLETAR (Consumir stock real y quitar reserva)
     elif old.estado in reservan and instance.estado == 'Completado':
-        for item in old.items.all():
-            # 1. Registrar Historial
-            Transaction.objects.create(
-                inventario=item.producto.inventario,
-                tipo='egreso',
-                cantidad=item.cantidad,
-                descripcion=f"Pedido Completado #{instance.id}"
-            )
-            # 2. Actualizar Inventario (Resta cantidad, Quita reserva)
-            Inventario.objects.filter(producto=item.producto).update(
-                cantidad=F('cantidad') - item.cantidad,
-                stock_reservado=F('stock_reservado') - item.cantidad
-            )
+        from . import ledger  # ledger importa este módulo
+        # Un egreso por ítem que consume su reserva: historial, stock, bodega y lotes FEFO en un lote
+        lineas = [
+            (item.producto, 'egreso', item.cantidad, f"Pedido Completado #{instance.id}")
+            for item in old.items.select_related('producto')
+        ]
+        if lineas:
+            with usar_empresa(old.empresa_id):
+                ledger.registrar_movimientos(lineas, bodega=old.bodega, libera_reserva=True)
 
 @receiver(pre_delete, sender=Pedido)
 def liberar_al_eliminar(sender, instance, **kwargs):
     if instance.estado in ['Pendiente', 'Entransito']:
         for item in instance.items.all():
-            Inventario.objects.filter(producto=item.producto).update(
-                stock_reservado=F('stock_reservado') - item.cantidad
-            )
+            ajustar_stock(item.producto_id, instance.bodega_id, reservado=-item.cantidad)
 
 class PedidoItem(models.Model):
     pedido = models.ForeignKey(Pedido, on_delete=models.CASCADE, related_name='items')
@@ -185,8 +500,53 @@ class PedidoItem(models.Model):
         return f"{self.cantidad} de {self.producto.nombre}"
 
 class Reporte(models.Model):
+    empresa = models.ForeignKey(Empresa, on_delete=models.CASCADE, null=True, blank=True,
+                                default=empresa_actual_id, related_name='reportes')
     tipo = models.CharField(max_length=100)
     fecha = models.DateTimeField(auto_now_add=True)
     contenido = models.TextField()
+    objects = EmpresaManager()
+    todas_las_empresas = models.Manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['empresa', 'fecha'], name='reporte_empresa_fecha_idx'),
+        ]
     def __str__(self):
-        return f"{self.tipo} - {self.fecha}"
\ No newline at end of file
+        return f"{self.tipo} - {self.fecha}"
+
+# --- Cache de fragmentos del dashboard: cada cambio invalida las listas que lo muestran ---
+# Los reportes Resumen muestran el precio de venta actual, por eso Producto invalida ambos
+FRAGMENTOS_POR_MODELO = {
+    Proveedor: ('proveedores',),
+    Producto: ('productos', 'reportes'),
+    User: ('usuarios',),
+    Reporte: ('reportes',),
+}
+
+def invalidar_fragmentos(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return  # el login no cambia la lista de usuarios
+    for nombre in FRAGMENTOS_POR_MODELO[sender]:
+        fragmentos.invalidar(nombre, instance.empresa_id)
+
+for modelo in FRAGMENTOS_POR_MODELO:
+    post_save.connect(invalidar_fragmentos, sender=modelo, dispatch_uid=f'fragmentos_{modelo.__name__}_save')
+    post_delete.connect(invalidar_fragmentos, sender=modelo, dispatch_uid=f'fragmentos_{modelo.__name__}_delete')
+
+# Usuario cacheado por UsuarioCacheadoBackend (incluye su empresa)
+@receiver([post_save, post_delete], sender=User)
+def invalidar_usuario_cacheado(sender, instance, **kwargs):
+    from .autenticacion import clave_usuario  # el módulo importa el backend de auth, que necesita este modelo
+    cache.delete(clave_usuario(instance.pk))
+
+@receiver([post_save, post_delete], sender=Empresa)
+def invalidar_usuarios_de_empresa(sender, instance, **kwargs):
+    from .autenticacion import clave_usuario
+    ids = User.objects.filter(empresa_id=instance.pk).values_list('pk', flat=True)
+    cache.delete_many([clave_usuario(pk) for pk in ids])
+
+# Cache en memoria de código escaneado -> producto
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_codigos_producto(sender, instance, **kwargs):
+    from . import codigos  # el módulo importa Producto
+    codigos.invalidar_producto(instance.pk)
@@ -0,0 +1,239 @@
+"""
+Generador de datos sintéticos para reproducir volúmenes de producción.
+
+Crea en una empresa (nueva o existente) un catálogo con popularidad tipo
+Zipf, un historial de movimientos repartido en el período y pedidos con la
+distribución de estados y de líneas de la operación real. Todo se escribe
+con bulk_create por lotes; el historial se puede repartir entre procesos.
+
+Determinista por semilla: cada producto usa su propio generador derivado de
+(semilla, índice del producto), así el resultado no depende de cuántos
+procesos se usen. Inventario y StockBodega quedan iguales al saldo del
+historial generado (el historial nunca deja el saldo negativo) y las
+reservas de los pedidos pendientes no superan ese saldo.
+"""
+import math
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.db import connections
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (
+    Bodega, Empresa, Inventario, Pedido, PedidoItem, Producto, Proveedor, StockBodega, Transaction,
+)
+
+UNIDADES = ['kg', 'un', 'lt', 'caja']
+CATEGORIAS = ['Pescado', 'Marisco', 'Congelado', 'Conserva', 'Insumo', 'Embalaje']
+ESTADOS_PEDIDO = [('Completado', 0.7), ('Cancelado', 0.08), ('Pendiente', 0.15), ('Entransito', 0.07)]
+# Proporción de reposiciones (ingresos) entre los movimientos de un producto
+PROPORCION_INGRESOS = 0.25
+
+
+@contextmanager
+def fecha_manual(modelo, campo='fecha'):
+    """Permite fijar un campo auto_now_add en bulk_create."""
+    field = modelo._meta.get_field(campo)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def _rnd(semilla, *claves):
+    return random.Random('-'.join(map(str, (semilla, *claves))))
+
+
+def _iniciar_proceso():
+    # Con spawn el proceso parte sin Django; con fork hereda conexiones que no debe usar
+    django.setup()
+    connections.close_all()
+
+
+def generar_movimientos(tarea):
+    """
+    Genera y escribe el historial de un grupo de productos. tarea es
+    (semilla, empresa_id, bodega_id, [(indice, inventario_id, cantidad_movimientos)],
+    desde, dias, lote, stock_inicial). Retorna {inventario_id: saldo}.
+    """
+    semilla, empresa_id, bodega_id, productos, desde, dias, lote, stock_inicial = tarea
+    saldos = {}
+    pendientes = []
+    with fecha_manual(Transaction):
+        for indice, inventario_id, n in productos:
+            rnd = _rnd(semilla, 'movimientos', indice)
+            segundos = sorted(rnd.randrange(dias * 86400) for _ in range(n))
+            escala = rnd.choice((5, 10, 20, 50))
+            saldo = 0
+            for i, segundo in enumerate(segundos):
+                cantidad = max(1, int(rnd.expovariate(1 / escala)))
+                # El primer movimiento es el stock inicial; un egreso sin saldo se vuelve reposición
+                if i == 0 or rnd.random() < PROPORCION_INGRESOS or cantidad > saldo:
+                    tipo = 'ingreso'
+                    if i == 0 or cantidad > saldo:
+                        cantidad *= rnd.randint(5, 20)
+                    if i == 0:
+                        cantidad += stock_inicial
+                    saldo += cantidad
+                else:
+                    tipo = 'egreso'
+                    saldo -= cantidad
+                pendientes.append(Transaction(
+                    empresa_id=empresa_id, inventario_id=inventario_id, bodega_id=bodega_id,
+                    tipo=tipo, cantidad=cantidad, fecha=desde + timedelta(seconds=segundo),
+                ))
+                if len(pendientes) >= lote:
+                    Transaction.todas_las_empresas.bulk_create(pendientes)
+                    pendientes = []
+            saldos[inventario_id] = saldo
+        if pendientes:
+            Transaction.todas_las_empresas.bulk_create(pendientes)
+    return saldos
+
+
+def _empresa(empresa_id, semilla, nombre=None):
+    if empresa_id is not None:
+        return Empresa.objects.get(pk=empresa_id)
+    rnd = _rnd(semilla, 'empresa')
+    while True:
+        rut = f'{rnd.randrange(10_000_000, 99_999_999)}-{rnd.randrange(10)}'
+        if not Empresa.objects.filter(rut=rut).exists():
+            break
+    return Empresa.objects.create(
+        nombre=nombre or f'Sintética {semilla}', rut=rut, direccion='Datos sintéticos', telefono='+56 9 1234 5678'
+    )
+
+
+def _con_pk(creados, qs):
+    # MySQL no devuelve los ids de bulk_create
+    return creados if creados and creados[0].pk else list(qs)
+
+
+def generar(productos, movimientos, pedidos, lineas_pedido=4, dias=365, semilla=1,
+            procesos=1, lote=10_000, empresa_id=None, prefijo='SINT', stock_inicial=0, informar=print):
+    """
+    Genera el conjunto completo. movimientos es el total del historial,
+    repartido entre productos según su popularidad; stock_inicial se suma al
+    primer ingreso de cada producto. Retorna un resumen.
+    """
+    rnd = _rnd(semilla, 'catalogo')
+    empresa = _empresa(empresa_id, semilla)
+    bodega = Bodega.principal(empresa.pk)
+    hasta = timezone.now()
+    desde = hasta - timedelta(days=dias)
+
+    catalogo = []
+    for i in range(productos):
+        costo = round(math.exp(rnd.gauss(8, 1)))
+        catalogo.append(Producto(
+            empresa=empresa, nombre=f'{prefijo}-{i:06d} {rnd.choice(CATEGORIAS)}', descripcion='Dato sintético',
+            unidad=rnd.choice(UNIDADES), precio_unitario=costo, precio_venta=costo * rnd.choice((12, 14, 16, 20)) // 10,
+        ))
+    catalogo = _con_pk(
+        Producto.todas_las_empresas.bulk_create(catalogo, batch_size=lote),
+        Producto.todas_las_empresas.filter(empresa=empresa, nombre__startswith=f'{prefijo}-').order_by('id'),
+    )
+    inventarios = _con_pk(
+        Inventario.todas_las_empresas.bulk_create([
+            Inventario(empresa=empresa, producto=p, stock_minimo=rnd.choice((5, 10, 20, 50))) for p in catalogo
+        ], batch_size=lote),
+        Inventario.todas_las_empresas.filter(
+            empresa=empresa, producto__nombre__startswith=f'{prefijo}-'
+        ).order_by('producto_id'),
+    )
+    informar(f'{len(inventarios)} productos creados.')
+
+    # Popularidad tipo Zipf: pocos productos concentran la mayoría de los movimientos
+    pesos = [1 / (rango + 1) ** 0.8 for rango in range(productos)]
+    rnd.shuffle(pesos)
+    total_pesos = sum(pesos)
+    por_producto = [max(1, round(movimientos * p / total_pesos)) for p in pesos]
+
+    # Grupos de ~50.000 movimientos: suficientes para repartir entre procesos
+    tareas, grupo, en_grupo = [], [], 0
+    for indice, (inv, n) in enumerate(zip(inventarios, por_producto)):
+        grupo.append((indice, inv.id, n))
+        en_grupo += n
+        if en_grupo >= 50_000:
+            tareas.append((semilla, empresa.pk, bodega.pk, grupo, desde, dias, lote, stock_inicial))
+            grupo, en_grupo = [], 0
+    if grupo:
+        tareas.append((semilla, empresa.pk, bodega.pk, grupo, desde, dias, lote, stock_inicial))
+
+    saldos = {}
+    if procesos > 1:
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as ejecutor:
+            for hechas, parcial in enumerate(ejecutor.map(generar_movimientos, tareas), 1):
+                saldos.update(parcial)
+                informar(f'Movimientos: {hechas}/{len(tareas)} grupos.')
+    else:
+        for hechas, tarea in enumerate(tareas, 1):
+            saldos.update(generar_movimientos(tarea))
+            informar(f'Movimientos: {hechas}/{len(tareas)} grupos.')
+
+    # Pedidos: los pendientes y en tránsito reservan sin pasar del saldo generado
+    rnd = _rnd(semilla, 'pedidos')
+    proveedores = _con_pk(
+        Proveedor.todas_las_empresas.bulk_create([
+            Proveedor(empresa=empresa, nombre=f'{prefijo} Proveedor {i}', contacto=f'Contacto {i}',
+                      email=f'{prefijo.lower()}{i}@proveedor.cl', telefono='+56 9 1234 5678')
+            for i in range(max(1, pedidos // 100))
+        ]),
+        Proveedor.todas_las_empresas.filter(empresa=empresa, nombre__startswith=f'{prefijo} Proveedor').order_by('id'),
+    )
+    estados, probabilidades = zip(*ESTADOS_PEDIDO)
+    nuevos = []
+    for _ in range(pedidos):
+        estado = rnd.choices(estados, probabilidades)[0]
+        fecha = desde + timedelta(seconds=rnd.randrange(dias * 86400))
+        nuevos.append(Pedido(
+            empresa=empresa, proveedor=rnd.choice(proveedores), bodega=bodega, estado=estado, fecha_pedido=fecha,
+            fecha_vencimiento=(fecha + timedelta(days=rnd.randint(1, 30))).date(),
+        ))
+    ultimo = Pedido.todas_las_empresas.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    with fecha_manual(Pedido, 'fecha_pedido'):
+        nuevos = _con_pk(
+            Pedido.todas_las_empresas.bulk_create(nuevos, batch_size=lote),
+            Pedido.todas_las_empresas.filter(empresa=empresa, id__gt=ultimo).order_by('id'),
+        )
+    items = []
+    reservas = defaultdict(int)
+    for pedido in nuevos:
+        n_lineas = min(productos, 1 + int(rnd.expovariate(1 / max(lineas_pedido - 1, 0.1))))
+        for indice in rnd.sample(range(productos), n_lineas):
+            inv = inventarios[indice]
+            cantidad = max(1, int(rnd.expovariate(1 / 10)))
+            if pedido.estado in ('Pendiente', 'Entransito'):
+                cantidad = min(cantidad, saldos[inv.id] - reservas[inv.id])
+                if cantidad <= 0:
+                    continue
+                reservas[inv.id] += cantidad
+            items.append(PedidoItem(pedido=pedido, producto_id=inv.producto_id, cantidad=cantidad))
+    PedidoItem.objects.bulk_create(items, batch_size=lote)
+
+    ahora = timezone.now()
+    for inv in inventarios:
+        inv.cantidad = saldos[inv.id]
+        inv.stock_reservado = reservas[inv.id]
+        inv.fecha_actualizacion = ahora
+    Inventario.todas_las_empresas.bulk_update(
+        inventarios, ['cantidad', 'stock_reservado', 'fecha_actualizacion'], batch_size=lote
+    )
+    StockBodega.todas_las_empresas.bulk_create([
+        StockBodega(inventario=inv, bodega=bodega, cantidad=inv.cantidad, stock_reservado=inv.stock_reservado)
+        for inv in inventarios
+    ], batch_size=lote)
+    return {
+        'empresa_id': empresa.pk,
+        'productos': len(inventarios),
+        'movimientos': sum(por_producto),
+        'pedidos': len(nuevos),
+        'lineas_pedido': len(items),
+    }
@@ -0,0 +1,280 @@
+"""
+Sincronización por lotes para escáneres que trabajan sin cobertura.
+
+El dispositivo acumula operaciones (movimientos y pedidos completados) con su
+hora local y un id propio, y las envía juntas a /api/sync/. Se aplican en una
+sola transacción en orden de fecha (las horas sin zona se toman en la zona
+del servidor); las que chocan con el disponible actual se devuelven como
+conflicto sin aplicarse. La respuesta incluye los inventarios modificados
+desde el token de la sincronización anterior.
+
+Cada operación aplicada deja una ClaveIdempotencia con su id: reenviar el lote
+la devuelve como 'duplicado'. limpiar_idempotencia conserva estas claves
+TTL_OPERACIONES_DIAS días, no las 24 horas de las demás. Si dos copias del
+mismo lote llegan a la vez, la segunda choca con la restricción única de esas
+claves al confirmar, se deshace completa y se vuelve a aplicar una vez, ya
+viendo las claves de la primera.
+"""
+import base64
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import events, ledger, lotes
+from .idempotency import SUFIJO_OPERACION
+from .models import (
+    Bodega, ClaveIdempotencia, Inventario, Pedido, PedidoItem, Producto, Transaction, check_stock_alert,
+)
+
+MAX_OPERACIONES = 5000
+# ClaveIdempotencia.clave tiene 64 caracteres, incluido PREFIJO_CLAVE
+MAX_LARGO_ID = 60
+# Margen para no perder filas actualizadas en transacciones que confirmaron tarde
+MARGEN_DELTA = timedelta(seconds=5)
+PREFIJO_CLAVE = 'op:'
+
+
+class ErrorSync(Exception):
+    pass
+
+
+def codificar_token(momento):
+    return base64.urlsafe_b64encode(momento.isoformat().encode()).decode()
+
+
+def decodificar_token(token):
+    if not token:
+        return None
+    try:
+        momento = parse_datetime(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        momento = None
+    if momento is None:
+        raise ErrorSync('token_sync inválido.')
+    return momento
+
+
+def _normalizar(operaciones):
+    if not isinstance(operaciones, list):
+        raise ErrorSync('"operaciones" debe ser una lista.')
+    if len(operaciones) > MAX_OPERACIONES:
+        raise ErrorSync(f'Máximo {MAX_OPERACIONES} operaciones por sincronización.')
+    normalizadas = []
+    for op in operaciones:
+        try:
+            fecha = parse_datetime(op['fecha'])
+            normal = {'id': str(op['id']), 'accion': op['accion'], 'fecha': fecha}
+            if op['accion'] == 'movimiento':
+                normal.update(producto=int(op['producto']), tipo=op['tipo'], cantidad=int(op['cantidad']),
+                              bodega=int(op['bodega']) if op.get('bodega') is not None else None)
+            elif op['accion'] == 'completar_pedido':
+                normal.update(pedido=int(op['pedido']))
+            else:
+                raise ValueError
+        except (KeyError, TypeError, ValueError):
+            raise ErrorSync(f'Operación inválida: {op!r}')
+        if not normal['id'] or len(normal['id']) > MAX_LARGO_ID:
+            raise ErrorSync(f'El id de cada operación debe tener entre 1 y {MAX_LARGO_ID} caracteres.')
+        if fecha is None:
+            raise ErrorSync(f'Fecha inválida en la operación {normal["id"]}.')
+        if timezone.is_naive(fecha):
+            # Sin zona: hora del servidor. Así se pueden ordenar junto a las que traen zona
+            normal['fecha'] = timezone.make_aware(fecha)
+        normalizadas.append(normal)
+    return sorted(normalizadas, key=lambda op: op['fecha'])
+
+
+def _ya_aplicadas(usuario, operaciones, prefijo):
+    return {clave[len(PREFIJO_CLAVE):] for clave in ClaveIdempotencia.objects.filter(
+        usuario=usuario, clave__in=[PREFIJO_CLAVE + op['id'] for op in operaciones], ruta=prefijo
+    ).values_list('clave', flat=True)}
+
+
+def sincronizar(usuario, operaciones, token=None, dispositivo='', ruta='/api/sync/'):
+    """
+    Aplica las operaciones y retorna {'resultados', 'inventario', 'token_sync'}.
+    Cada resultado tiene estado 'aplicado', 'duplicado' o 'conflicto'.
+    """
+    desde = decodificar_token(token)
+    operaciones = _normalizar(operaciones)
+    try:
+        resultados, tocados = _aplicar(usuario, operaciones, dispositivo, ruta + SUFIJO_OPERACION)
+    except IntegrityError:
+        # Otra copia del lote confirmó primero las mismas operaciones: ahora salen como duplicadas
+        resultados, tocados = _aplicar(usuario, operaciones, dispositivo, ruta + SUFIJO_OPERACION)
+
+    for inv in tocados.values():
+        check_stock_alert(Inventario, inv)
+
+    nuevo_token = timezone.now()
+    delta = Inventario.objects.all()
+    if desde is not None:
+        delta = delta.filter(fecha_actualizacion__gte=desde - MARGEN_DELTA)
+    return {
+        'resultados': resultados,
+        'inventario': [
+            {
+                'producto_id': producto_id,
+                'cantidad': cantidad,
+                'stock_reservado': reservado,
+                'disponible': cantidad - reservado,
+            }
+            for producto_id, cantidad, reservado in delta.order_by('producto_id').values_list(
+                'producto_id', 'cantidad', 'stock_reservado'
+            )
+        ],
+        'token_sync': codificar_token(nuevo_token),
+    }
+
+
+def _aplicar(usuario, operaciones, dispositivo, prefijo):
+    """Aplica el lote en una transacción. Retorna (resultados, {producto_id: inventario tocado})."""
+    resultados = []
+    tocados = {}
+    completados = []
+    aplicadas = []
+    with transaction.atomic():
+        # Dentro de la transacción: una copia concurrente que confirme después choca al insertar las claves
+        ya_aplicadas = _ya_aplicadas(usuario, operaciones, prefijo)
+        pedido_ids = {op['pedido'] for op in operaciones if op['accion'] == 'completar_pedido'}
+        pedidos = Pedido.objects.select_for_update().in_bulk(pedido_ids)
+        items = defaultdict(lambda: defaultdict(int))
+        for pedido_id, producto_id, cantidad in PedidoItem.objects.filter(
+            pedido_id__in=pedido_ids
+        ).values_list('pedido_id', 'producto_id', 'cantidad'):
+            items[pedido_id][producto_id] += cantidad
+
+        producto_ids = {op['producto'] for op in operaciones if op['accion'] == 'movimiento'}
+        productos = Producto.objects.in_bulk(producto_ids)
+        producto_ids |= {p for lineas in items.values() for p in lineas}
+        faltantes = set(productos) - set(
+            Inventario.objects.filter(producto_id__in=productos).values_list('producto_id', flat=True)
+        )
+        Inventario.objects.bulk_create([
+            Inventario(producto_id=p, empresa_id=productos[p].empresa_id, stock_minimo=10) for p in faltantes
+        ])
+        inventarios = {
+            inv.producto_id: inv
+            for inv in Inventario.objects.select_for_update().select_related('producto').filter(
+                producto_id__in=producto_ids
+            )
+        }
+
+        # Bodega de cada operación: la indicada, la del pedido o la principal de la empresa
+        bodegas = Bodega.objects.in_bulk({op['bodega'] for op in operaciones if op.get('bodega') is not None})
+        principales = {}
+
+        def bodega_de(inv, bodega_id):
+            if bodega_id is not None:
+                return bodega_id
+            if inv.empresa_id not in principales:
+                principales[inv.empresa_id] = Bodega.principal(inv.empresa_id).pk
+            return principales[inv.empresa_id]
+
+        pares = set()
+        for op in operaciones:
+            if op['accion'] == 'movimiento' and op['producto'] in inventarios and (
+                op['bodega'] is None or op['bodega'] in bodegas
+            ):
+                inv = inventarios[op['producto']]
+                pares.add((inv.id, bodega_de(inv, op['bodega'])))
+            elif op['accion'] == 'completar_pedido' and op['pedido'] in pedidos:
+                pedido = pedidos[op['pedido']]
+                for producto_id in items[pedido.id]:
+                    if producto_id in inventarios:
+                        inv = inventarios[producto_id]
+                        pares.add((inv.id, bodega_de(inv, pedido.bodega_id)))
+        stocks = ledger.bloquear_stock_bodegas(pares)
+
+        movimientos = []
+        for op in operaciones:
+            resultado = {'id': op['id'], 'estado': 'aplicado'}
+            resultados.append(resultado)
+            if op['id'] in ya_aplicadas:
+                resultado['estado'] = 'duplicado'
+                continue
+            etiqueta = f"Sync {dispositivo or usuario.username} {op['fecha']:%Y-%m-%d %H:%M}"
+
+            if op['accion'] == 'movimiento':
+                inv = inventarios.get(op['producto'])
+                if inv is None:
+                    resultado.update(estado='conflicto', mensaje='Producto inexistente.')
+                    continue
+                if op['tipo'] not in ('ingreso', 'egreso') or op['cantidad'] <= 0:
+                    resultado.update(estado='conflicto', mensaje='Movimiento inválido.')
+                    continue
+                if op['bodega'] is not None and op['bodega'] not in bodegas:
+                    resultado.update(estado='conflicto', mensaje='Bodega inexistente.')
+                    continue
+                bodega_id = bodega_de(inv, op['bodega'])
+                stock = stocks[(inv.id, bodega_id)]
+                if op['tipo'] == 'egreso' and op['cantidad'] > stock.cantidad - stock.stock_reservado:
+                    resultado.update(
+                        estado='conflicto',
+                        mensaje=f'Stock disponible insuficiente: {stock.cantidad - stock.stock_reservado}.'
+                    )
+                    continue
+                delta = op['cantidad'] if op['tipo'] == 'ingreso' else -op['cantidad']
+                inv.cantidad += delta
+                stock.cantidad += delta
+                movimientos.append(Transaction(
+                    inventario=inv, empresa_id=inv.empresa_id, bodega_id=bodega_id,
+                    tipo=op['tipo'], cantidad=op['cantidad'], descripcion=etiqueta
+                ))
+                tocados[inv.producto_id] = inv
+
+            else:
+                pedido = pedidos.get(op['pedido'])
+                if pedido is None or pedido.estado not in ('Pendiente', 'Entransito'):
+                    resultado.update(estado='conflicto', mensaje='El pedido no existe o ya no está pendiente.')
+                    continue
+                lineas = items[pedido.id]
+                en_bodega = {
+                    p: stocks[(inventarios[p].id, bodega_de(inventarios[p], pedido.bodega_id))]
+                    for p in lineas if p in inventarios
+                }
+                sin_stock = [
+                    inventarios[p].producto.nombre if p in inventarios else f'producto #{p}'
+                    for p, c in lineas.items() if p not in en_bodega or en_bodega[p].cantidad < c
+                ]
+                if sin_stock:
+                    resultado.update(estado='conflicto', mensaje=f'Stock insuficiente: {", ".join(sin_stock)}.')
+                    continue
+                # Mismo efecto que gestion_cambio_estado, pero acumulado en memoria para escribir una sola vez
+                for producto_id, cantidad in lineas.items():
+                    inv = inventarios[producto_id]
+                    stock = en_bodega[producto_id]
+                    inv.cantidad -= cantidad
+                    inv.stock_reservado = max(inv.stock_reservado - cantidad, 0)
+                    stock.cantidad -= cantidad
+                    stock.stock_reservado = max(stock.stock_reservado - cantidad, 0)
+                    movimientos.append(Transaction(
+                        inventario=inv, empresa_id=inv.empresa_id, bodega_id=stock.bodega_id,
+                        tipo='egreso', cantidad=cantidad,
+                        descripcion=f'Pedido Completado #{pedido.id} ({etiqueta})'
+                    ))
+                    tocados[producto_id] = inv
+                pedido.estado = 'Completado'
+                completados.append(pedido.id)
+            aplicadas.append(op['id'])
+            ya_aplicadas.add(op['id'])
+
+        ahora = timezone.now()
+        for inv in tocados.values():
+            inv.fecha_actualizacion = ahora
+        Inventario.objects.bulk_update(tocados.values(), ['cantidad', 'stock_reservado', 'fecha_actualizacion'])
+        ledger.guardar_stock_bodegas(stocks.values())
+        lotes.asignar(lotes.demandas_de(movimientos))
+        Transaction.objects.bulk_create(movimientos)
+        # update() directo: el stock ya se aplicó arriba y el signal pre_save lo duplicaría
+        Pedido.objects.filter(id__in=completados).update(estado='Completado')
+        events.publicar_movimientos(movimientos)
+        events.publicar_inventarios(tocados.values())
+        ClaveIdempotencia.objects.bulk_create([
+            ClaveIdempotencia(usuario=usuario, clave=PREFIJO_CLAVE + op_id, ruta=prefijo, en_proceso=False, status=200)
+            for op_id in aplicadas
+        ])
+    return resultados, tocados
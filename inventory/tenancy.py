@@ -0,0 +1,113 @@
+"""
+Multi-empresa en una sola instalación.
+
+Los modelos con datos de una empresa (Producto, Inventario, Transaction,
+Proveedor, Pedido, Reporte) tienen el campo empresa y usan EmpresaManager:
+sus consultas se limitan a la empresa activa. La empresa activa la fija
+EmpresaMiddleware con la del usuario del request (token_requerido hace lo
+mismo en la API) y usar_empresa() en comandos o tareas. Sin empresa activa
+(superusuarios o tokens sin empresa, código fuera del middleware) las
+consultas no retornan filas: lo que recorre todas las empresas a propósito
+(comandos de mantenimiento, admin de superusuarios) usa el manager
+todas_las_empresas o corre dentro de usar_todas_las_empresas().
+
+El filtro es una expresión que se resuelve al compilar el SQL, no al crear el
+QuerySet: los querysets armados al importar (ModelChoiceField de los
+formularios) también quedan limitados a la empresa del request que los usa.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth.models import UserManager
+from django.db import models
+
+_empresa = ContextVar('empresa_actual', default=None)
+_todas = ContextVar('todas_las_empresas', default=False)
+
+
+def empresa_actual_id():
+    """Empresa activa; también es el default del campo empresa al crear filas."""
+    return _empresa.get()
+
+
+@contextmanager
+def usar_empresa(empresa_id):
+    token = _empresa.set(empresa_id)
+    try:
+        yield
+    finally:
+        _empresa.reset(token)
+
+
+@contextmanager
+def usar_todas_las_empresas():
+    """Sin empresa activa, las consultas ven todas las empresas en vez de ninguna."""
+    token = _todas.set(True)
+    try:
+        yield
+    finally:
+        _todas.reset(token)
+
+
+class EnEmpresaActual(models.Expression):
+    """Condición campo = empresa activa; sin empresa activa compila a falso."""
+    conditional = True
+    output_field = models.BooleanField()
+
+    def __init__(self, campo='empresa'):
+        super().__init__()
+        self.campo = models.F(campo)
+
+    def get_source_expressions(self):
+        return [self.campo]
+
+    def set_source_expressions(self, exprs):
+        (self.campo,) = exprs
+
+    def as_sql(self, compiler, connection):
+        empresa_id = empresa_actual_id()
+        if empresa_id is None:
+            return ('1 = 1' if _todas.get() else '1 = 0'), []
+        sql, params = compiler.compile(self.campo)
+        return f'{sql} = %s', [*params, empresa_id]
+
+
+class EmpresaManager(models.Manager):
+    # Ruta al campo empresa; las subclases la cambian para modelos sin FK directa.
+    # Es atributo de clase porque los related managers instancian la clase sin argumentos.
+    campo = 'empresa'
+
+    def get_queryset(self):
+        return super().get_queryset().filter(EnEmpresaActual(self.campo))
+
+
+class EmpresaUserManager(UserManager):
+    """
+    Los usuarios se buscan sin filtrar (login, unicidad de username y RUT son
+    globales); las listas por empresa usan de_empresa_actual().
+    """
+    def de_empresa_actual(self):
+        return self.get_queryset().filter(EnEmpresaActual())
+
+
+class EmpresaMiddleware:
+    """Activa la empresa del usuario autenticado. Va después de AuthenticationMiddleware."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with usar_empresa(getattr(request.user, 'empresa_id', None)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        with usar_empresa(getattr(user, 'empresa_id', None)):
+            return await self.get_response(request)
@@ -1,3 +1,1340 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from datetime import timedelta
+from io import StringIO
+
+import numpy as np
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import MiddlewareNotUsed
+from django.forms import ValidationError
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from control_stock import metricas
+from control_stock.metricas import vigilar_nmas1
+from control_stock.mysql_pool import base as mysql_pool
+from control_stock.routers import COOKIE_PRIMARIA, ReplicaMiddleware, ReplicaRouter
+from . import (
+    api, archive, benchmark, busqueda, codigos, events, forecasting, idempotency, ledger, lineas_pedido, sintetico,
+    sync,
+)
+from .idempotency import idempotente
+from .autenticacion import clave_usuario
+from .forms import ProductoForm
+from .management.commands.medir_transferencia import medir_carga
+from .sintetico import fecha_manual
+from .models import (
+    Bodega, ClaveIdempotencia, Inventario, Lote, Pedido, PedidoItem, Producto, Proveedor, PronosticoDemanda,
+    SnapshotStock, StockBodega, TokenAPI, Transaction, User, ajustar_stock,
+)
+from .tenancy import usar_empresa, usar_todas_las_empresas
+
+
+def _producto(nombre, db):
+    return Producto.objects.using(db).create(
+        nombre=nombre, descripcion='', unidad='kg', precio_unitario=1, precio_venta=2
+    )
+
+
+@skipUnless('replica' in settings.DATABASES, 'Requiere --settings=control_stock.settings_test')
+class ReplicaRouterTests(TransactionTestCase):
+    """Primaria y réplica son bases distintas: cada lectura muestra de dónde vino."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        _producto('en-primaria', 'default')
+        _producto('en-replica', 'replica')
+
+    def _request(self, vista, **cookies):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        return ReplicaMiddleware(vista)(request)
+
+    def _nombres(self):
+        return list(Producto.todas_las_empresas.values_list('nombre', flat=True))
+
+    def test_fuera_de_request_lee_de_primaria(self):
+        self.assertEqual(self._nombres(), ['en-primaria'])
+
+    def test_request_lee_de_replica(self):
+        leidos = []
+        self._request(lambda request: leidos.append(self._nombres()) or HttpResponse())
+        self.assertEqual(leidos, [['en-replica']])
+
+    def test_escritura_fija_primaria_y_cookie(self):
+        leidos = []
+
+        def vista(request):
+            leidos.append(self._nombres())
+            Producto.objects.create(
+                nombre='nuevo', descripcion='', unidad='kg', precio_unitario=1, precio_venta=2
+            )
+            leidos.append(self._nombres())
+            return HttpResponse()
+
+        response = self._request(vista)
+        self.assertEqual(leidos, [['en-replica'], ['en-primaria', 'nuevo']])
+        self.assertIn(COOKIE_PRIMARIA, response.cookies)
+
+    def test_cookie_fija_primaria_en_request_siguiente(self):
+        leidos = []
+        response = self._request(
+            lambda request: leidos.append(self._nombres()) or HttpResponse(), **{COOKIE_PRIMARIA: '1'}
+        )
+        self.assertEqual(leidos, [['en-primaria']])
+        self.assertNotIn(COOKIE_PRIMARIA, response.cookies)
+
+    def test_atomic_lee_de_primaria(self):
+        leidos = []
+
+        def vista(request):
+            with transaction.atomic():
+                leidos.append(self._nombres())
+            return HttpResponse()
+
+        self._request(vista)
+        self.assertEqual(leidos, [['en-primaria']])
+
+    def test_usuario_de_la_sesion_se_lee_de_primaria(self):
+        # El usuario (AUTH_USER_MODEL) y la sesión solo existen en la primaria
+        destinos = []
+        self._request(lambda request: destinos.append(
+            (ReplicaRouter().db_for_read(User), ReplicaRouter().db_for_read(Producto))
+        ) or HttpResponse())
+        self.assertEqual(destinos, [('default', 'replica')])
+
+        self.client.force_login(User.objects.create_user('en-primaria', password=None))
+        self.assertEqual(self.client.get(reverse('buscar'), {'q': 'en'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+
+
+class _ConexionFalsa:
+    def __init__(self, caida=False):
+        self.caida = caida
+        self.cerrada = False
+        self._pool_creada = time.monotonic()
+
+    def ping(self, reconnect):
+        if self.caida:
+            raise OSError('MySQL server has gone away')
+
+    def rollback(self):
+        if self.caida:
+            raise OSError('MySQL server has gone away')
+
+    def close(self):
+        self.cerrada = True
+
+
+class MySQLPoolTests(SimpleTestCase):
+    """Lógica del pool con conexiones simuladas; MySQLPoolRealTests la recorre contra MySQL."""
+
+    def test_reutiliza_hasta_max_size(self):
+        pool = mysql_pool.Pool(max_size=1, max_lifetime=3600, check_after=30)
+        a, b = _ConexionFalsa(), _ConexionFalsa()
+        self.assertTrue(pool.devolver(a))
+        self.assertFalse(pool.devolver(b))
+        self.assertIs(pool.tomar(), a)
+        self.assertIsNone(pool.tomar())
+
+    def test_descarta_vencidas_caidas_y_sucias(self):
+        pool = mysql_pool.Pool(max_size=5, max_lifetime=3600, check_after=0)
+        vieja, caida = _ConexionFalsa(), _ConexionFalsa()
+        vieja._pool_creada -= 3600
+        pool.devolver(vieja)
+        pool.devolver(caida)
+        caida.caida = True  # se cortó mientras esperaba en el pool
+        self.assertIsNone(pool.tomar())
+        self.assertTrue(vieja.cerrada and caida.cerrada)
+        # Una conexión que no acepta el rollback no vuelve al pool
+        self.assertFalse(pool.devolver(_ConexionFalsa(caida=True)))
+
+    def test_el_hijo_de_un_fork_no_hereda_conexiones(self):
+        mysql_pool.pool_de('fork', {}).devolver(_ConexionFalsa())
+        mysql_pool._despues_de_fork()
+        self.assertIsNone(mysql_pool.pool_de('fork', {}).tomar())
+
+
+@skipUnless(os.environ.get('MYSQL_TEST_HOST'), 'Requiere un MySQL real en MYSQL_TEST_HOST.')
+class MySQLPoolRealTests(SimpleTestCase):
+
+    def _wrapper(self, alias='mysql_pool_test', **pool):
+        ajustes = connections.configure_settings({'default': {}, alias: {
+            'ENGINE': 'control_stock.mysql_pool',
+            'NAME': os.environ.get('MYSQL_TEST_NAME', 'mysql'),
+            'USER': os.environ.get('MYSQL_TEST_USER', 'root'),
+            'PASSWORD': os.environ.get('MYSQL_TEST_PASSWORD', ''),
+            'HOST': os.environ['MYSQL_TEST_HOST'],
+            'PORT': os.environ.get('MYSQL_TEST_PORT', '3306'),
+            'OPTIONS': {'pool': {'max_size': 2, 'check_after': 0, **pool}},
+        }})[alias]
+        return mysql_pool.DatabaseWrapper(ajustes, alias)
+
+    def _id(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT CONNECTION_ID()')
+            return cursor.fetchone()[0]
+
+    def tearDown(self):
+        for pool in mysql_pool._pools.values():
+            pool.vaciar()
+        mysql_pool._pools.clear()
+
+    def test_reutiliza_entre_hilos_con_ping_y_rollback(self):
+        primero = self._wrapper()
+        id_primero = self._id(primero)
+        primero.set_autocommit(False)
+        with primero.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        primero.close()
+
+        ids = []
+        hilo = threading.Thread(target=lambda: ids.append(self._id(self._wrapper())))
+        hilo.start()
+        hilo.join()
+        self.assertEqual(ids, [id_primero])
+
+    def test_recicla_por_antiguedad(self):
+        wrapper = self._wrapper('mysql_pool_vida', max_lifetime=0)
+        anterior = self._id(wrapper)
+        wrapper.close()
+        self.assertNotEqual(self._id(self._wrapper('mysql_pool_vida', max_lifetime=0)), anterior)
+
+
+@override_settings(METRICAS_MUESTREO=1, DATABASE_REPLICA=None)
+class MetricasTests(TestCase):
+
+    def _vista(self, request):
+        for nombre in ('a', 'b', 'c'):
+            Producto.objects.filter(nombre=nombre).exists()
+        return HttpResponse()
+
+    def test_forma_sql_agrupa_literales_y_listas(self):
+        self.assertEqual(
+            metricas.forma_sql('SELECT 1 FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            metricas.forma_sql('SELECT 1 FROM t WHERE id IN (%s) LIMIT 5'),
+        )
+
+    def test_cuenta_consultas_y_repetidas_por_panel(self):
+        metricas.MetricasMiddleware(self._vista)(RequestFactory().get('/', {'panel': 'reportes'}))
+        texto = metricas.histogramas.prometheus()
+        serie = 'vista="sin_ruta",panel="reportes",form_type=""'
+        self.assertIn(f'control_stock_consultas_sum{{{serie}}} 3.000000', texto)
+        self.assertIn(f'control_stock_consultas_repetidas_sum{{{serie}}} 2.000000', texto)
+
+    def test_etiquetas_arbitrarias_no_crean_series(self):
+        metricas.MetricasMiddleware(self._vista)(RequestFactory().get('/', {'panel': '"><script>'}))
+        self.assertIn('panel=""', metricas.histogramas.prometheus())
+
+    @override_settings(METRICAS_MUESTREO=0)
+    def test_sin_muestreo_no_se_instala(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            metricas.MetricasMiddleware(self._vista)
+
+
+@override_settings(DATABASE_REPLICA=None)
+class DashboardNmas1Tests(TestCase):
+    """
+    Cada panel del dashboard con más filas que el umbral en cada listado: un
+    bucle que consulte por fila repite su consulta más de UMBRAL veces y falla.
+    """
+    UMBRAL = 5
+    FILAS = 3 * UMBRAL
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(
+            productos=cls.FILAS, movimientos=2, pedidos=cls.FILAS, lineas_pedido=3, semilla=1
+        )
+        vence = timezone.localdate() + timedelta(days=10)
+        with usar_empresa(cls.empresa.pk):
+            for i, inv in enumerate(Inventario.objects.select_related('producto')):
+                ledger.registrar_movimiento(inv.producto, 'ingreso', 5, lote=f'L{i}', vencimiento=vence)
+            Pedido.objects.filter(estado='Pendiente').update(fecha_vencimiento=timezone.localdate() - timedelta(days=1))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _get(self, **params):
+        with vigilar_nmas1(umbral=self.UMBRAL, accion='error'):
+            respuesta = self.client.get(reverse('dashboard'), params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta
+
+    def test_paneles(self):
+        for panel in benchmark.PANELES:
+            with self.subTest(panel=panel):
+                self._get(panel=panel)
+
+    def test_reportes_generados_y_listados(self):
+        for tipo in ('Ingreso', 'Egreso', 'Resumen', 'Vencimiento'):
+            with self.subTest(tipo=tipo), vigilar_nmas1(umbral=self.UMBRAL, accion='error'):
+                self.client.post(reverse('dashboard'), {'form_type': 'reporte', 'tipo': tipo})
+        self._get(panel='rcv')
+
+    def test_edicion_de_pedido(self):
+        pedido = Pedido.todas_las_empresas.filter(empresa=self.empresa).first()
+        self._get(edit_pedido=pedido.pk)
+
+    def test_detector_falla_con_un_bucle_n_mas_1(self):
+        with self.assertRaises(metricas.ConsultasRepetidas):
+            with vigilar_nmas1(umbral=self.UMBRAL, accion='error'), usar_empresa(self.empresa.pk):
+                [inv.producto.nombre for inv in Inventario.objects.all()]
+
+
+@override_settings(
+    DATABASE_REPLICA=None,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class DashboardFragmentosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=3, movimientos=2, pedidos=2, lineas_pedido=1, semilla=1)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def _get(self, panel):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('dashboard'), {'panel': panel})
+        return respuesta.content.decode(), len(consultas)
+
+    def test_solo_se_renderiza_el_panel_activo(self):
+        html, _ = self._get('rcv')
+        self.assertIn('id="panel-rcv"', html)
+        self.assertNotIn('id="panel-dashboard"', html)
+        self.assertNotIn('id="panel-centro"', html)
+
+    def test_formularios_solo_se_arman_en_su_panel(self):
+        # El panel de ingreso sí arma y renderiza sus formularios (las opciones de bodega consultan la BD)
+        html, _ = self._get('ingreso')
+        self.assertIn('name="ingreso-bodega"', html)
+        cache.clear()
+        _, consultas = self._get('graficos')
+        cache.clear()
+        formularios = ('StockEntryForm', 'StockExitForm', 'TrasladoForm', 'ProveedorForm', 'ProductoForm',
+                       'PedidoForm', 'PedidoItemFormSet', 'UserRegistrationForm')
+        with ExitStack() as pila:
+            clases = [pila.enter_context(mock.patch(f'inventory.views.{nombre}')) for nombre in formularios]
+            # Sin formularios el panel hace las mismas consultas: no se construyen ni consultan nada
+            with self.assertNumQueries(consultas):
+                self.assertEqual(self.client.get(reverse('dashboard'), {'panel': 'graficos'}).status_code, 200)
+        for clase in clases:
+            clase.assert_not_called()
+
+    def test_lista_de_productos_cacheada_hasta_que_cambia(self):
+        _, primera = self._get('concepto-ingreso')
+        html, segunda = self._get('concepto-ingreso')
+        self.assertLess(segunda, primera)
+        self.assertIn('bench-0', html)
+        with usar_empresa(self.empresa.pk):
+            Producto.objects.create(nombre='recien-creado', descripcion='', unidad='kg', precio_unitario=1, precio_venta=2)
+        html, _ = self._get('concepto-ingreso')
+        self.assertIn('recien-creado', html)
+
+    def test_eliminar_desde_lista_cacheada(self):
+        proveedor = Proveedor.todas_las_empresas.get(empresa=self.empresa)
+        html, _ = self._get('centro')
+        self.assertIn(f'value="{proveedor.pk}"', html)
+        Pedido.todas_las_empresas.filter(proveedor=proveedor).delete()
+        self.client.post(reverse('dashboard'), {'form_type': 'delete_proveedor', 'pk': proveedor.pk})
+        html, _ = self._get('centro')
+        self.assertNotIn(f'value="{proveedor.pk}"', html)
+
+
+@override_settings(DATABASE_REPLICA=None)
+class EstaticosTests(TestCase):
+    """collectstatic con EstaticosComprimidos y los estáticos servidos por EstaticosMiddleware."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        raiz = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(override_settings(
+            STATIC_ROOT=raiz,
+            ESTATICOS_SERVIR=True,
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'control_stock.estaticos.EstaticosComprimidos'}},
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.css = staticfiles_storage.url('css/home.css')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=3, movimientos=2, pedidos=1, lineas_pedido=1, semilla=1)
+
+    def test_archivo_con_hash_comprimido_e_inmutable(self):
+        self.assertRegex(self.css, r'^/static/css/home\.[0-9a-f]{12}\.css$')
+        respuesta = self.client.get(self.css, headers={'accept-encoding': 'gzip, deflate'})
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(respuesta['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertEqual(int(respuesta['Content-Length']), len(respuesta.content))
+
+        original = self.client.get(self.css)
+        self.assertFalse(original.has_header('Content-Encoding'))
+        self.assertGreater(len(original.content), len(respuesta.content))
+        self.assertEqual(
+            self.client.get(self.css, headers={'if-none-match': original['ETag']}).status_code, 304
+        )
+
+    def test_carga_en_caliente_solo_trae_el_html(self):
+        self.client.force_login(self.usuario)
+        medida = medir_carga(self.client, reverse('dashboard'))
+        locales = [r for r in medida['recursos'] if not r['externo']]
+        self.assertIn(self.css, [r['url'] for r in locales])
+        self.assertTrue(all(r['estado'] == 200 and r['codificacion'] for r in locales))
+        self.assertGreater(medida['frio'], medida['html'])
+        self.assertEqual(medida['caliente'], medida['html'])
+
+
+@override_settings(
+    DATABASE_REPLICA=None,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    LOGIN_INTENTOS=3,
+)
+class AutenticacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=2, movimientos=1, pedidos=1, lineas_pedido=1, semilla=1)
+        cls.usuario.set_password('clave-correcta')
+        cls.usuario.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def _consultas(self, panel='ingreso'):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('dashboard'), {'panel': panel})
+        return len(consultas)
+
+    def test_usuario_de_la_sesion_cacheado(self):
+        self.client.force_login(self.usuario)
+        self._consultas()
+        cacheado = self._consultas()
+        cache.delete(clave_usuario(self.usuario.pk))
+        self.assertEqual(self._consultas(), cacheado + 1)
+
+        # Guardar el usuario lo saca del cache: el cambio de rol se ve en el request siguiente
+        self.usuario.role = 'trabajador'
+        self.usuario.save(update_fields=['role'])
+        respuesta = self.client.get(reverse('dashboard'), {'panel': 'centro'})
+        self.assertEqual(respuesta.context['active_panel'], 'dashboard')
+
+    def _login(self, username, password):
+        return self.client.post(reverse('login'), {'username': username, 'password': password})
+
+    def test_login_bloqueado_tras_fallos(self):
+        for _ in range(3):
+            self.assertEqual(self._login(self.usuario.username, 'mala').status_code, 200)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self._login(self.usuario.username, 'clave-correcta')
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertEqual(len(consultas), 0)
+        # Otro usuario desde la misma IP sigue pudiendo entrar
+        otro = User.objects.create_user('otro', password='otra-clave', empresa=self.empresa)
+        self.assertRedirects(self._login(otro.username, 'otra-clave'), reverse('dashboard'), fetch_redirect_response=False)
+
+    def test_login_correcto_limpia_los_fallos(self):
+        for _ in range(2):
+            self._login(self.usuario.username, 'mala')
+        self.assertEqual(self._login(self.usuario.username, 'clave-correcta').status_code, 302)
+        self.client.logout()
+        for _ in range(2):
+            self._login(self.usuario.username, 'mala')
+        self.assertEqual(self._login(self.usuario.username, 'clave-correcta').status_code, 302)
+
+
+@override_settings(DATABASE_REPLICA=None)
+class BusquedaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=3, movimientos=1, pedidos=1, lineas_pedido=1, semilla=1)
+        cls.otra, _ = benchmark.sembrar(productos=0, movimientos=0, pedidos=0, lineas_pedido=1, semilla=2)
+        with usar_empresa(cls.empresa.pk):
+            cls.salmon = Producto.objects.create(
+                nombre='Salmón ahumado', descripcion='Filete', unidad='kg', precio_unitario=1, precio_venta=2
+            )
+            cls.jurel = Producto.objects.create(
+                nombre='Jurel', descripcion='Sirve de carnada para salmones', unidad='kg', precio_unitario=1, precio_venta=2
+            )
+            cls.proveedor = Proveedor.objects.create(
+                nombre='Pesquera del Sur', contacto='Ana Salmonte', email='a@sur.cl', telefono='+56 9 1234 5678'
+            )
+        with usar_empresa(cls.otra.pk):
+            Producto.objects.create(nombre='Salmón fresco', descripcion='', unidad='kg', precio_unitario=1, precio_venta=2)
+
+    def _buscar(self, consulta, **kwargs):
+        with usar_empresa(self.empresa.pk):
+            resultado = busqueda.buscar(consulta, **kwargs)
+        return {tipo: [fila[0] if isinstance(fila, tuple) else fila for fila in filas] for tipo, filas in resultado.items()}
+
+    def test_prefijo_sin_tildes_y_solo_de_la_empresa(self):
+        resultado = self._buscar('salmon')
+        self.assertEqual(resultado['productos'], [self.salmon, self.jurel])
+        self.assertEqual(resultado['proveedores'], [self.proveedor])
+        self.assertEqual(self._buscar('salmon ahum')['productos'], [self.salmon])
+        self.assertEqual(self._buscar('  ')['productos'], [])
+
+    def test_termino_comun_ordena_todas_las_coincidencias(self):
+        # Más coincidencias que cualquier corte previo; la más relevante es la última en el índice
+        Producto.todas_las_empresas.bulk_create([
+            Producto(empresa=self.empresa, nombre=f'Merluza {i}', descripcion='Pescado blanco de temporada congelado',
+                     unidad='kg', precio_unitario=1, precio_venta=2)
+            for i in range(2500)
+        ])
+        merluza = Producto.todas_las_empresas.create(
+            empresa=self.empresa, nombre='Merluza', descripcion='Merluza', unidad='kg', precio_unitario=1, precio_venta=2
+        )
+        self.assertEqual(self._buscar('merluza', limite=1)['productos'], [merluza])
+
+    def test_indice_sigue_los_cambios(self):
+        Producto.todas_las_empresas.filter(pk=self.jurel.pk).update(nombre='Jurel entero', descripcion='')
+        Producto.todas_las_empresas.bulk_create([
+            Producto(empresa=self.empresa, nombre='Congrio', descripcion='', unidad='kg', precio_unitario=1, precio_venta=2)
+        ])
+        self.salmon.delete()
+        self.assertEqual(self._buscar('salmon')['productos'], [])
+        self.assertEqual([p.nombre for p in self._buscar('congrio')['productos']], ['Congrio'])
+
+    def test_vista_por_rol_y_pedido_por_numero(self):
+        pedido = Pedido.todas_las_empresas.filter(empresa=self.empresa).first()
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            datos = self.client.get(reverse('buscar'), {'q': 'salmon'}).json()
+        self.assertEqual([p['id'] for p in datos['productos']], [self.salmon.pk, self.jurel.pk])
+        self.assertIn(f'edit_producto={self.salmon.pk}', datos['productos'][0]['url'])
+        self.assertLessEqual(len(consultas), 8)
+        datos = self.client.get(reverse('buscar'), {'q': f'#{pedido.pk}'}).json()
+        self.assertEqual([p['id'] for p in datos['pedidos']], [pedido.pk])
+
+        self.usuario.role = 'trabajador'
+        self.usuario.save(update_fields=['role'])
+        datos = self.client.get(reverse('buscar'), {'q': 'salmon'}).json()
+        self.assertEqual(datos['proveedores'], [])
+        self.assertNotIn('edit_producto', datos['productos'][0]['url'])
+
+
+@override_settings(DATABASE_REPLICA=None)
+class EmpresasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=2, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.otra, _ = benchmark.sembrar(productos=3, movimientos=0, pedidos=0, lineas_pedido=1, semilla=2)
+        cls.superusuario = User.objects.create_superuser('raiz', password='x')
+
+    def test_sin_empresa_activa_no_hay_filas(self):
+        self.assertEqual(Producto.objects.count(), 0)
+        self.assertEqual(self.empresa.productos.count(), 0)
+        with usar_empresa(self.empresa.pk):
+            self.assertEqual(Producto.objects.count(), 2)
+            self.assertEqual(Inventario.objects.count(), 2)
+        with usar_todas_las_empresas():
+            self.assertEqual(Producto.objects.count(), 5)
+            with usar_empresa(self.otra.pk):
+                self.assertEqual(Producto.objects.count(), 3)
+
+    def test_token_y_sesion_sin_empresa_no_ven_otras(self):
+        token = TokenAPI.objects.create(user=self.superusuario, nombre='raiz')
+        datos = self.client.get(reverse('api_inventario'), headers={'Authorization': f'Token {token.key}'}).json()
+        self.assertEqual(datos['results'], [])
+        self.client.force_login(self.superusuario)
+        self.assertEqual(self.client.get(reverse('buscar'), {'q': 'bench'}).json()['productos'], [])
+        # El admin es el único lugar donde el superusuario sin empresa ve todas
+        respuesta = self.client.get(reverse('admin:inventory_producto_changelist'))
+        self.assertEqual(respuesta.context['cl'].result_count, 5)
+
+    def test_una_bodega_principal_por_empresa(self):
+        principal = Bodega.principal(self.empresa.pk)
+        self.assertEqual(Bodega.principal(self.empresa.pk), principal)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Bodega.todas_las_empresas.create(empresa=self.empresa, nombre='Otra', es_principal=True)
+        Bodega.todas_las_empresas.create(empresa=self.empresa, nombre='Secundaria')
+
+
+@override_settings(DATABASE_REPLICA=None)
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=5, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        benchmark.sembrar(productos=2, movimientos=0, pedidos=0, lineas_pedido=1, semilla=2)
+        cls.token = TokenAPI.objects.create(user=cls.usuario, nombre='api')
+        cls.producto = Producto.todas_las_empresas.filter(empresa=cls.empresa).order_by('id').first()
+
+    def _get(self, url, datos=None, **cabeceras):
+        return self.client.get(url, datos, headers={'Authorization': f'Token {self.token.key}', **cabeceras})
+
+    def _movimiento(self, **cambios):
+        datos = {'producto': self.producto.pk, 'tipo': 'egreso', 'cantidad': 1, **cambios}
+        return self.client.post(reverse('api_movimientos'), datos, content_type='application/json',
+                                headers={'Authorization': f'Token {self.token.key}'})
+
+    def test_token_requerido(self):
+        url = reverse('api_inventario')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.assertEqual(self.client.get(url, headers={'Authorization': 'Token nada'}).status_code, 401)
+        self.assertEqual(self._get(url).status_code, 200)
+        User.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        self.assertEqual(self._get(url).status_code, 401)
+
+    def test_cursor_campos_y_etag(self):
+        url = reverse('api_inventario')
+        vistos, cursor = [], None
+        while True:
+            datos = self._get(url, {'limite': 2, 'fields': 'producto_id,disponible', **({'cursor': cursor} if cursor else {})}).json()
+            self.assertTrue(all(set(fila) == {'producto_id', 'disponible'} for fila in datos['results']))
+            vistos += [fila['producto_id'] for fila in datos['results']]
+            cursor = datos['next']
+            if cursor is None:
+                break
+        productos = Producto.todas_las_empresas.filter(empresa=self.empresa).order_by('id')
+        self.assertEqual(vistos, list(productos.values_list('id', flat=True)))
+        self.assertEqual(self._get(url, {'fields': 'producto_id,clave'}).status_code, 400)
+        self.assertEqual(self._get(url, {'cursor': '!!'}).status_code, 400)
+        self.assertEqual(self._get(url, {'cursor': api.codificar_cursor(10 ** 20)}).status_code, 400)
+        for invalido in ('abc', '-1', '1.5', str(10 ** 20)):
+            with self.subTest(producto_id=invalido):
+                self.assertEqual(self._get(url, {'producto_id': invalido}).status_code, 400)
+        filtrado = self._get(url, {'producto_id': self.producto.pk}).json()['results']
+        self.assertEqual([fila['producto_id'] for fila in filtrado], [self.producto.pk])
+
+        primera = self._get(url)
+        cacheada = self._get(url, **{'If-None-Match': primera['ETag']})
+        self.assertEqual((cacheada.status_code, cacheada.content), (304, b''))
+        self._movimiento()
+        self.assertEqual(self._get(url, **{'If-None-Match': primera['ETag']}).status_code, 200)
+
+    def test_datos_invalidos_400_y_falta_de_stock_409(self):
+        self.assertEqual(self._movimiento(tipo='regalo').status_code, 400)
+        self.assertEqual(self._movimiento(cantidad='mucho').status_code, 400)
+        self.assertEqual(self._movimiento(cantidad=-3).status_code, 400)
+        self.assertEqual(self._movimiento(bodega=999999).status_code, 400)
+        inventario = Inventario.todas_las_empresas.get(producto=self.producto)
+        respuesta = self._movimiento(cantidad=inventario.cantidad - inventario.stock_reservado + 1)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertIn('Stock disponible', respuesta.json()['message'])
+        self.assertEqual(self._movimiento().status_code, 201)
+
+
+@override_settings(DATABASE_REPLICA=None)
+class IdempotenciaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=1, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.token = TokenAPI.objects.create(user=cls.usuario, nombre='idempotencia')
+        cls.inventario = Inventario.todas_las_empresas.get(empresa=cls.empresa)
+
+    def _ingreso(self, clave, cantidad):
+        return self.client.post(
+            reverse('api_movimientos'), {'producto': self.inventario.producto_id, 'tipo': 'ingreso', 'cantidad': cantidad},
+            content_type='application/json',
+            headers={'Authorization': f'Token {self.token.key}', 'Idempotency-Key': clave},
+        )
+
+    def _cantidad(self):
+        return Inventario.todas_las_empresas.get(pk=self.inventario.pk).cantidad
+
+    def test_reintento_reproduce_y_otro_cuerpo_se_rechaza(self):
+        inicial = self._cantidad()
+        primera = self._ingreso('k1', 5)
+        self.assertEqual(primera.status_code, 201)
+        reintento = self._ingreso('k1', 5)
+        self.assertEqual((reintento.status_code, reintento['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(reintento.json(), primera.json())
+        self.assertEqual(self._ingreso('k1', 7).status_code, 422)
+        self.assertEqual(self._cantidad(), inicial + 5)
+
+    def _post(self, clave):
+        request = RequestFactory().post('/x/', {'idempotency_key': clave})
+        request.user = self.usuario
+        return request
+
+    def test_peticion_en_curso_y_falla_a_mitad(self):
+        respuestas = []
+
+        @idempotente
+        def vista(request):
+            # La misma clave llega mientras esta petición sigue en su transacción
+            respuestas.append(vista(self._post('k2')).status_code)
+            if len(respuestas) == 1:
+                raise RuntimeError('el proceso muere a mitad')
+            return HttpResponse('{"ok": true}', content_type='application/json')
+
+        with self.assertRaises(RuntimeError):
+            vista(self._post('k2'))
+        self.assertEqual(respuestas, [409])
+        # La falla deshizo la reserva: un reintento no recibe 409 hasta que venza el TTL
+        self.assertFalse(ClaveIdempotencia.objects.filter(clave='k2').exists())
+        self.assertEqual(vista(self._post('k2')).status_code, 200)
+        self.assertEqual(vista(self._post('k2'))['Idempotent-Replayed'], 'true')
+        self.assertEqual(respuestas, [409, 409])
+
+    def test_dashboard_guarda_solo_la_redireccion(self):
+        self.client.force_login(self.usuario)
+        datos = {'form_type': 'ingreso', 'ingreso-producto': self.inventario.producto_id, 'ingreso-cantidad': 3,
+                 'idempotency_key': 'k3'}
+        self.assertEqual(self.client.post(reverse('dashboard'), datos).status_code, 302)
+        registro = ClaveIdempotencia.objects.get(clave='k3')
+        self.assertEqual((registro.status, registro.cuerpo), (302, ''))
+        self.assertTrue(registro.location)
+        self.assertEqual(self.client.post(reverse('dashboard'), datos)['Idempotent-Replayed'], 'true')
+
+        # Un formulario con errores se renderiza y no se guarda: se puede corregir y reenviar
+        datos.update({'ingreso-cantidad': 0, 'idempotency_key': 'k4'})
+        self.assertEqual(self.client.post(reverse('dashboard'), datos).status_code, 200)
+        self.assertFalse(ClaveIdempotencia.objects.filter(clave='k4').exists())
+
+
+@override_settings(DATABASE_REPLICA=None)
+class EscaneoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=2, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.otra, _ = benchmark.sembrar(productos=0, movimientos=0, pedidos=0, lineas_pedido=1, semilla=2)
+        cls.token = TokenAPI.objects.create(user=cls.usuario, nombre='escáner')
+        with usar_empresa(cls.empresa.pk):
+            cls.producto = Producto.objects.create(
+                nombre='Atún', descripcion='', unidad='lata', precio_unitario=1, precio_venta=2,
+                sku='ATU-01', codigo_barras='0780000000017',
+            )
+        with usar_empresa(cls.otra.pk):
+            Producto.objects.create(nombre='Atún', descripcion='', unidad='lata', precio_unitario=1, precio_venta=2,
+                                    codigo_barras='0780000000024')
+
+    def setUp(self):
+        codigos.limpiar()
+
+    def _resolver(self, codigo):
+        with usar_empresa(self.empresa.pk):
+            return codigos.resolver(codigo)
+
+    def test_resuelve_por_barras_o_sku_con_cache(self):
+        self.assertEqual(self._resolver(' 0780000000017\n'), self.producto)
+        self.assertEqual(self._resolver('ATU-01'), self.producto)
+        self.assertIsNone(self._resolver('0780000000024'))  # de otra empresa
+        with CaptureQueriesContext(connection) as consultas:
+            self._resolver('ATU-01')
+        self.assertNotIn(' OR ', consultas[0]['sql'])
+
+        # Guardar el producto con otro código lo saca del cache
+        self.producto.sku = 'ATU-02'
+        self.producto.save()
+        self.assertIsNone(self._resolver('ATU-01'))
+        # Un update() no dispara señales (o lo hizo otro proceso): el código se compara al leer
+        self._resolver('ATU-02')
+        Producto.todas_las_empresas.filter(pk=self.producto.pk).update(sku='ATU-03')
+        self.assertIsNone(self._resolver('ATU-02'))
+
+    def test_api_escaneo(self):
+        cabecera = {'Authorization': f'Token {self.token.key}'}
+        url = reverse('api_escaneo')
+        datos = self.client.post(url, {'codigo': '0780000000017', 'tipo': 'ingreso', 'cantidad': 5},
+                                 content_type='application/json', headers=cabecera)
+        self.assertEqual(datos.status_code, 201)
+        self.assertEqual(datos.json()['inventario'][0]['cantidad'], 5)
+        datos = self.client.get(url, {'codigo': 'ATU-01'}, headers=cabecera).json()
+        self.assertEqual((datos['producto_id'], datos['disponible']), (self.producto.pk, 5))
+
+        egreso = self.client.post(url, {'codigo': 'ATU-01', 'tipo': 'egreso', 'cantidad': 6},
+                                  content_type='application/json', headers=cabecera)
+        self.assertEqual(egreso.status_code, 409)
+        self.assertEqual(self.client.get(url, {'codigo': '0780000000024'}, headers=cabecera).status_code, 404)
+
+    def test_formulario_de_egreso_por_codigo(self):
+        with usar_empresa(self.empresa.pk):
+            ledger.registrar_movimiento(self.producto, 'ingreso', 4)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.post(reverse('dashboard'), {
+            'form_type': 'egreso', 'egreso-codigo': 'ATU-01', 'egreso-cantidad': 3,
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(Inventario.todas_las_empresas.get(producto=self.producto).cantidad, 1)
+        respuesta = self.client.post(reverse('dashboard'), {
+            'form_type': 'egreso', 'egreso-codigo': 'NO-EXISTE', 'egreso-cantidad': 1,
+        })
+        self.assertIn('No hay un producto con este código.', respuesta.context['stock_exit_form'].errors['codigo'])
+
+        with usar_empresa(self.empresa.pk):
+            form = ProductoForm({'nombre': 'Jurel', 'sku': 'ATU-01', 'codigo_barras': '', 'descripcion': 'x',
+                                 'unidad': 'lata', 'precio_unitario': '1', 'precio_venta': '2'})
+            self.assertEqual(list(form.errors), ['sku'])
+
+
+@override_settings(DATABASE_REPLICA=None)
+class LineasPedidoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=40, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.token = TokenAPI.objects.create(user=cls.usuario, nombre='integración')
+        cls.productos = list(Producto.todas_las_empresas.filter(empresa=cls.empresa).order_by('id'))
+        Producto.todas_las_empresas.filter(pk=cls.productos[0].pk).update(codigo_barras='7800000000001')
+        with usar_empresa(cls.empresa.pk):
+            cls.pedido = Pedido.objects.create(proveedor=Proveedor.objects.get())
+
+    def _reservado(self, producto):
+        inventario = Inventario.todas_las_empresas.get(producto=producto)
+        stock = StockBodega.todas_las_empresas.get(inventario=inventario)
+        self.assertEqual(inventario.stock_reservado, stock.stock_reservado)
+        return inventario.stock_reservado
+
+    def _importar(self, cuerpo, content_type='text/csv', reemplazar=False):
+        url = reverse('api_pedido_lineas', args=[self.pedido.pk]) + ('?reemplazar=1' if reemplazar else '')
+        return self.client.post(url, cuerpo, content_type=content_type,
+                                headers={'Authorization': f'Token {self.token.key}'})
+
+    def test_importar_csv_con_consultas_constantes(self):
+        csv_corto = 'codigo;cantidad\n7800000000001;2\n7800000000001;3\n'
+        with CaptureQueriesContext(connection) as corto:
+            self.assertEqual(self._importar(csv_corto).status_code, 201)
+        csv_largo = 'producto,cantidad\n' + ''.join(f'{p.pk},1\n' for p in self.productos[1:]) * 5
+        with CaptureQueriesContext(connection) as largo:
+            self.assertEqual(self._importar(csv_largo).status_code, 201)
+        self.assertEqual(len(corto), len(largo))
+        self.assertEqual(self._reservado(self.productos[0]), 5)
+        self.assertEqual(self._reservado(self.productos[1]), 5)
+        self.assertEqual(self.pedido.items.count(), 40)
+
+    def test_errores_de_todas_las_lineas_y_stock_insuficiente(self):
+        datos = self._importar('producto,cantidad\n999999,1\n,2\n1,0\n').json()
+        self.assertIn('Línea 1', datos['message'])
+        self.assertIn('Línea 3', datos['message'])
+        respuesta = self._importar({'lineas': [{'producto': self.productos[2].pk, 'cantidad': 10 ** 9}]},
+                                   content_type='application/json')
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(self._reservado(self.productos[2]), 0)
+        self.assertFalse(self.pedido.items.exists())
+
+    def test_reemplazar_ajusta_solo_la_diferencia(self):
+        self._importar(f'producto,cantidad\n{self.productos[0].pk},4\n{self.productos[1].pk},2\n')
+        respuesta = self._importar(f'producto,cantidad\n{self.productos[0].pk},1\n', reemplazar=True)
+        self.assertEqual([i['cantidad'] for i in respuesta.json()['items']], [1])
+        self.assertEqual((self._reservado(self.productos[0]), self._reservado(self.productos[1])), (1, 0))
+
+    def test_clonar_y_exportar(self):
+        with usar_empresa(self.empresa.pk):
+            lineas_pedido.agregar_lineas(self.pedido, {self.productos[0]: 3, self.productos[1]: 2})
+        self.client.force_login(self.usuario)
+        self.client.post(reverse('dashboard'), {'form_type': 'clonar_pedido', 'pk': self.pedido.pk})
+        copia = Pedido.todas_las_empresas.exclude(pk=self.pedido.pk).get(empresa=self.empresa)
+        self.assertEqual(
+            sorted(copia.items.values_list('producto_id', 'cantidad')),
+            sorted(self.pedido.items.values_list('producto_id', 'cantidad')),
+        )
+        self.assertEqual(self._reservado(self.productos[0]), 6)
+
+        exportado = self.client.get(reverse('exportar_lineas_pedido', args=[copia.pk])).content.decode()
+        self.assertTrue(exportado.startswith('producto,codigo,nombre,cantidad'))
+        self.assertIn('7800000000001', exportado)
+        with usar_empresa(self.empresa.pk):
+            self.assertEqual(
+                lineas_pedido.resolver_lineas(lineas_pedido.leer_lineas(exportado, 'csv')),
+                {self.productos[0]: 3, self.productos[1]: 2},
+            )
+
+
+@override_settings(DATABASE_REPLICA=None)
+class LedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, _ = benchmark.sembrar(productos=0, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.hoy = timezone.localdate()
+        with usar_empresa(cls.empresa.pk):
+            cls.producto = Producto.objects.create(nombre='Locos', descripcion='', unidad='kg',
+                                                   precio_unitario=1, precio_venta=2)
+            cls.inventario, _ = ledger.registrar_movimiento(cls.producto, 'ingreso', 1)
+        Transaction.todas_las_empresas.all().delete()
+        Inventario.todas_las_empresas.filter(pk=cls.inventario.pk).update(cantidad=11)
+        # Historial: +10 hace 3 días, -4 hace 2, +5 ayer (a mediodía)
+        with fecha_manual(Transaction):
+            Transaction.todas_las_empresas.bulk_create([
+                Transaction(inventario=cls.inventario, empresa=cls.empresa, tipo=tipo, cantidad=cantidad,
+                            fecha=cls._mediodia(dias))
+                for tipo, cantidad, dias in (('ingreso', 10, 3), ('egreso', 4, 2), ('ingreso', 5, 1))
+            ])
+
+    @classmethod
+    def _mediodia(cls, dias):
+        return ledger.inicio_del_dia(cls.hoy - timedelta(days=dias)) + timedelta(hours=12)
+
+    def test_saldos_y_stock_en_un_momento(self):
+        with usar_empresa(self.empresa.pk):
+            self.assertEqual(ledger.saldos(), {self.inventario.pk: 11})
+            self.assertEqual(ledger.stock_en(self.inventario, self._mediodia(3) - timedelta(seconds=1)), 0)
+            self.assertEqual(ledger.stock_en(self.inventario, self._mediodia(3)), 10)
+            self.assertEqual(ledger.stock_en(self.inventario, self._mediodia(2)), 6)
+            self.assertEqual(ledger.conciliar(), [])
+
+    def test_snapshot_acota_el_historial_y_conciliar_lo_detecta(self):
+        with usar_empresa(self.empresa.pk):
+            self.assertEqual(ledger.tomar_snapshot(self.hoy - timedelta(days=2)), 1)
+            snapshot = SnapshotStock.objects.get()
+            self.assertEqual(snapshot.cantidad, 6)
+            # Solo se suma lo posterior al snapshot: un snapshot alterado se nota en el saldo
+            SnapshotStock.objects.filter(pk=snapshot.pk).update(cantidad=100)
+            self.assertEqual(ledger.saldos(), {self.inventario.pk: 105})
+            self.assertEqual(ledger.stock_en(self.inventario, self._mediodia(3)), 10)
+            self.assertEqual([(inv.pk, esperado) for inv, esperado in ledger.conciliar()], [(self.inventario.pk, 105)])
+            SnapshotStock.objects.all().delete()
+            self.assertEqual(ledger.conciliar(), [])
+
+    def test_movimientos_de_solo_insercion(self):
+        movimiento = Transaction.todas_las_empresas.first()
+        movimiento.cantidad = 1
+        with self.assertRaises(ValidationError):
+            movimiento.save()
+        self.client.force_login(User.objects.create_superuser('raiz', password='x'))
+        url = reverse('admin:inventory_transaction_change', args=[movimiento.pk])
+        self.assertEqual(self.client.post(url, {'cantidad': 1}).status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertNotEqual(Transaction.todas_las_empresas.get(pk=movimiento.pk).cantidad, 1)
+
+
+@override_settings(DATABASE_REPLICA=None)
+class PronosticoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, _ = benchmark.sembrar(productos=0, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.hoy = timezone.localdate()
+        with usar_empresa(cls.empresa.pk):
+            cls.inventarios = [
+                ledger.registrar_movimiento(Producto.objects.create(
+                    nombre=nombre, descripcion='', unidad='kg', precio_unitario=1, precio_venta=2
+                ), 'ingreso', 1000)[0]
+                for nombre in ('Jurel', 'Merluza')
+            ]
+
+    def _egresos(self, *movimientos):
+        with fecha_manual(Transaction):
+            Transaction.todas_las_empresas.bulk_create([
+                Transaction(inventario=self.inventarios[pos], empresa=self.empresa, tipo='egreso', cantidad=cantidad,
+                            fecha=ledger.inicio_del_dia(self.hoy - timedelta(days=dias)) + timedelta(hours=12))
+                for pos, cantidad, dias in movimientos
+            ])
+
+    def _niveles(self):
+        return dict(PronosticoDemanda.objects.values_list('inventario_id', 'suavizado_exponencial'))
+
+    def test_refresco_incremental_igual_a_recalculo_completo(self):
+        self._egresos((0, 8, 12), (1, 3, 10), (0, 5, 7))
+        with usar_empresa(self.empresa.pk):
+            forecasting.actualizar_pronosticos(hoy=self.hoy - timedelta(days=5))
+            # Días nuevos (ids mayores) después del primer refresco
+            self._egresos((0, 4, 4), (1, 9, 2), (0, 6, 1))
+            resumen = forecasting.actualizar_pronosticos(hoy=self.hoy)
+            self.assertEqual((resumen['dias'], resumen['filas_agregadas']), (5, 3))
+            incremental = self._niveles()
+
+            PronosticoDemanda.objects.all().delete()
+            forecasting.actualizar_pronosticos(hoy=self.hoy)
+            completo = self._niveles()
+        self.assertEqual(incremental.keys(), completo.keys())
+        for inv_id, nivel in completo.items():
+            self.assertGreater(nivel, 0)
+            self.assertAlmostEqual(incremental[inv_id], nivel)
+
+    def test_ajuste_de_conciliacion_no_cambia_el_pronostico(self):
+        self._egresos((0, 8, 6), (1, 3, 3), (0, 5, 2))
+        # Historial: 987 y 997. Inventario descuadrado en -40 y +6
+        Inventario.todas_las_empresas.filter(pk=self.inventarios[0].pk).update(cantidad=947)
+        Inventario.todas_las_empresas.filter(pk=self.inventarios[1].pk).update(cantidad=1003)
+        with usar_empresa(self.empresa.pk):
+            forecasting.actualizar_pronosticos(hoy=self.hoy)
+            antes = self._niveles()
+        call_command('conciliar_inventario', '--ajustar', stdout=StringIO())
+        with usar_empresa(self.empresa.pk):
+            self.assertEqual(ledger.conciliar(), [])
+            ajustes = Transaction.objects.filter(descripcion='Ajuste de conciliación')
+            self.assertEqual(
+                sorted(ajustes.values_list('tipo', 'cantidad', 'bodega')),
+                [('ajuste_entrada', 6, Bodega.principal(self.empresa.pk).pk),
+                 ('ajuste_salida', 40, Bodega.principal(self.empresa.pk).pk)],
+            )
+            self.assertFalse(Transaction.objects.filter(tipo='egreso', cantidad=40).exists())
+            # Los ajustes quedan con fecha de hoy: se leen en el refresco de mañana
+            forecasting.actualizar_pronosticos(hoy=self.hoy + timedelta(days=1))
+            despues = self._niveles()
+            PronosticoDemanda.objects.all().delete()
+            forecasting.actualizar_pronosticos(hoy=self.hoy + timedelta(days=1))
+            completo = self._niveles()
+        for inv_id, nivel in antes.items():
+            # Sin demanda nueva el nivel solo decae un día
+            self.assertAlmostEqual(despues[inv_id], nivel * (1 - forecasting.ALFA))
+            self.assertAlmostEqual(completo[inv_id], despues[inv_id])
+
+    def test_matriz_diaria_sin_inventarios(self):
+        matriz = forecasting._matriz_diaria(
+            [(self.inventarios[0].pk, self.hoy, 5)], np.array([], dtype=np.int64), self.hoy, 3
+        )
+        self.assertEqual(matriz.shape, (0, 3))
+
+
+@override_settings(DATABASE_REPLICA=None)
+class ArchivoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, _ = benchmark.sembrar(productos=0, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.hoy = timezone.localdate()
+        with usar_empresa(cls.empresa.pk):
+            cls.producto = Producto.objects.create(nombre='Reineta', descripcion='', unidad='kg',
+                                                   precio_unitario=3, precio_venta=5)
+            cls.inventario, _ = ledger.registrar_movimiento(cls.producto, 'ingreso', 1)
+        Transaction.todas_las_empresas.all().delete()
+        Inventario.todas_las_empresas.filter(pk=cls.inventario.pk).update(cantidad=24)
+        # +20 hace 100 días y -4 hace 50 se archivan; +8 hace 10 días se queda
+        with fecha_manual(Transaction):
+            Transaction.todas_las_empresas.bulk_create([
+                Transaction(inventario=cls.inventario, empresa=cls.empresa, tipo=tipo, cantidad=cantidad,
+                            fecha=ledger.inicio_del_dia(cls.hoy - timedelta(days=dias)) + timedelta(hours=12))
+                for tipo, cantidad, dias in (('ingreso', 20, 100), ('egreso', 4, 50), ('ingreso', 8, 10))
+            ])
+
+    def _estado(self):
+        hace_60 = ledger.inicio_del_dia(self.hoy - timedelta(days=60))
+        return (
+            list(archive.movimientos()),
+            list(archive.movimientos(tipo='egreso')),
+            ledger.saldos(),
+            ledger.stock_en(self.inventario, hace_60),
+        )
+
+    def test_archivar_conserva_movimientos_y_saldos(self):
+        with usar_empresa(self.empresa.pk):
+            antes = self._estado()
+            self.assertEqual(archive.egresos_archivados(), (0, 0))
+            self.assertEqual(archive.archivar(dias=30, hoy=self.hoy), 2)
+            self.assertEqual(Transaction.objects.count(), 1)
+            self.assertEqual(self._estado(), antes)
+            self.assertEqual(antes[2], {self.inventario.pk: 24})
+            self.assertEqual(antes[3], 20)
+            self.assertEqual(SnapshotStock.objects.get().cantidad, 16)
+            self.assertEqual(ledger.conciliar(), [])
+            self.assertEqual(archive.egresos_archivados(), (20, 12))
+
+    def test_horizonte_minimo(self):
+        with usar_empresa(self.empresa.pk), self.assertRaises(ValueError):
+            archive.archivar(dias=archive.HORIZONTE_MINIMO - 1)
+
+
+@override_settings(DATABASE_REPLICA=None)
+class BodegasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, _ = benchmark.sembrar(productos=1, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.producto = Producto.todas_las_empresas.get(empresa=cls.empresa)
+        cls.inventario = Inventario.todas_las_empresas.get(producto=cls.producto)
+        cls.principal = Bodega.principal(cls.empresa.pk)
+        cls.norte = Bodega.todas_las_empresas.create(empresa=cls.empresa, nombre='Norte')
+
+    def _stock(self, bodega):
+        return StockBodega.todas_las_empresas.filter(inventario=self.inventario, bodega=bodega).values_list(
+            'cantidad', 'stock_reservado').first()
+
+    def test_traslado_y_reserva_por_bodega(self):
+        total = self.inventario.cantidad
+        with usar_empresa(self.empresa.pk):
+            salida, entrada = ledger.trasladar(self.producto, None, self.norte.pk, 30)
+            self.assertEqual((salida.bodega, entrada.bodega), (self.principal, self.norte))
+            with self.assertRaisesMessage(ValidationError, 'Stock disponible: 30'):
+                ledger.trasladar(self.producto, self.norte, self.principal, 31)
+            pedido = Pedido.objects.create(proveedor=Proveedor.objects.get(), bodega=self.norte)
+            lineas_pedido.agregar_lineas(pedido, {self.producto: 20})
+            with self.assertRaisesMessage(ValidationError, 'Stock disponible: 10'):
+                ledger.registrar_movimiento(self.producto, 'egreso', 11, bodega=self.norte)
+            por_bodega = {fila['bodega_id']: fila['disponible'] for fila in ledger.kpis_por_bodega()}
+        self.assertEqual(self._stock(self.norte), (30, 20))
+        self.assertEqual(self._stock(self.principal), (total - 30, 0))
+        self.assertEqual(por_bodega, {self.principal.pk: total - 30, self.norte.pk: 10})
+        inventario = Inventario.todas_las_empresas.get(pk=self.inventario.pk)
+        self.assertEqual((inventario.cantidad, inventario.stock_reservado), (total, 20))
+
+    def test_ajustar_stock_sin_fila_en_la_bodega(self):
+        sur = Bodega.todas_las_empresas.create(empresa=self.empresa, nombre='Sur')
+        with self.assertRaises(ValidationError):
+            ajustar_stock(self.producto.pk, sur.pk, reservado=-5)
+        self.assertIsNone(self._stock(sur))
+        self.assertEqual(Inventario.todas_las_empresas.get(pk=self.inventario.pk).stock_reservado, 0)
+        ajustar_stock(self.producto.pk, sur.pk, reservado=5)
+        self.assertEqual(self._stock(sur), (0, 5))
+
+
+@override_settings(DATABASE_REPLICA=None)
+class LotesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=3, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.productos = list(Producto.todas_las_empresas.filter(empresa=cls.empresa).order_by('id'))
+        cls.hoy = timezone.localdate()
+
+    def _lotes(self, producto):
+        return dict(Lote.todas_las_empresas.filter(inventario__producto=producto).values_list('codigo', 'cantidad'))
+
+    def test_fefo_no_despacha_lotes_vencidos(self):
+        with usar_empresa(self.empresa.pk):
+            producto = Producto.objects.create(nombre='Choritos', descripcion='', unidad='kg',
+                                               precio_unitario=1, precio_venta=2)
+            ledger.registrar_movimiento(producto, 'ingreso', 5, lote='VIEJO', vencimiento=self.hoy - timedelta(days=1))
+            ledger.registrar_movimiento(producto, 'ingreso', 3, lote='NUEVO', vencimiento=self.hoy + timedelta(days=9))
+            ledger.registrar_movimiento(producto, 'egreso', 2)
+            self.assertEqual(self._lotes(producto), {'VIEJO': 5, 'NUEVO': 1})
+            # Sin stock sin lote, lo que falta solo estaría en el lote vencido
+            with self.assertRaisesMessage(ValidationError, 'el lote VIEJO venció'):
+                ledger.registrar_movimientos([(producto, 'egreso', 2, None)])
+            ledger.registrar_movimiento(producto, 'ingreso', 1)
+            ledger.registrar_movimientos([(producto, 'egreso', 2, None)])
+        self.assertEqual(self._lotes(producto), {'VIEJO': 5, 'NUEVO': 0})
+        self.assertEqual(Inventario.todas_las_empresas.get(producto=producto).cantidad, 5)
+
+    def test_completar_pedido_pasa_por_el_ledger(self):
+        with usar_empresa(self.empresa.pk):
+            for producto in self.productos:
+                ledger.registrar_movimiento(producto, 'ingreso', 4, lote='L1', vencimiento=self.hoy + timedelta(days=5))
+            pedido = Pedido.objects.create(proveedor=Proveedor.objects.get())
+            lineas_pedido.agregar_lineas(pedido, {producto: 3 for producto in self.productos})
+        antes = Inventario.todas_las_empresas.get(producto=self.productos[0]).cantidad
+
+        # Fuera de un request (admin, comandos): el signal activa la empresa del pedido
+        pedido.estado = 'Completado'
+        with CaptureQueriesContext(connection) as consultas:
+            pedido.save()
+        lecturas_de_lotes = [q for q in consultas if q['sql'].startswith('SELECT') and '"inventory_lote"' in q['sql']]
+        self.assertEqual(len(lecturas_de_lotes), 1)
+
+        inventario = Inventario.todas_las_empresas.get(producto=self.productos[0])
+        self.assertEqual((inventario.cantidad, inventario.stock_reservado), (antes - 3, 0))
+        self.assertEqual(StockBodega.todas_las_empresas.get(inventario=inventario).stock_reservado, 0)
+        self.assertEqual(self._lotes(self.productos[2]), {'L1': 1})
+        egresos = Transaction.todas_las_empresas.filter(descripcion=f'Pedido Completado #{pedido.pk}')
+        self.assertEqual(egresos.count(), 3)
+        self.assertEqual({m.bodega_id for m in egresos}, {pedido.bodega_id})
+
+
+@override_settings(DATABASE_REPLICA=None)
+class EventosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=2, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+
+    def test_bajo_wsgi_no_se_abre_el_stream(self):
+        self.assertEqual(self.client.get(reverse('eventos')).status_code, 401)
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('eventos'))
+        self.assertEqual(respuesta.status_code, 204)
+        self.assertFalse(respuesta.streaming)
+        self.assertNotContains(self.client.get(reverse('dashboard')), 'new EventSource')
+
+    async def test_bajo_asgi_envia_kpis_y_solo_eventos_de_la_empresa(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.usuario)
+        respuesta = await cliente.get(reverse('eventos'))
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        flujo = aiter(respuesta.streaming_content)
+        try:
+            self.assertTrue((await anext(flujo)).startswith(b'event: kpis'))
+            events.broker().publicar('movimiento', {'empresa_id': self.empresa.pk + 1, 'id': 1})
+            events.broker().publicar('movimiento', {'empresa_id': self.empresa.pk, 'id': 2})
+            self.assertIn(b'"id": 2', await anext(flujo))
+        finally:
+            await flujo.aclose()
+
+    async def test_usuario_sin_empresa_no_recibe_eventos(self):
+        cliente = AsyncClient()
+        await cliente.aforce_login(await User.objects.acreate_superuser('raiz', password='x'))
+        self.assertEqual((await cliente.get(reverse('eventos'))).status_code, 403)
+        # El generador tampoco deja pasar eventos de ninguna empresa sin empresa_id
+        flujo = aiter(events.flujo_sse(None))
+        try:
+            await anext(flujo)
+            events.broker().publicar('movimiento', {'empresa_id': self.empresa.pk, 'id': 1})
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(anext(flujo), 0.2)
+        finally:
+            await flujo.aclose()
+
+
+@override_settings(DATABASE_REPLICA=None)
+class PedidoPublicoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=3, movimientos=0, pedidos=1, lineas_pedido=3, semilla=1)
+        cls.pedido = Pedido.todas_las_empresas.get(empresa=cls.empresa)
+        cls.items = list(PedidoItem.objects.filter(pedido=cls.pedido).select_related('producto'))
+
+    async def test_pedido_publico_sin_login(self):
+        cliente = AsyncClient()
+        for ruta in ('pedido_qr_publico', 'pedido_detalle'):
+            with self.subTest(ruta=ruta):
+                respuesta = await cliente.get(reverse(ruta, args=[self.pedido.pk]))
+                self.assertContains(respuesta, f'Pedido #{self.pedido.pk}')
+                for item in self.items:
+                    self.assertContains(respuesta, item.producto.nombre)
+        respuesta = await cliente.get(reverse('generar_qr', args=[self.pedido.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual((await cliente.get(reverse('pedido_detalle', args=[self.pedido.pk + 1000]))).status_code, 404)
+
+    def _consultas(self, cliente, ruta):
+        # Prueba síncrona: la vista async corre con async_to_sync y sus consultas
+        # van al hilo de la conexión del test, donde se pueden contar
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = async_to_sync(cliente.get)(reverse(ruta, args=[self.pedido.pk]))
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, len(consultas)
+
+    def test_vistas_async_con_y_sin_login_y_consultas_fijas(self):
+        anonimo, con_login = AsyncClient(), AsyncClient()
+        con_login.force_login(self.usuario)
+        clientes = (('anonimo', anonimo), ('con_login', con_login))
+        rutas = ('pedido_qr_publico', 'pedido_detalle', 'generar_qr')
+        antes = {}
+        for nombre, cliente in clientes:
+            for ruta in rutas:
+                with self.subTest(cliente=nombre, ruta=ruta):
+                    respuesta, antes[nombre, ruta] = self._consultas(cliente, ruta)
+                    if ruta == 'generar_qr':
+                        self.assertTrue(respuesta.json()['qr_base64'])
+                    else:
+                        self.assertContains(respuesta, self.pedido.proveedor.nombre)
+                        for item in self.items:
+                            self.assertContains(respuesta, item.producto.nombre)
+
+        # Más líneas en el pedido no agregan consultas (sin N+1 en el template)
+        PedidoItem.objects.bulk_create([
+            PedidoItem(pedido=self.pedido, producto=item.producto, cantidad=7) for item in self.items
+        ])
+        for nombre, cliente in clientes:
+            for ruta in rutas:
+                with self.subTest(cliente=nombre, ruta=ruta, lineas=2 * len(self.items)):
+                    self.assertEqual(self._consultas(cliente, ruta)[1], antes[nombre, ruta])
+
+@override_settings(DATABASE_REPLICA=None)
+class SyncTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa, cls.usuario = benchmark.sembrar(productos=0, movimientos=0, pedidos=0, lineas_pedido=1, semilla=1)
+        cls.token = TokenAPI.objects.create(user=cls.usuario, nombre='escáner')
+        with usar_empresa(cls.empresa.pk):
+            cls.producto = Producto.objects.create(
+                nombre='Harina', descripcion='', unidad='kg', precio_unitario=1, precio_venta=2
+            )
+
+    def _sync(self, operaciones):
+        return self.client.post(reverse('api_sync'), {'operaciones': operaciones}, content_type='application/json',
+                                headers={'Authorization': f'Token {self.token.key}'})
+
+    def _op(self, id, fecha, tipo, cantidad):
+        return {'id': id, 'fecha': fecha, 'accion': 'movimiento', 'producto': self.producto.pk,
+                'tipo': tipo, 'cantidad': cantidad}
+
+    def _cantidad(self):
+        return Inventario.todas_las_empresas.get(producto=self.producto).cantidad
+
+    def test_orden_de_fecha_duplicados_y_conflictos(self):
+        # El egreso llega primero en la lista pero ocurrió después; una fecha trae zona y la otra no
+        lote = [
+            self._op('b', '2026-01-01T12:00:00-03:00', 'egreso', 3),
+            self._op('a', '2026-01-01T10:00:00', 'ingreso', 5),
+            self._op('c', '2026-01-01T16:00:00+00:00', 'egreso', 10),
+        ]
+        resultados = {r['id']: r['estado'] for r in self._sync(lote).json()['resultados']}
+        self.assertEqual(resultados, {'a': 'aplicado', 'b': 'aplicado', 'c': 'conflicto'})
+        self.assertEqual(self._cantidad(), 2)
+
+        resultados = {r['id']: r['estado'] for r in self._sync(lote[:2]).json()['resultados']}
+        self.assertEqual(resultados, {'a': 'duplicado', 'b': 'duplicado'})
+        self.assertEqual(self._cantidad(), 2)
+
+    def test_reenvio_despues_de_limpiar_claves_sigue_duplicado(self):
+        lote = [self._op('a', '2026-01-01T10:00:00Z', 'ingreso', 5)]
+        self._sync(lote)
+        otra = ClaveIdempotencia.objects.create(usuario=self.usuario, clave='x', ruta='/api/movimientos/')
+        # El escáner vuelve a tener cobertura dos días después
+        ClaveIdempotencia.objects.update(creado=timezone.now() - timedelta(days=2))
+        call_command('limpiar_idempotencia', stdout=StringIO())
+        self.assertFalse(ClaveIdempotencia.objects.filter(pk=otra.pk).exists())
+        self.assertEqual(self._sync(lote).json()['resultados'], [{'id': 'a', 'estado': 'duplicado'}])
+        self.assertEqual(self._cantidad(), 5)
+
+        ClaveIdempotencia.objects.update(creado=timezone.now() - timedelta(days=idempotency.TTL_OPERACIONES_DIAS + 1))
+        self.assertEqual(idempotency.limpiar(), 1)
+
+    def test_copia_concurrente_del_lote_sale_como_duplicado(self):
+        lote = [self._op('a', '2026-01-01T10:00:00Z', 'ingreso', 5)]
+        self._sync(lote)
+        # Simula otra copia que leyó las claves antes de que la primera confirmara
+        with mock.patch.object(sync, '_ya_aplicadas', side_effect=[set(), {'a'}]):
+            respuesta = self._sync(lote)
+        self.assertEqual(respuesta.json()['resultados'], [{'id': 'a', 'estado': 'duplicado'}])
+        self.assertEqual(self._cantidad(), 5)
+
+    def test_id_demasiado_largo_se_rechaza(self):
+        respuesta = self._sync([self._op('x' * 61, '2026-01-01T10:00:00Z', 'ingreso', 1)])
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Inventario.todas_las_empresas.filter(producto=self.producto).exists())
+
+
+@override_settings(DATABASE_REPLICA=None)
+class SinteticoTests(TestCase):
+
+    def _generar(self, semilla):
+        resumen = sintetico.generar(productos=12, movimientos=300, pedidos=20, lineas_pedido=3, dias=60,
+                                    semilla=semilla, informar=lambda mensaje: None)
+        empresa_id = resumen.pop('empresa_id')
+        # Las fechas se generan relativas a ahora: se compara el orden, no el instante
+        foto = (
+            list(Inventario.todas_las_empresas.filter(empresa_id=empresa_id).order_by('producto__nombre').values_list(
+                'producto__nombre', 'producto__unidad', 'producto__precio_unitario', 'producto__precio_venta',
+                'stock_minimo', 'cantidad', 'stock_reservado',
+            )),
+            list(Transaction.todas_las_empresas.filter(empresa_id=empresa_id).order_by(
+                'inventario__producto__nombre', 'fecha', 'id'
+            ).values_list('inventario__producto__nombre', 'tipo', 'cantidad')),
+            list(PedidoItem.objects.filter(pedido__empresa_id=empresa_id).order_by('pedido_id', 'id').values_list(
+                'pedido__estado', 'producto__nombre', 'cantidad',
+            )),
+        )
+        return resumen, foto
+
+    def test_misma_semilla_mismo_resultado(self):
+        resumen, foto = self._generar(7)
+        self.assertEqual(resumen['productos'], 12)
+        self.assertEqual(len(foto[1]), resumen['movimientos'])
+        self.assertEqual(len(foto[2]), resumen['lineas_pedido'])
+        self.assertEqual(self._generar(7), (resumen, foto))
+        self.assertNotEqual(self._generar(8)[1], foto)
+
+    def test_saldo_generado_cuadra_con_el_historial(self):
+        self._generar(3)
+        with usar_empresa(Inventario.todas_las_empresas.latest('id').empresa_id):
+            self.assertEqual(ledger.conciliar(), [])
+            self.assertFalse(Inventario.objects.filter(stock_reservado__gt=F('cantidad')).exists())
@@ -0,0 +1,33 @@
+import json
+import os
+from unittest import skipUnless
+
+from django.test import TransactionTestCase, override_settings
+
+from . import benchmark
+from .models import Empresa
+
+
+@skipUnless(os.environ.get('BENCHMARK'), 'Definir BENCHMARK=1 para correr la suite de rendimiento')
+@override_settings(DATABASE_REPLICA=None)
+class BenchmarkTests(TransactionTestCase):
+    """
+    La suite de inventory/benchmark.py con tamaños chicos sobre la base de
+    tests (TransactionTestCase: los hilos de movimientos necesitan los datos
+    confirmados). Con BENCHMARK_JSON=archivo guarda el reporte.
+    """
+
+    def test_suite(self):
+        reporte = benchmark.ejecutar(
+            productos=100, movimientos=10, pedidos=30, repeticiones=3,
+            hilos=[1, 4], operaciones=25, lineas=[1, 10],
+        )
+        if os.environ.get('BENCHMARK_JSON'):
+            with open(os.environ['BENCHMARK_JSON'], 'w', encoding='utf-8') as archivo:
+                json.dump(reporte, archivo, indent=2, ensure_ascii=False)
+
+        self.assertEqual(set(reporte['dashboard']), set(benchmark.PANELES))
+        self.assertGreater(reporte['movimientos']['1']['ok'], 0)
+        self.assertEqual(set(reporte['pedidos']), {'1', '10'})
+        # La empresa del benchmark se borra al terminar
+        self.assertFalse(Empresa.objects.filter(nombre__startswith='benchmark-').exists())
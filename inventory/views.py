@@ -1,79 +1,80 @@
-
 from django.forms import ValidationError
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, F, Q
-from django.http import HttpResponse, JsonResponse
+from django.db.models import Sum, F, Q, Prefetch, aprefetch_related_objects
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
+from django.conf import settings
 from django.urls import reverse
 from django.utils import timezone
-from .forms import UserRegistrationForm, ProductoForm, StockEntryForm, ProveedorForm, PedidoForm, PedidoItemFormSet, StockExitForm
-from .models import Producto, Inventario, Proveedor, Pedido, PedidoItem, Reporte, User, Transaction, Empresa
+from asgiref.sync import sync_to_async
+from .forms import UserRegistrationForm, ProductoForm, StockEntryForm, ProveedorForm, PedidoForm, PedidoItemFormSet, StockExitForm, TrasladoForm
+from .models import Producto, Inventario, Proveedor, Pedido, PedidoItem, Reporte, User, Transaction, Empresa, ajustar_stock
+from . import archive, autenticacion, busqueda, events, fragmentos, ledger, lineas_pedido, lotes
+from .idempotency import idempotente
+from .tenancy import usar_empresa
 from django.db import transaction
-import qrcode
 from io import BytesIO
 import base64
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from django.utils import timezone
 from django.core.paginator import Paginator
+from django.utils.functional import SimpleLazyObject
+import uuid
 
-@login_required
-def dashboard(request):
-    # Definir permisos por rol
-    allowed_panels = {
-        'trabajador': ['dashboard', 'ingreso', 'egreso', 'lista-pedidos'],
-        'bodeguero': ['dashboard', 'ingreso', 'egreso', 'centro', 'concepto-ingreso', 'concepto-egreso', 'rcv', 'lista-pedidos'],
-        'admin': ['dashboard', 'ingreso', 'egreso', 'centro', 'concepto-ingreso', 'concepto-egreso', 'rcv', 'parametros-sii', 'lista-pedidos'],
-    }
-    role = request.user.role
-    active_panel = request.GET.get('panel', 'dashboard')
-    if active_panel not in allowed_panels.get(role, []):
-        messages.warning(request, 'No tienes acceso a esta sección.')
-        active_panel = 'dashboard'
-
-    vigencia_plan = {'codigo_plan': 'Prototipo Educativo'}
-
-    # Obtener datos de la empresa (una sola empresa para el software)
-    empresa = Empresa.objects.first()
 
-    # Cálculos para dashboard
+def _datos_resumen(request, role):
+    """KPIs, movimientos e inventario del panel dashboard."""
     total_productos = Producto.objects.count()
-    inventarios = Inventario.objects.annotate(
+    inventarios = Inventario.objects.select_related('producto').annotate(
         disponible=F('cantidad') - F('stock_reservado'),
         val=F('cantidad') * F('producto__precio_unitario'),  # Anotación movida aquí (antes de paginación)
         ganancia_estimada=F('cantidad') * (F('producto__precio_venta') - F('producto__precio_unitario'))  # Anotación movida aquí
     )
-    stock_bajo = inventarios.filter(disponible__lt=F('stock_minimo')).count()
-    total_inventario = Inventario.objects.aggregate(total=Sum('cantidad'))['total'] or 0
-    total_reservado = Inventario.objects.aggregate(total=Sum('stock_reservado'))['total'] or 0
-    total_disponible = total_inventario - total_reservado
-    total_valor = Inventario.objects.annotate(val=F('cantidad') * F('producto__precio_unitario')).aggregate(sum_val=Sum('val'))['sum_val'] or 0
+    # Una sola consulta agregada (la misma que usa el feed en vivo)
+    kpis = ledger.kpis_inventario()
+    # Desglose por bodega: una consulta agrupada sobre StockBodega
+    stock_por_bodega = ledger.kpis_por_bodega()
     movimientos_qs = Transaction.objects.select_related('inventario__producto').order_by('-fecha')
 
-    for t in movimientos_qs:
+    # Paginación de movimientos (10 por página)
+    paginator_mov = Paginator(movimientos_qs, 10)
+    page_mov = request.GET.get('page_mov', 1)
+    ultimos_movimientos = paginator_mov.get_page(page_mov)
+
+    # Valores solo de la página visible, no de todo el historial
+    for t in ultimos_movimientos:
         t.costo_total = t.cantidad * t.inventario.producto.precio_unitario
         t.venta_total = t.cantidad * t.inventario.producto.precio_venta
         if t.tipo == 'ingreso':
             t.valor_display = t.costo_total
+        elif t.tipo.startswith(('traslado', 'ajuste')):
+            # Un traslado mueve stock entre bodegas y un ajuste corrige el historial: no son ventas
+            t.valor_display = 0
         else:
             t.valor_display = -(t.venta_total - t.costo_total)
 
-    # Paginación de movimientos (10 por página)
-    paginator_mov = Paginator(movimientos_qs, 10)
-    page_mov = request.GET.get('page_mov', 1)
-    ultimos_movimientos = paginator_mov.get_page(page_mov)
-
-    # Inventario - PAGINACIÓN
-    paginator_inv = Paginator(inventarios, 10)
+    # Inventario - PAGINACIÓN (orden fijo: sin él las páginas cacheadas pueden cambiar entre renders)
+    paginator_inv = Paginator(inventarios.order_by('id'), 10)
     page_inv = request.GET.get('page_inv', 1)
     inventarios_paginados = paginator_inv.get_page(page_inv)
 
-    # Inventarios con valor y ganancia estimada (asumiendo margen del 20%)
-    inventarios = inventarios.annotate(
-        val=F('cantidad') * F('producto__precio_unitario'),
-        ganancia_estimada=F('cantidad') * (F('producto__precio_venta') - F('producto__precio_unitario'))
-    )
+    datos = {
+        'total_productos': total_productos,
+        'stock_bajo': kpis['stock_bajo'],
+        'total_inventario': kpis['total_inventario'],
+        'total_reservado': kpis['total_reservado'],
+        'total_disponible': kpis['total_disponible'],
+        'total_valor': kpis['total_valor'],
+        'stock_por_bodega': stock_por_bodega,
+        'ultimos_movimientos': ultimos_movimientos,
+        'inventarios': inventarios_paginados,
+        # El feed en vivo solo se abre si el servidor puede mantener el stream (ASGI)
+        'feed_en_vivo': events.disponible(request),
+    }
+    if role != 'admin':
+        return datos  # Las ganancias solo se muestran al admin
 
     total_costo = Inventario.objects.annotate(
         costo=F('cantidad') * F('producto__precio_unitario')
@@ -94,20 +95,19 @@ def dashboard(request):
         costo=F('cantidad') * F('inventario__producto__precio_unitario')
     ).aggregate(total=Sum('costo'))['total'] or 0
 
-    ganancia_real = ventas_realizadas - costo_vendido
-
-    # Últimos movimientos con valores
+    # Egresos ya archivados (totales acumulados en ResumenArchivo)
+    ventas_archivadas, costo_archivado = archive.egresos_archivados()
+    ventas_realizadas += ventas_archivadas
+    costo_vendido += costo_archivado
 
+    ganancia_real = ventas_realizadas - costo_vendido
+    datos['ganancia_real'] = int(ganancia_real or 0)
+    datos['ganancia_estimada_total'] = int(ganancia_estimada_total or 0)
+    return datos
 
-    # Pedidos vencidos
-    hoy = timezone.now().date()
-    pedidos_vencidos_qs = Pedido.objects.filter(
-        fecha_vencimiento__lt=hoy,
-        estado='Pendiente'
-    )
-    pedidos_vencidos = [(ped, (hoy - ped.fecha_vencimiento).days) for ped in pedidos_vencidos_qs]
 
-    # Datos para gráficos
+def _datos_graficos():
+    """Series de los gráficos: movimientos de los últimos 8 días y ganancia por producto."""
     fecha_inicio = timezone.now() - timedelta(days=7)
     fecha_inicio = fecha_inicio.replace(hour=0, minute=0, second=0, microsecond=0)
     transacciones = Transaction.objects.filter(fecha__gte=fecha_inicio).order_by('fecha')
@@ -134,103 +134,152 @@ def dashboard(request):
     }
 
     # Ganancias estimadas por producto
+    inventarios = Inventario.objects.select_related('producto').annotate(
+        ganancia_estimada=F('cantidad') * (F('producto__precio_venta') - F('producto__precio_unitario'))
+    )
     profits_data = {
         'labels': [inv.producto.nombre for inv in inventarios],
         'ganancias': [float(inv.ganancia_estimada or 0) for inv in inventarios]
     }
 
-    # Listas
-    proveedores = Proveedor.objects.all()
-    productos = Producto.objects.all()
-    pedidos = Pedido.objects.all().order_by('-fecha_pedido')  # Para lista de pedidos
-    reportes = Reporte.objects.all()
-    usuarios = User.objects.all()
+    return {'stock_data': stock_data, 'profits_data': profits_data}
+
+
+def _reportes_con_lineas():
+    """Reportes con su contenido separado en líneas para la vista previa."""
+    reportes = list(Reporte.objects.all())
+    precios_venta = None  # Precio de venta por nombre, se carga una vez si hay reportes Resumen
     for rep in reportes:
         rep.lineas = []  # Lista de líneas procesadas
         rep.total_resumen = 0  # Total solo para Resumen
 
-        for rep in reportes:
-            rep.lineas = []  # Lista de líneas procesadas
-            rep.total_resumen = 0  # Total solo para Resumen
-
-            for raw_line in rep.contenido.strip().split('\n'):
-                if not raw_line.strip():
-                    continue
-
-                if rep.tipo == 'Resumen':
-                    # Formato: "Producto: cantidad (Valor: valor_total)"  # Sin $
-                    try:
-                        nombre, resto = raw_line.split(':', 1)
-                        nombre = nombre.strip()
-
-                        # Extraer cantidad
-                        cantidad_str = resto.split('(')[0].strip()
-
-                        # Extraer valor total (después de "Valor: " y antes de ")")
-                        valor_total_str = resto.split('Valor: ')[1].split(')')[0].strip()
-                        valor_total = int(valor_total_str.replace('.', '').replace(',', ''))  # Por si hay separadores
-
-                        # Obtener precio unitario de venta desde el inventario
-                        inv = Inventario.objects.get(producto__nombre__icontains=nombre)
-                        precio_venta = inv.producto.precio_venta
-
-                        # Acumular total
-                        rep.total_resumen += valor_total
-
-                        rep.lineas.append({
-                            'nombre': nombre,
-                            'cantidad': cantidad_str,
-                            'precio_venta': precio_venta,
-                            'valor_total': valor_total
-                        })
-                    except Exception as e:
-                        # Log opcional: print(f"Error parsing Resumen: {e}")
-                        rep.lineas.append({
-                            'nombre': raw_line.strip(),
-                            'cantidad': 'N/A',
-                            'precio_venta': 0,
-                            'valor_total': 0
-                        })
-                else:
-                    # Para Ingreso/Egreso: "Nombre: +cantidad el fecha_iso" o "-cantidad"
-                    try:
-                        nombre, resto = raw_line.split(':', 1)
-                        nombre = nombre.strip()
-
-                        cantidad_str, fecha_str = resto.split(' el ', 1)
-                        cantidad_str = cantidad_str.strip()  # '+10' o '-5'
-
-                        signo = cantidad_str[0]  # '+' o '-'
-                        cantidad = cantidad_str[1:]  # '10'
-
-                        fecha = datetime.fromisoformat(fecha_str.strip())  # Convierte a datetime
-
-                        rep.lineas.append({
-                            'nombre': nombre,
-                            'cantidad': cantidad,
-                            'fecha': fecha,
-                            'signo': signo
-                        })
-                    except Exception as e:
-                        # Log opcional: print(f"Error parsing {rep.tipo}: {e}")
-                        rep.lineas.append({'texto': raw_line.strip()})
-
-
-
-    # Forms
-    stock_entry_form = StockEntryForm(
-        request.POST if request.POST.get('form_type') == 'ingreso' else None,
-        prefix='ingreso'
-    )
-    stock_exit_form = StockExitForm(
-        request.POST if request.POST.get('form_type') == 'egreso' else None,
-        prefix='egreso'
-    )
-    proveedor_form = ProveedorForm(request.POST if request.POST.get('form_type') == 'proveedor' else None)
-    producto_form = ProductoForm(request.POST if request.POST.get('form_type') == 'producto' else None)
-    pedido_form = PedidoForm(request.POST if request.POST.get('form_type') == 'pedido' else None)
-    pedido_item_formset = PedidoItemFormSet(request.POST if request.POST.get('form_type') == 'pedido' else None)
-    user_form = UserRegistrationForm(request.POST if request.POST.get('form_type') == 'usuario' else None)
+        for raw_line in rep.contenido.strip().split('\n'):
+            if not raw_line.strip():
+                continue
+
+            if rep.tipo == 'Vencimiento':
+                # Formato: "Producto: cantidad (Lote: codigo, Bodega: nombre) vence AAAA-MM-DD"
+                try:
+                    nombre, resto = raw_line.split(':', 1)
+                    cantidad_str, resto = resto.split('(Lote:', 1)
+                    codigo, resto = resto.split(', Bodega:', 1)
+                    bodega_nombre, vence_str = resto.split(') vence ', 1)
+                    vence = date.fromisoformat(vence_str.strip())
+                    rep.lineas.append({
+                        'nombre': nombre.strip(),
+                        'cantidad': cantidad_str.strip(),
+                        'lote': codigo.strip(),
+                        'bodega': bodega_nombre.strip(),
+                        'vence': vence,
+                        'vencido': vence < timezone.localdate(),
+                    })
+                except ValueError:
+                    rep.lineas.append({'nombre': raw_line.strip(), 'cantidad': 'N/A'})
+            elif rep.tipo == 'Resumen':
+                # Formato: "Producto: cantidad (Valor: valor_total)"  # Sin $
+                try:
+                    nombre, resto = raw_line.split(':', 1)
+                    nombre = nombre.strip()
+
+                    # Extraer cantidad
+                    cantidad_str = resto.split('(')[0].strip()
+
+                    # Extraer valor total (después de "Valor: " y antes de ")")
+                    valor_total_str = resto.split('Valor: ')[1].split(')')[0].strip()
+                    valor_total = int(valor_total_str.replace('.', '').replace(',', ''))  # Por si hay separadores
+
+                    # Precio unitario de venta actual del producto
+                    if precios_venta is None:
+                        precios_venta = dict(Producto.objects.values_list('nombre', 'precio_venta'))
+                    precio_venta = precios_venta[nombre]
+
+                    # Acumular total
+                    rep.total_resumen += valor_total
+
+                    rep.lineas.append({
+                        'nombre': nombre,
+                        'cantidad': cantidad_str,
+                        'precio_venta': precio_venta,
+                        'valor_total': valor_total
+                    })
+                except Exception as e:
+                    # Log opcional: print(f"Error parsing Resumen: {e}")
+                    rep.lineas.append({
+                        'nombre': raw_line.strip(),
+                        'cantidad': 'N/A',
+                        'precio_venta': 0,
+                        'valor_total': 0
+                    })
+            else:
+                # Para Ingreso/Egreso: "Nombre: +cantidad el fecha_iso" o "-cantidad"
+                try:
+                    nombre, resto = raw_line.split(':', 1)
+                    nombre = nombre.strip()
+
+                    cantidad_str, fecha_str = resto.split(' el ', 1)
+                    cantidad_str = cantidad_str.strip()  # '+10' o '-5'
+
+                    signo = cantidad_str[0]  # '+' o '-'
+                    cantidad = cantidad_str[1:]  # '10'
+
+                    fecha = datetime.fromisoformat(fecha_str.strip())  # Convierte a datetime
+
+                    rep.lineas.append({
+                        'nombre': nombre,
+                        'cantidad': cantidad,
+                        'fecha': fecha,
+                        'signo': signo
+                    })
+                except Exception as e:
+                    # Log opcional: print(f"Error parsing {rep.tipo}: {e}")
+                    rep.lineas.append({'texto': raw_line.strip()})
+    return reportes
+
+
+@login_required
+@idempotente
+def dashboard(request):
+    # Definir permisos por rol
+    allowed_panels = {
+        'trabajador': ['dashboard', 'graficos', 'ingreso', 'egreso', 'lista-pedidos'],
+        'bodeguero': ['dashboard', 'graficos', 'ingreso', 'egreso', 'centro', 'concepto-ingreso', 'concepto-egreso', 'rcv', 'lista-pedidos'],
+        'admin': ['dashboard', 'graficos', 'ingreso', 'egreso', 'centro', 'concepto-ingreso', 'concepto-egreso', 'rcv', 'parametros-sii', 'lista-pedidos'],
+    }
+    role = request.user.role
+    active_panel = request.GET.get('panel', 'dashboard')
+    if active_panel not in allowed_panels.get(role, []):
+        messages.warning(request, 'No tienes acceso a esta sección.')
+        active_panel = 'dashboard'
+
+    vigencia_plan = {'codigo_plan': 'Prototipo Educativo'}
+
+    # Empresa del usuario; los superusuarios sin empresa ven la primera
+    empresa = request.user.empresa or Empresa.objects.first()
+
+    # Listas
+    proveedores = Proveedor.objects.all()
+    productos = Producto.objects.all()
+    # Para lista de pedidos: proveedor e ítems con su producto en tres consultas, no por fila
+    pedidos = Pedido.objects.select_related('proveedor').prefetch_related(
+        Prefetch('items', queryset=PedidoItem.objects.select_related('producto'))
+    ).order_by('-fecha_pedido')
+    usuarios = User.objects.de_empresa_actual()
+    # Se procesan solo si el fragmento de la lista no está en cache
+    reportes = SimpleLazyObject(_reportes_con_lineas)
+
+    # Forms: cada uno se construye recién al usarse (el POST de su form_type o el render
+    # de su panel), así un request solo arma los formularios del panel activo
+    def datos_de(form_type):
+        return request.POST if request.POST.get('form_type') == form_type else None
+
+    stock_entry_form = SimpleLazyObject(lambda: StockEntryForm(datos_de('ingreso'), prefix='ingreso'))
+    stock_exit_form = SimpleLazyObject(lambda: StockExitForm(datos_de('egreso'), prefix='egreso'))
+    traslado_form = SimpleLazyObject(lambda: TrasladoForm(datos_de('traslado'), prefix='traslado'))
+    proveedor_form = SimpleLazyObject(lambda: ProveedorForm(datos_de('proveedor')))
+    producto_form = SimpleLazyObject(lambda: ProductoForm(datos_de('producto')))
+    pedido_form = SimpleLazyObject(lambda: PedidoForm(datos_de('pedido')))
+    pedido_item_formset = SimpleLazyObject(lambda: PedidoItemFormSet(datos_de('pedido')))
+    user_form = SimpleLazyObject(lambda: UserRegistrationForm(datos_de('usuario')))
 
     # Filtros para lista de pedidos
     if active_panel == 'lista-pedidos':
@@ -279,27 +328,20 @@ def dashboard(request):
             if form.is_valid():
                 producto = form.cleaned_data['producto']
                 cantidad = form.cleaned_data['cantidad']
+                bodega = form.cleaned_data.get('bodega')
 
                 with transaction.atomic():
-                    inv, _ = Inventario.objects.get_or_create(
-                        producto=producto,
-                        defaults={'stock_minimo': 10}
-                    )
-                    operacion_exitosa = False
-
                     if form_type == 'ingreso':
-                        if cantidad <= 0:
-                            messages.error(request, 'Cantidad debe ser positiva para ingreso.')
-                        else:
-                            inv.cantidad += cantidad
-                            inv.save()
-                            Transaction.objects.create(
-                                inventario=inv,
-                                tipo=form_type,
-                                cantidad=cantidad
+                        try:
+                            ledger.registrar_movimiento(
+                                producto, form_type, cantidad, bodega=bodega,
+                                lote=form.cleaned_data.get('lote'),
+                                vencimiento=form.cleaned_data.get('fecha_vencimiento'),
                             )
                             messages.success(request, 'Ingreso registrado.')
                             return redirect(reverse('dashboard'))
+                        except ValidationError as e:
+                            messages.error(request, e.messages[0])
                     elif form_type == 'completar_pedido':
                             if role not in ['trabajador', 'bodeguero', 'admin']:
                                 return JsonResponse({'success': False, 'message': 'No tienes permiso.'})
@@ -321,20 +363,13 @@ def dashboard(request):
                             except Exception as e:
                                 return JsonResponse({'success': False, 'message': str(e)})
                     elif form_type == 'egreso':
-                        if cantidad <= 0:
-                            messages.error(request, 'Cantidad debe ser positiva para egreso.')
-                        elif cantidad > (inv.cantidad - inv.stock_reservado):  # Usar disponible en lugar de cantidad
-                            messages.error(request, f'No hay suficiente stock disponible de "{producto.nombre}". Stock disponible: {inv.cantidad - inv.stock_reservado}. Solicitado: {cantidad}.')
-                        else:
-                            inv.cantidad -= cantidad
-                            inv.save()
-                            Transaction.objects.create(
-                                inventario=inv,
-                                tipo=form_type,
-                                cantidad=cantidad
-                            )
+                        try:
+                            # registrar_movimiento bloquea el inventario y valida el disponible
+                            ledger.registrar_movimiento(producto, form_type, cantidad, bodega=bodega)
                             messages.success(request, 'Egreso registrado.')
                             return redirect(reverse('dashboard'))
+                        except ValidationError as e:
+                            messages.error(request, e.messages[0])
 
                     active_panel = 'ingreso' if form_type == 'ingreso' else 'egreso'
 
@@ -342,6 +377,19 @@ def dashboard(request):
                 messages.error(request, 'Error en el formulario de stock.')
                 active_panel = 'ingreso' if form_type == 'ingreso' else 'egreso'
 
+        elif form_type == 'traslado' and role in ['bodeguero', 'admin']:
+            if traslado_form.is_valid():
+                datos = traslado_form.cleaned_data
+                try:
+                    ledger.trasladar(datos['producto'], datos['origen'], datos['destino'], datos['cantidad'])
+                    messages.success(request, 'Traslado registrado.')
+                    return redirect(reverse('dashboard'))
+                except ValidationError as e:
+                    messages.error(request, e.messages[0])
+            else:
+                messages.error(request, 'Error en el formulario de traslado.')
+            active_panel = 'ingreso'
+
         elif form_type == 'producto' and role in ['bodeguero', 'admin']:
             pk = request.POST.get('pk')
             instance = get_object_or_404(Producto, pk=pk) if pk else None
@@ -406,22 +454,26 @@ def dashboard(request):
                             prod_id = item.producto.id
                             stock_necesario[prod_id] = stock_necesario.get(prod_id, 0) + item.cantidad
 
-                        # Validar contra BD
+                        # Validar contra BD (el disponible de la bodega del pedido)
                         reserving_states = ['Pendiente', 'Entransito']
+                        bodega = ledger.resolver_bodega(pedido_pre.bodega_id, pedido_pre.empresa_id)
+                        # instance ya trae los datos del formulario: la bodega anterior se lee de la BD
+                        bodega_previa = None if es_nuevo else Pedido.objects.filter(pk=instance.pk).values_list('bodega_id', flat=True).first()
                         if es_nuevo or pedido_pre.estado in reserving_states:
                             for prod_id, cantidad_req in stock_necesario.items():
                                 inv = Inventario.objects.select_for_update().get(producto_id=prod_id)
+                                stock = ledger.bloquear_stock_bodegas([(inv.id, bodega.pk)])[(inv.id, bodega.pk)]
                                 
-                                # Calcular lo que ya estaba reservado por ESTE pedido (para no restar doble al editar)
+                                # Calcular lo que ya estaba reservado por ESTE pedido en esta bodega (para no restar doble al editar)
                                 reservado_previo = 0
-                                if not es_nuevo:
+                                if not es_nuevo and bodega_previa == bodega.pk:
                                     prev_items = PedidoItem.objects.filter(pedido=instance, producto_id=prod_id).exclude(id__in=deleted_ids)
                                     reservado_previo = sum(i.cantidad for i in prev_items)
 
-                                disponible_real = (inv.cantidad - inv.stock_reservado) + reservado_previo
+                                disponible_real = (stock.cantidad - stock.stock_reservado) + reservado_previo
                                 
                                 if disponible_real < cantidad_req:
-                                    raise ValidationError(f"Stock insuficiente para {inv.producto.nombre}. Disponible: {disponible_real}, Solicitado: {cantidad_req}.")
+                                    raise ValidationError(f"Stock insuficiente para {inv.producto.nombre} en {bodega.nombre}. Disponible: {disponible_real}, Solicitado: {cantidad_req}.")
 
                         # 2. GUARDAR
                         pedido = pedido_form.save()
@@ -431,18 +483,14 @@ def dashboard(request):
                         # Si editamos, limpiamos reserva anterior antes de poner la nueva
                         if not es_nuevo and instance.estado in reserving_states:
                              for item in instance.items.all():
-                                Inventario.objects.filter(producto=item.producto).update(
-                                    stock_reservado=F('stock_reservado') - item.cantidad
-                                )
+                                ajustar_stock(item.producto_id, bodega_previa, reservado=-item.cantidad)
 
                         pedido_item_formset.save()
 
                         # 3. APLICAR RESERVA (Si aplica)
                         if pedido.estado in reserving_states:
                             for item in pedido.items.all():
-                                Inventario.objects.filter(producto=item.producto).update(
-                                    stock_reservado=F('stock_reservado') + item.cantidad
-                                )
+                                ajustar_stock(item.producto_id, pedido.bodega_id, reservado=item.cantidad)
 
                     messages.success(request, 'Pedido guardado exitosamente.')
                     return redirect(reverse('dashboard') + '?panel=concepto-egreso')
@@ -458,6 +506,31 @@ def dashboard(request):
                  active_panel = 'concepto-egreso'
 
 
+        elif form_type == 'lineas_pedido' and role in ['bodeguero', 'admin']:
+            # Importación de líneas desde un archivo CSV o JSON (ver lineas_pedido.py)
+            pedido = get_object_or_404(Pedido, pk=request.POST.get('pk'))
+            archivo = request.FILES.get('archivo')
+            try:
+                if archivo is None:
+                    raise ValidationError('Seleccione un archivo CSV o JSON.')
+                formato = 'json' if archivo.name.lower().endswith('.json') else 'csv'
+                cantidades = lineas_pedido.resolver_lineas(lineas_pedido.leer_lineas(archivo.read(), formato))
+                lineas_pedido.agregar_lineas(pedido, cantidades, reemplazar=bool(request.POST.get('reemplazar')))
+                messages.success(request, f'{len(cantidades)} productos importados al pedido #{pedido.pk}.')
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+            return redirect(reverse('dashboard') + f'?panel=concepto-egreso&edit_pedido={pedido.pk}')
+
+        elif form_type == 'clonar_pedido' and role in ['bodeguero', 'admin']:
+            origen = get_object_or_404(Pedido, pk=request.POST.get('pk'))
+            try:
+                nuevo = lineas_pedido.clonar(origen)
+            except ValidationError as e:
+                messages.error(request, ' '.join(e.messages))
+                return redirect(reverse('dashboard') + '?panel=concepto-egreso')
+            messages.success(request, f'Pedido #{nuevo.pk} creado como copia del #{origen.pk}.')
+            return redirect(reverse('dashboard') + f'?panel=concepto-egreso&edit_pedido={nuevo.pk}')
+
         elif form_type == 'delete_pedido' and role in ['bodeguero', 'admin']:
             pk = request.POST.get('pk')
             get_object_or_404(Pedido, pk=pk).delete()
@@ -470,25 +543,35 @@ def dashboard(request):
             fecha_desde = request.POST.get('fecha_desde')
             fecha_hasta = request.POST.get('fecha_hasta')
             content = ''
-            qs = Transaction.objects.all()
+            fecha_desde_dt = fecha_hasta_dt = None
             if fecha_desde:
                 fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
                 fecha_desde_dt = timezone.make_aware(fecha_desde_dt)
-                qs = qs.filter(fecha__gte=fecha_desde_dt)
             if fecha_hasta:
                 fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
                 fecha_hasta_dt = timezone.make_aware(fecha_hasta_dt)
-                qs = qs.filter(fecha__lte=fecha_hasta_dt)
+            # archive.movimientos incluye los movimientos archivados si el rango los alcanza
             if tipo == 'Ingreso':
-                qs = qs.filter(tipo='ingreso')
-                content = "\n".join([f"{t.inventario.producto.nombre}: +{t.cantidad} el {t.fecha}" for t in qs])
+                qs = archive.movimientos(fecha_desde_dt, fecha_hasta_dt, 'ingreso')
+                content = "\n".join([f"{nombre}: +{cantidad} el {fecha}" for nombre, _, cantidad, fecha in qs])
 
             elif tipo == 'Egreso':
-                qs = qs.filter(tipo='egreso')
-                content = "\n".join([f"{t.inventario.producto.nombre}: -{t.cantidad} el {t.fecha}" for t in qs])
+                qs = archive.movimientos(fecha_desde_dt, fecha_hasta_dt, 'egreso')
+                content = "\n".join([f"{nombre}: -{cantidad} el {fecha}" for nombre, _, cantidad, fecha in qs])
+
+            elif tipo == 'Vencimiento':
+                # Lotes que vencen hasta la fecha "hasta" (por defecto en lotes.DIAS_POR_VENCER días)
+                hasta = fecha_hasta_dt.date() if fecha_hasta_dt else None
+                content = "\n".join([
+                    f"{lote.inventario.producto.nombre}: {lote.cantidad} "
+                    f"(Lote: {lote.codigo}, Bodega: {lote.bodega.nombre}) vence {lote.fecha_vencimiento.isoformat()}"
+                    for lote in lotes.por_vencer(hasta)
+                ])
+                if not content:
+                    messages.info(request, 'No hay lotes por vencer en el período.')
 
             elif tipo == 'Resumen':
-                inventarios_list = Inventario.objects.all()
+                inventarios_list = Inventario.objects.select_related('producto')
                 content = "\n".join([f"{inv.producto.nombre}: {inv.cantidad} (Valor: {inv.cantidad * inv.producto.precio_venta})" for inv in inventarios_list])
 
             if content:
@@ -514,26 +597,16 @@ def dashboard(request):
 
 
     context = {
-        'ultimos_movimientos': ultimos_movimientos,
-        'inventarios': inventarios_paginados,
         'empresa': empresa,
         'stock_exit_form': stock_exit_form,
         'vigencia_plan': vigencia_plan,
-        'total_productos': total_productos,
-        'stock_bajo': stock_bajo,
-        'total_inventario': total_inventario,
-        'total_reservado': total_reservado,
-        'total_disponible': total_disponible,
-        'total_valor': total_valor,
-        'pedidos_vencidos': pedidos_vencidos,
-        'stock_data': stock_data,
-        'profits_data': profits_data,
         'proveedores': proveedores,
         'productos': productos,
         'pedidos': pedidos,
         'reportes': reportes,
         'usuarios': usuarios,
         'stock_entry_form': stock_entry_form,
+        'traslado_form': traslado_form,
         'proveedor_form': proveedor_form,
         'producto_form': producto_form,
         'pedido_form': pedido_form,
@@ -541,40 +614,71 @@ def dashboard(request):
         'user_form': user_form,
         'active_panel': active_panel,
         'role': role,
-        'ganancia_real': int(ganancia_real or 0),
-        'ganancia_estimada_total': int(ganancia_estimada_total or 0),
-
-
+        'idempotency_key': uuid.uuid4().hex,  # reintentos del mismo formulario no duplican el movimiento
+        'versiones': fragmentos.Versiones(),
+        'fragmentos_timeout': settings.FRAGMENTOS_TIMEOUT,
     }
+    # Solo se renderiza el panel activo: los datos de los demás no se calculan
+    if active_panel == 'dashboard':
+        context.update(_datos_resumen(request, role))
+    elif active_panel == 'graficos':
+        context.update(_datos_graficos())
     return render(request, 'dashboard.html', context)
 
-def pedido_detalle(request, pk):
-    pedido = get_object_or_404(Pedido, pk=pk)
-    context = {'pedido': pedido}
-    return render(request, 'pedido_detalle.html', context)
+def _qr_base64(url):
+    """PNG del QR en base64. Es CPU pura: las vistas async lo corren en un thread pool."""
+    import qrcode  # arrastra PIL: se importa al primer QR, no al levantar cada worker
 
-def generar_qr(request, pk):
-    pedido = get_object_or_404(Pedido, pk=pk)
-    url = request.build_absolute_uri(reverse('pedido_detalle', args=[pk]))
     qr = qrcode.QRCode(version=1, box_size=10, border=5)
     qr.add_data(url)
     qr.make(fit=True)
     img = qr.make_image(fill='black', back_color='white')
     buffer = BytesIO()
     img.save(buffer, format="PNG")
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    return JsonResponse({'qr_base64': qr_base64})
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+# thread_sensitive=False: no compite con el hilo único donde corre el ORM síncrono
+qr_base64_async = sync_to_async(_qr_base64, thread_sensitive=False)
+
+async def _pedido_con_items(pk):
+    """
+    Pedido con proveedor e items precargados: el template no vuelve a consultar la BD.
+    Estas páginas son públicas (sin login, sin empresa activa): el pedido se busca
+    en todas las empresas y sus items se leen con la empresa del pedido.
+    """
+    pedido = await aget_object_or_404(Pedido.todas_las_empresas.select_related('proveedor'), pk=pk)
+    with usar_empresa(pedido.empresa_id):
+        await aprefetch_related_objects(
+            [pedido], Prefetch('items', queryset=PedidoItem.objects.select_related('producto'))
+        )
+    return pedido
+
+async def pedido_detalle(request, pk):
+    pedido = await _pedido_con_items(pk)
+    context = {'pedido': pedido}
+    return render(request, 'pedido_detalle.html', context)
+
+async def generar_qr(request, pk):
+    await aget_object_or_404(Pedido.todas_las_empresas.only('id'), pk=pk)
+    url = request.build_absolute_uri(reverse('pedido_detalle', args=[pk]))
+    return JsonResponse({'qr_base64': await qr_base64_async(url)})
 
 def user_login(request):
     if request.method == 'POST':
-        username = request.POST['username']
-        password = request.POST['password']
+        username = request.POST.get('username', '')
+        password = request.POST.get('password', '')
+        # Con demasiados fallos se rechaza antes de hashear la contraseña o tocar la base
+        if autenticacion.login_bloqueado(request, username):
+            messages.error(request, 'Demasiados intentos fallidos. Intente nuevamente en unos minutos.')
+            return render(request, 'login.html', status=429)
         user = authenticate(request, username=username, password=password)
         if user is not None:
+            autenticacion.limpiar_fallos_login(request, username)
             login(request, user)
             messages.success(request, 'Inicio de sesión exitoso.')
             return redirect('dashboard')
         else:
+            autenticacion.registrar_fallo_login(request, username)
             messages.error(request, 'Credenciales inválidas.')
     return render(request, 'login.html')
 
@@ -585,6 +689,7 @@ def user_logout(request):
 
 from django.db.models import F, Case, When, Value
 @login_required
+@idempotente
 def completar_pedido_qr(request):
     if request.method == 'POST':
         pedido_id = request.POST.get('pedido_id')
@@ -614,26 +719,69 @@ def completar_pedido_qr(request):
 
     return JsonResponse({'success': False, 'message': 'Método no permitido.'}, status=405)
 
-def pedido_qr_publico(request, pk):
+@login_required
+def exportar_lineas_pedido(request, pk):
+    """Líneas del pedido en CSV, importable de vuelta en este u otro pedido."""
+    pedido = get_object_or_404(Pedido, pk=pk)
+    response = HttpResponse(lineas_pedido.lineas_csv(pedido), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="pedido_{pedido.pk}.csv"'
+    return response
+
+@login_required
+def buscar(request):
+    """Búsqueda por texto (ver busqueda.py). JSON con resultados ordenados por relevancia."""
+    edita = request.user.role in ['bodeguero', 'admin']
+    resultado = busqueda.buscar(request.GET.get('q', ''), proveedores=edita)
+    dashboard_url = reverse('dashboard')
+    return JsonResponse({
+        'productos': [{
+            'id': p.id, 'nombre': p.nombre, 'descripcion': p.descripcion, 'relevancia': relevancia,
+            'url': f'{dashboard_url}?edit_producto={p.id}' if edita else f'{dashboard_url}?panel=ingreso',
+        } for p, relevancia in resultado['productos']],
+        'proveedores': [{
+            'id': p.id, 'nombre': p.nombre, 'contacto': p.contacto, 'relevancia': relevancia,
+            'url': f'{dashboard_url}?edit_proveedor={p.id}',
+        } for p, relevancia in resultado['proveedores']],
+        'pedidos': [{
+            'id': p.id, 'proveedor': p.proveedor.nombre, 'estado': p.estado,
+            'url': reverse('pedido_detalle', args=[p.id]),
+        } for p in resultado['pedidos']],
+    })
+
+async def pedido_qr_publico(request, pk):
     """
     Vista pública: Muestra el detalle del pedido con QR grande.
     Accesible sin login, ideal para enviar por WhatsApp.
+    Async: bajo ASGI no ocupa un hilo mientras espera la BD.
     """
-    pedido = get_object_or_404(Pedido, pk=pk)
+    pedido = await _pedido_con_items(pk)
 
-    # Generar QR (mismo código que en generar_qr)
+    # Generar QR (mismo helper que generar_qr, fuera del event loop)
     url_detalle = request.build_absolute_uri(reverse('pedido_qr_publico', args=[pk]))
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(url_detalle)
-    qr.make(fit=True)
-    img = qr.make_image(fill='black', back_color='white')
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    qr_base64 = await qr_base64_async(url_detalle)
 
     context = {
         'pedido': pedido,
         'qr_base64': qr_base64,
         'url_qr': url_detalle,  # Para compartir
     }
-    return render(request, 'pedido_qr_publico.html', context)
\ No newline at end of file
+    return render(request, 'pedido_qr_publico.html', context)
+
+async def eventos(request):
+    """
+    Feed en vivo (Server-Sent Events) de movimientos, inventario y KPIs para el
+    dashboard. Solo bajo ASGI (control_stock/asgi.py): bajo WSGI responde 204,
+    con lo que el navegador no vuelve a conectarse (ver events.py).
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if user.empresa_id is None:
+        # Sin empresa no hay eventos que le correspondan (el broker no filtra por sí solo)
+        return HttpResponse(status=403)
+    if not events.disponible(request):
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(events.flujo_sse(user.empresa_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response